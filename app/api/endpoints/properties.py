@@ -1,12 +1,31 @@
+import json
+from functools import partial
+from typing import AsyncIterator, Literal, Optional
 from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from app.db.elastic import search_page
 from app.dependencies.parsers import get_parsers
 from app.models.schemas import PropertySchema
-from app.services.filter import filter_properties
+from app.services.fanout import fan_out, iter_results, merge_results, source_name
+from app.services.filter import filter_properties, load_filters
 from app.services.cache import cache
+from app.services.clustering import ListingResolver, cluster_listings
+from app.services.pagination import decode_cursor, encode_cursor, page_after
 from app.utils.logger import logger
 
 router = APIRouter()
 
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def _source_calls(parsers: list, city: str, property_type: str) -> dict:
+    return {
+        source_name(parser): partial(parser.parse, city, {"type": property_type})
+        for parser in parsers
+    }
+
+
 @router.get("/properties", response_model=list[PropertySchema])
 @cache(expire=300)
 async def get_properties(
@@ -15,16 +34,79 @@ async def get_properties(
     parsers: list = Depends(get_parsers)
 ):
     try:
-        all_properties = []
-        for parser in parsers:
-            try:
-                data = await parser.parse(city, {"type": property_type})
-                all_properties.extend(data)
-            except Exception as e:
-                logger.error(f"Parser {parser.__class__.__name__} failed: {str(e)}")
-        
-        return filter_properties(all_properties)
+        results = await fan_out(_source_calls(parsers, city, property_type))
+        return filter_properties(cluster_listings(merge_results(results)), load_filters())
     
     except Exception as e:
         logger.critical(f"API Error: {str(e)}")
-        raise HTTPException(500, "Internal Server Error")
\ No newline at end of file
+        raise HTTPException(500, "Internal Server Error")
+
+
+def _frame(fmt: str, event: str, data) -> str:
+    payload = json.dumps(jsonable_encoder(data), ensure_ascii=False)
+    if fmt == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+async def _stream_listings(calls: dict, fmt: str) -> AsyncIterator[str]:
+    # Each source is filtered on its own as it lands, so nothing waits for the slowest one
+    # and only one source's listings are held at a time
+    total, resolver, filters = 0, ListingResolver(), load_filters()
+    async for result in iter_results(calls):
+        # Listings already streamed from another source are dropped rather than merged afterwards
+        listings = [l for l in filter_properties(result.items, filters) if resolver.add(l) is None]
+        total += len(listings)
+        for listing in listings:
+            yield _frame(fmt, "listing", listing)
+        if fmt == "sse":
+            yield _frame(fmt, "source", {"source": result.source, "count": len(listings),
+                                         "elapsed": round(result.elapsed, 3), "error": result.error})
+    if fmt == "sse":
+        yield _frame(fmt, "done", {"count": total})
+
+
+@router.get("/properties/stream")
+async def stream_properties(
+    city: str = Query(..., min_length=2),
+    property_type: str = Query("Квартира"),
+    format: Literal["ndjson", "sse"] = Query("ndjson"),
+    parsers: list = Depends(get_parsers)
+):
+    """Listings as each source delivers them: one JSON object per line, or SSE
+    ``listing`` events followed by a ``source`` summary per source and a final ``done``"""
+    return StreamingResponse(_stream_listings(_source_calls(parsers, city, property_type), format),
+                             media_type=STREAM_MEDIA_TYPES[format], headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/properties/page")
+async def get_properties_page(
+    city: Optional[str] = Query(None, min_length=2),
+    property_type: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    from_index: bool = Query(False),
+    parsers: list = Depends(get_parsers)
+):
+    """Keyset pages ordered by (price, external_id).
+
+    By default pages are cut from the cached /properties result (computed
+    once per city); ``from_index`` reads straight from Elasticsearch with
+    search_after instead, which only holds what the crawler indexed. The
+    index stores neither city nor property type, so ``from_index`` takes
+    neither.
+    """
+    try:
+        if from_index:
+            if city or property_type:
+                raise ValueError("from_index pages the whole index; city and property_type do not apply")
+            after = decode_cursor(cursor)
+            items, last = await search_page(limit, list(after) if after else None)
+            return {"items": items, "next_cursor": encode_cursor(last)}
+        if not city:
+            raise ValueError("city is required unless from_index is set")
+        items = await get_properties(city=city, property_type=property_type or "Квартира", parsers=parsers)
+        page, next_cursor = page_after(items, cursor, limit)
+        return {"items": page, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(400, str(e))
@@ -5,7 +5,71 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://redis:6379/0"
     ELASTICSEARCH_URL: str = "http://elasticsearch:9200"
     PROXY_ENABLED: bool = False
+    PROXY_LIST: list[str] = []
     CIAN_MAX_RETRIES: int = 3
+    # Parallel district shards; CIAN_PARALLEL_PAGES is the politeness cap
+    CIAN_SHARD_SIZE: int = 3
+    CIAN_PARALLEL_PAGES: int = 3
+
+    # Parser fan-out: default per-source budget, overrides by source name
+    PARSER_TIMEOUT: float = 30.0
+    PARSER_TIMEOUTS: dict[str, float] = {"avito": 20.0, "cian": 60.0}
+    PARSER_CONCURRENCY: int = 4
+
+    # Seen-listing dedup: how long unseen IDs are kept
+    DEDUP_TTL_DAYS: float = 30
+
+    FILTERS_PATH: str = "/root/rentscout/config/steinik_filters.json"
+    MAX_PAGES_PER_SOURCE: int = 5
+
+    # Distributed scraping (app/tasks/celery.py)
+    CELERY_BROKER_URL: str = "redis://redis:6379/1"
+    CELERY_EAGER: bool = False
+    SCRAPE_DISTRICT_CHUNK: int = 5
+    SCRAPE_JITTER: float = 0.1
+    # Removed listings are only detected by a complete crawl, so one runs this often
+    FULL_RECRAWL_HOURS: float = 24
+    # Scrape chunks per source, counted in Redis so the cap holds across all workers
+    SOURCE_RATE_LIMITS: dict[str, str] = {"cian": "6/m", "avito": "30/m"}
+
+    # Price history / change detection (app/services/history.py)
+    HISTORY_DB_PATH: str = "/root/rentscout/data/price_history.db"
+    HISTORY_REMOVAL_GRACE_HOURS: float = 6
+
+    # /metrics exporter for the Celery worker and the bot (0 disables)
+    METRICS_PORT: int = 9100
+
+    # Outbound Telegram queue (app/telegram_bot/dispatcher.py); digest size 0 sends one message per listing
+    TELEGRAM_GLOBAL_RATE: float = 25.0
+    TELEGRAM_CHAT_RATE: float = 1.0
+    TELEGRAM_DIGEST_SIZE: int = 0
+    TELEGRAM_DIGEST_WINDOW: float = 5.0
+
+    # Shared httpx clients for HTTP parsers (app/parsers/http_client.py)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_PER_HOST: int = 8
+    HTTP_TIMEOUT: float = 15.0
+    HTTP_HTTP2: bool = True
+
+    # HTML parsing off the event loop (app/utils/process_pool.py); 0 workers parses in a thread
+    PARSE_WORKERS: int = 2
+    AVITO_PARSER_BACKEND: str = "lxml"
+
+    # Record/replay of fetched pages (app/utils/replay.py): "", "record" or "replay"
+    REPLAY_MODE: str = ""
+    REPLAY_DIR: str = "replay/default"
+
+    # Adaptive per-source politeness (app/parsers/politeness.py): requests/sec bounds for AIMD pacing,
+    # per-request attempts and the circuit breaker
+    SOURCE_START_RATES: dict[str, float] = {"cian": 0.5, "avito": 1.0}
+    SOURCE_MAX_RATES: dict[str, float] = {"cian": 3.0, "avito": 5.0}
+    SOURCE_MIN_RATE: float = 0.05
+    SOURCE_RATE_INCREASE: float = 0.05
+    SOURCE_RATE_DECREASE: float = 0.7
+    SOURCE_LATENCY_TARGETS: dict[str, float] = {"cian": 10.0, "avito": 4.0}
+    SOURCE_MAX_ATTEMPTS: int = 3
+    SOURCE_BREAKER_FAILURES: int = 5
+    SOURCE_BREAKER_COOLDOWN: float = 60.0
 
     class Config:
         env_file = ".env"
@@ -1,11 +1,235 @@
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+
 from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_bulk
 from app.core.config import settings
+from app.models.listing import dumps, orjson
+from app.utils.logger import logger
+from app.utils.metrics import ES_BULK_SECONDS, ES_DOCUMENTS
+
+try:
+    from elasticsearch.serializer import OrjsonSerializer
+except ImportError:
+    OrjsonSerializer = None
+
+# Responses (and anything not pre-serialized) go through orjson when it is installed
+es = AsyncElasticsearch(settings.ELASTICSEARCH_URL,
+                        **({"serializer": OrjsonSerializer()} if OrjsonSerializer and orjson else {}))
+
+INDEX_NAME = "properties"
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# Explicit mapping for PropertyBase fields (plus the extra listing fields parsers emit)
+PROPERTY_MAPPINGS = {
+    "dynamic": False,
+    "properties": {
+        "source": {"type": "keyword"},
+        "external_id": {"type": "keyword"},
+        "title": {"type": "text", "fields": {"raw": {"type": "keyword", "ignore_above": 256}}},
+        "price": {"type": "double"},
+        "rooms": {"type": "short"},
+        "area": {"type": "float"},
+        "location": {"type": "geo_point"},
+        "photos": {"type": "keyword", "index": False},
+        "address": {"type": "text"},
+        "district": {"type": "keyword"},
+        "floor": {"type": "short"},
+        "total_floors": {"type": "short"},
+        "price_per_m2": {"type": "double"},
+        "link": {"type": "keyword", "index": False},
+        "content_hash": {"type": "keyword", "index": False},
+    },
+}
+
+PROPERTY_SETTINGS = {"number_of_shards": 1, "number_of_replicas": 0, "refresh_interval": "1s"}
+
+PROPERTY_TEMPLATE = {
+    "index_patterns": [f"{INDEX_NAME}*"],
+    "template": {"settings": PROPERTY_SETTINGS, "mappings": PROPERTY_MAPPINGS},
+}
+
+
+async def ensure_index(client: AsyncElasticsearch = es, index: str = INDEX_NAME):
+    await client.indices.put_index_template(name=f"{INDEX_NAME}-template", body=PROPERTY_TEMPLATE)
+    if not await client.indices.exists(index=index):
+        await client.indices.create(index=index, body={"settings": PROPERTY_SETTINGS, "mappings": PROPERTY_MAPPINGS})
+
+
+def _geo_point(location: Any) -> Optional[dict]:
+    if not isinstance(location, dict):
+        return None
+    lat = location.get("lat", location.get("latitude"))
+    lon = location.get("lon", location.get("lng", location.get("longitude")))
+    if lat is None or lon is None:
+        return None
+    return {"lat": float(lat), "lon": float(lon)}
+
+
+def prepare_document(property: Any) -> dict:
+    doc = property.dict() if hasattr(property, "dict") else dict(property)
+    if "location" in doc:
+        doc["location"] = _geo_point(doc["location"])
+    doc.pop("content_hash", None)
+    doc["content_hash"] = content_hash(doc)
+    return doc
+
+
+def content_hash(doc: dict) -> str:
+    return hashlib.blake2b(dumps(doc, sort_keys=True), digest_size=16).hexdigest()
+
+
+class BulkIndexer:
+    """Buffers listings and writes them through the _bulk API.
+
+    The buffer is flushed when it holds ``max_docs`` documents or
+    ``max_bytes`` of source, and at least every ``flush_interval`` seconds
+    while started. Only failed items are retried; documents whose content
+    hash matches the last indexed version are skipped.
+    """
+
+    def __init__(self, client: AsyncElasticsearch = es, index: str = INDEX_NAME, max_docs: int = 500,
+                 max_bytes: int = 5 * 1024 * 1024, flush_interval: float = 2.0, max_retries: int = 3,
+                 retry_backoff: float = 0.5):
+        self.client = client
+        self.index = index
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._buffer: list[dict] = []
+        self._buffer_bytes = 0
+        self._hashes: dict[str, str] = {}
+        # Content hashes of buffered documents, whose _source is already serialized
+        self._pending: dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self.stats = {"indexed": 0, "skipped": 0, "failed": 0, "retried": 0, "flushes": 0}
+
+    async def add(self, property: Any):
+        doc = prepare_document(property)
+        doc_id = str(doc["external_id"])
+        if self._hashes.get(doc_id) == doc["content_hash"]:
+            self._count("skipped")
+            return
+        # Serialized once here; the bulk helper passes bytes through untouched on every (re)try
+        source = dumps(doc)
+        self._buffer.append({"_op_type": "index", "_index": self.index, "_id": doc_id, "_source": source})
+        self._pending[doc_id] = doc["content_hash"]
+        self._buffer_bytes += len(source)
+        if len(self._buffer) >= self.max_docs or self._buffer_bytes >= self.max_bytes:
+            await self.flush()
+
+    async def add_many(self, properties: list):
+        for property in properties:
+            await self.add(property)
+
+    def _count(self, result: str, n: int = 1):
+        self.stats[result] += n
+        ES_DOCUMENTS.labels(result=result).inc(n)
+
+    async def flush(self):
+        async with self._lock:
+            actions, self._buffer, self._buffer_bytes = self._buffer, [], 0
+            pending, self._pending = self._pending, {}
+            attempt = 0
+            while actions:
+                self.stats["flushes"] += 1
+                with ES_BULK_SECONDS.time():
+                    _, errors = await async_bulk(
+                        self.client, actions, chunk_size=self.max_docs, max_chunk_bytes=self.max_bytes,
+                        raise_on_error=False, raise_on_exception=False, refresh=False,
+                    )
+                failed_ids = {}
+                for error in errors:
+                    item = next(iter(error.values()))
+                    failed_ids[str(item.get("_id"))] = item.get("status")
+                for action in actions:
+                    if action["_id"] not in failed_ids:
+                        self._hashes[action["_id"]] = pending[action["_id"]]
+                        self._count("indexed")
+                retry = [a for a in actions if failed_ids.get(a["_id"]) in RETRY_STATUSES]
+                self._count("failed", len(failed_ids) - len(retry))
+                attempt += 1
+                if retry and attempt > self.max_retries:
+                    logger.error(f"[ES] Giving up on {len(retry)} documents after {self.max_retries} retries")
+                    self._count("failed", len(retry))
+                    break
+                if retry:
+                    self._count("retried", len(retry))
+                    await asyncio.sleep(min(self.retry_backoff * 2 ** (attempt - 1), 10))
+                actions = retry
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._buffer:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"[ES] Periodic flush failed: {str(e)}")
+
+    def start(self):
+        if not self._timer or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    @asynccontextmanager
+    async def bulk_load(self):
+        """Disable refresh for a large load, then refresh once at the end"""
+        await self.client.indices.put_settings(index=self.index, body={"index": {"refresh_interval": "-1"}})
+        self.start()
+        try:
+            yield self
+        finally:
+            await self.close()
+            await self.client.indices.put_settings(
+                index=self.index, body={"index": {"refresh_interval": PROPERTY_SETTINGS["refresh_interval"]}}
+            )
+            await self.client.indices.refresh(index=self.index)
+
+
+bulk_indexer = BulkIndexer()
+
+
+async def search_page(size: int, after: Optional[list] = None, query: Optional[dict] = None,
+                      client: AsyncElasticsearch = es, index: str = INDEX_NAME) -> tuple[list[dict], Optional[list]]:
+    """One page ordered by (price, external_id) via search_after, plus the sort values to continue from"""
+    body = {"size": size, "query": query or {"match_all": {}},
+            "sort": [{"price": {"order": "asc", "missing": "_last"}}, {"external_id": "asc"}]}
+    if after:
+        body["search_after"] = after
+    response = await client.search(index=index, body=body)
+    hits = response["hits"]["hits"]
+    return [hit["_source"] for hit in hits], hits[-1]["sort"] if len(hits) == size else None
+
+
+_index_ready = False
+
+
+async def index_listings(properties: list):
+    """Index one scrape chunk as it arrives; listings unchanged since the last chunk are skipped by content hash"""
+    global _index_ready
+    if not _index_ready:
+        await ensure_index()
+        _index_ready = True
+    await bulk_indexer.add_many(properties)
+    await bulk_indexer.flush()
 
-es = AsyncElasticsearch(settings.ELASTICSEARCH_URL)
 
 async def index_property(property: dict):
-    await es.index(
-        index="properties",
-        body=property,
-        id=property["external_id"]
-    )
+    bulk_indexer.start()
+    await bulk_indexer.add(property)
+
+
+async def index_properties(properties: list):
+    async with bulk_indexer.bulk_load():
+        await bulk_indexer.add_many(properties)
@@ -0,0 +1,6 @@
+from app.parsers.avito.parser import AvitoParser
+
+
+def get_parsers() -> list:
+    """Sources the /properties endpoints fan out to; each has ``async parse(city, params)``"""
+    return [AvitoParser()]
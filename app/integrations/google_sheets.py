@@ -1,19 +1,47 @@
+import asyncio
 import gspread
 from google.oauth2.service_account import Credentials
 from typing import Optional
 import os
+import re
+import time
 from dotenv import load_dotenv
 from datetime import datetime
 
 load_dotenv()
 
+LINK_COLUMN = 4  # Column D - links
+PRICE_COLUMNS = "M{row}:N{row}"  # Цена, Цена за м²
+STATUS_COLUMN = "O{row}"  # Статус
+ID_IN_LINK = re.compile(r"\d{5,}")
+
+
+class SheetState:
+    """Cached view of a worksheet: external IDs already exported, their rows and the next row ID"""
+
+    def __init__(self, values: list[list[str]]):
+        self.next_id = len(values)
+        self.existing_ids: set[str] = set()
+        self.rows: dict[str, int] = {}
+        for row_num, row in enumerate(values[1:], start=2):
+            if len(row) >= LINK_COLUMN:
+                for ext_id in ID_IN_LINK.findall(row[LINK_COLUMN - 1]):
+                    self.existing_ids.add(ext_id)
+                    self.rows[ext_id] = row_num
+
 
 class GoogleSheetsExporter:
-    def __init__(self, creds_path: Optional[str] = None):
+    def __init__(self, creds_path: Optional[str] = None, batch_size: int = 50, flush_interval: float = 30.0):
         self.creds_path = creds_path or os.getenv("GOOGLE_CREDS_PATH")
         self.spreadsheet_id = os.getenv("GOOGLE_SPREADSHEET_ID")
         self.client = None
         self.sheet = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._worksheets: dict[str, gspread.Worksheet] = {}
+        self._state: dict[str, SheetState] = {}
+        self._pending: dict[str, dict[str, dict]] = {}
+        self._last_flush = time.monotonic()
 
     def connect(self):
         """Connect to Google Sheets"""
@@ -27,20 +55,38 @@ class GoogleSheetsExporter:
         self.client = gspread.authorize(creds)
         self.sheet = self.client.open_by_key(self.spreadsheet_id)
 
-    def add_listing(self, listing: dict, sheet_name: str = "Объекты"):
-        """Add listing to sheet"""
-        if not self.sheet:
-            self.connect()
-
-        worksheet = self.sheet.worksheet(sheet_name)
-        
-        # Get next ID
-        all_values = worksheet.get_all_values()
-        next_id = len(all_values)
-
-        # Prepare row
-        row = [
-            str(next_id),  # ID
+    def worksheet(self, sheet_name: str):
+        """Worksheet handle, fetched once per sheet"""
+        if sheet_name not in self._worksheets:
+            if not self.sheet:
+                self.connect()
+            self._worksheets[sheet_name] = self.sheet.worksheet(sheet_name)
+        return self._worksheets[sheet_name]
+
+    def state(self, sheet_name: str) -> SheetState:
+        """Existing IDs and row counter, loaded with a single read and then kept up to date"""
+        if sheet_name not in self._state:
+            self._state[sheet_name] = SheetState(self.worksheet(sheet_name).get_all_values())
+        return self._state[sheet_name]
+
+    def refresh(self, sheet_name: Optional[str] = None):
+        """Drop cached state, e.g. after rows were edited by hand"""
+        if sheet_name:
+            self._state.pop(sheet_name, None)
+        else:
+            self._state.clear()
+
+    @staticmethod
+    def _listing_id(listing: dict) -> str:
+        if listing.get("external_id"):
+            return str(listing["external_id"])
+        ids = ID_IN_LINK.findall(listing.get("link", ""))
+        return ids[-1] if ids else listing.get("link", "")
+
+    @staticmethod
+    def _build_row(listing: dict, row_id: int) -> list[str]:
+        return [
+            str(row_id),  # ID
             datetime.now().strftime("%d.%m.%Y"),  # Дата
             listing.get("source", ""),  # Источник
             listing.get("link", ""),  # Ссылка
@@ -58,21 +104,95 @@ class GoogleSheetsExporter:
             ""  # Комментарий М.А.
         ]
 
-        worksheet.append_row(row)
-        return next_id
+    def add_listings(self, listings: list[dict], sheet_name: str = "Объекты",
+                     skip_existing: bool = True) -> list[int]:
+        """Append a batch of listings with one append_rows call; returns the new row IDs"""
+        state = self.state(sheet_name)
+        rows, ids, batch_ids = [], [], {}
+        for listing in listings:
+            ext_id = self._listing_id(listing)
+            if skip_existing and (ext_id in state.existing_ids or ext_id in batch_ids):
+                continue
+            row_id = state.next_id + len(rows)
+            batch_ids[ext_id] = row_id + 1  # header is row 1
+            rows.append(self._build_row(listing, row_id))
+            ids.append(row_id)
+        if not rows:
+            return []
+
+        self.worksheet(sheet_name).append_rows(rows, value_input_option="RAW")
+        state.next_id += len(rows)
+        state.existing_ids.update(batch_ids)
+        state.rows.update(batch_ids)
+        return ids
+
+    def add_listing(self, listing: dict, sheet_name: str = "Объекты"):
+        """Add listing to sheet"""
+        return self.add_listings([listing], sheet_name, skip_existing=False)[0]
+
+    def update_listings(self, events: list[dict], sheet_name: str = "Объекты") -> int:
+        """Apply price_changed / removed events to exported rows with one batch_update call"""
+        state = self.state(sheet_name)
+        updates = []
+        for event in events:
+            listing = event.get("listing") or {}
+            row = state.rows.get(self._listing_id(listing))
+            if not row:
+                continue
+            if event.get("type") == "price_changed":
+                values = [[str(listing.get("price", 0)), str(listing.get("price_per_m2", 0))]]
+                updates.append({"range": PRICE_COLUMNS.format(row=row), "values": values})
+            elif event.get("type") == "removed":
+                updates.append({"range": STATUS_COLUMN.format(row=row), "values": [["Снято"]]})
+        if updates:
+            self.worksheet(sheet_name).batch_update(updates, value_input_option="RAW")
+        return len(updates)
+
+    def apply_events(self, events: list[dict], sheet_name: str = "Объекты") -> int:
+        """Consume a batch from the listing event stream: queue new rows, patch changed ones"""
+        changes = []
+        for event in events:
+            if event.get("type") == "new":
+                self.enqueue(event["listing"], sheet_name)
+            else:
+                changes.append(event)
+        # Rows for listings still in the write-behind queue must exist before they can be patched
+        if any(self._listing_id(e.get("listing") or {}) in self._pending.get(sheet_name, {}) for e in changes):
+            self.flush()
+        return self.update_listings(changes, sheet_name)
+
+    async def follow(self, events, sheet_name: str = "Объекты", group: str = "google-sheets",
+                     consumer: str = "sheets"):
+        """Mirror a ListingEvents stream into the sheet under its own consumer group.
+
+        Each stream batch is written before it is acked, so it also takes the
+        place of the write-behind queue here: one append_rows per batch.
+        """
+        async for batch in events.consume_batches(group, consumer):
+            await asyncio.to_thread(self.apply_events, batch, sheet_name)
+            await asyncio.to_thread(self.flush)
 
     def check_exists(self, external_id: str, sheet_name: str = "Объекты") -> bool:
         """Check if listing already exists"""
-        if not self.sheet:
-            self.connect()
-
-        worksheet = self.sheet.worksheet(sheet_name)
-        links = worksheet.col_values(4)  # Column D - links
-        
-        for link in links:
-            if external_id in link:
-                return True
-        return False
+        external_id = str(external_id)
+        return external_id in self.state(sheet_name).existing_ids or external_id in self._pending.get(sheet_name, {})
+
+    def enqueue(self, listing: dict, sheet_name: str = "Объекты"):
+        """Write-behind insert: repeated listings coalesce, rows go out in batches"""
+        self._pending.setdefault(sheet_name, {})[self._listing_id(listing)] = listing
+        pending = sum(len(p) for p in self._pending.values())
+        if pending >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every queued listing; one append_rows call per sheet"""
+        written = 0
+        for sheet_name in list(self._pending):
+            listings = list(self._pending[sheet_name].values())
+            written += len(self.add_listings(listings, sheet_name))
+            del self._pending[sheet_name]
+        self._last_flush = time.monotonic()
+        return written
 
 
 # Instance for direct use
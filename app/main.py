@@ -0,0 +1,8 @@
+from fastapi import FastAPI
+
+from app.api.endpoints import properties
+from app.utils.metrics import instrument_app
+
+app = FastAPI(title="RentScout")
+app.include_router(properties.router)
+instrument_app(app)
@@ -0,0 +1,84 @@
+import json
+from dataclasses import dataclass, field, fields
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@dataclass(slots=True)
+class Listing:
+    """Listing record used inside the pipeline (parsers, dedup, filters, ES bulk).
+
+    No validation and no per-instance ``__dict__``: parsers already produce
+    typed values, and pydantic models (``CianListing``, ``PropertySchema``)
+    are only built at the API boundary. ``dict()`` and ``get()`` mirror the
+    pydantic / dict interfaces the rest of the code already accepts.
+    """
+
+    source: str
+    external_id: str
+    title: str = ""
+    price: float = 0.0
+    address: str = ""
+    district: Optional[str] = None
+    metro: Optional[str] = None
+    area: float = 0.0
+    floor: int = 0
+    total_floors: int = 0
+    rooms: int = 0
+    price_per_m2: float = 0.0
+    renovation: Optional[str] = None
+    has_parking: bool = False
+    seller_type: Optional[str] = None
+    link: str = ""
+    photos: list[str] = field(default_factory=list)
+    location: Optional[dict] = None
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name, default)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Listing":
+        return cls(**{k: v for k, v in data.items() if k in LISTING_FIELD_SET})
+
+    def to_model(self, model: Any) -> Any:
+        """Validated pydantic model for the API; fields the model does not declare are dropped"""
+        return model(**self.dict())
+
+    # Defined last: inside the class body the name shadows the builtin used in the annotations above
+    def dict(self) -> dict:
+        return {name: getattr(self, name) for name in LISTING_FIELDS}
+
+    # pydantic v2's name, so callers can treat Listing and the API models alike
+    model_dump = dict
+
+
+LISTING_FIELDS = tuple(f.name for f in fields(Listing))
+LISTING_FIELD_SET = frozenset(LISTING_FIELDS)
+
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, "dict"):
+        return obj.dict()
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    # numpy scalars from the filter frame
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    """UTF-8 JSON; orjson serializes Listing slots directly without building a dict first"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        return orjson.dumps(obj, default=_default, option=option | orjson.OPT_SORT_KEYS if sort_keys else option)
+    return json.dumps(obj, default=_default, ensure_ascii=False, sort_keys=sort_keys,
+                      separators=(",", ":")).encode()
+
+
+def loads(raw: Any) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
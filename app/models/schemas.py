@@ -10,10 +10,15 @@ class PropertyBase(BaseModel):
     area: Optional[float]
     location: Optional[dict]
     photos: list[str] = []
+    # Every (source, external_id, price, link) the same flat was found under, see services/clustering.py
+    sources: list[dict] = []
 
 class PropertyCreate(PropertyBase):
     pass
 
+# Listings as returned by the API and the filters (imported by both, never defined until now)
+PropertySchema = PropertyBase
+
 class Property(PropertyBase):
     id: str
     
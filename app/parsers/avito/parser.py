@@ -1,33 +1,156 @@
-import httpx
+from typing import NamedTuple, Optional
+
 from bs4 import BeautifulSoup
-from app.models.schemas import PropertyCreate
+from lxml import etree, html as lxml_html
+
 from app.core.config import settings
-from tenacity import retry, stop_after_attempt
+from app.models.schemas import PropertyCreate
+from app.parsers.avito.selectors import (
+    ADDRESS_CSS, ADDRESS_XPATH, ITEM_CSS, ITEM_XPATH, LINK_CSS, LINK_XPATH, PHOTO_CSS, PHOTO_XPATH, PRICE_CSS,
+    PRICE_XPATH, STREET_CSS, STREET_XPATH, TITLE_CSS, TITLE_XPATH,
+)
+from app.parsers.cian.geo_utils import matcher_from_filters
+from app.parsers.http_client import http_clients
+from app.parsers.politeness import THROTTLE_STATUSES, SourceScheduler, Throttled, retry_after, source_scheduler
+from app.utils.logger import logger
+from app.utils.metrics import CARDS_PARSED, PARSE_FAILURES, timed
+from app.utils.process_pool import run_cpu_bound
+
+try:
+    # selectolax 1.0 dropped the old Modest backend (selectolax.parser); Lexbor is the one left
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+BASE_URL = "https://www.avito.ru"
+# Avito answers suspected bots with a 200 "access restricted" page instead of the listings
+BLOCKED_MARKER = "firewall-title"
+
+
+class AvitoItem(NamedTuple):
+    """Compact, picklable listing record; PropertyCreate is only built when a caller needs it"""
+    external_id: str
+    title: str
+    price: float
+    link: str
+    source: str = "avito"
+    # Needed by cross-source clustering (services/clustering.py); empty when the card has none
+    address: str = ""
+    district: Optional[str] = None
+    photos: tuple[str, ...] = ()
+
+
+def _item(external_id: str, title: str, price: float, href: str, street: Optional[str], geo: Optional[str],
+          photos: list[str]) -> AvitoItem:
+    address = (street or "").strip()
+    return AvitoItem(external_id, title, price, BASE_URL + href, address=address,
+                     district=matcher_from_filters({}).district_name(geo or address), photos=tuple(photos))
+
+
+def _parse_lxml(html: str) -> tuple[list[AvitoItem], list[str]]:
+    items, errors = [], []
+    try:
+        root = lxml_html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return items, errors
+    for node in ITEM_XPATH(root):
+        try:
+            street, geo = STREET_XPATH(node), ADDRESS_XPATH(node)
+            items.append(_item(node.attrib["data-item-id"], TITLE_XPATH(node)[0].text_content(),
+                               float(PRICE_XPATH(node)[0]), LINK_XPATH(node)[0],
+                               street[0].text_content() if street else None,
+                               geo[0].text_content() if geo else None, PHOTO_XPATH(node)))
+        except Exception as e:
+            errors.append(type(e).__name__)
+    return items, errors
+
+
+def _parse_selectolax(html: str) -> tuple[list[AvitoItem], list[str]]:
+    items, errors = [], []
+    for node in HTMLParser(html).css(ITEM_CSS):
+        try:
+            street, geo = node.css_first(STREET_CSS), node.css_first(ADDRESS_CSS)
+            items.append(_item(node.attributes["data-item-id"], node.css_first(TITLE_CSS).text(),
+                               float(node.css_first(PRICE_CSS).attributes["content"]),
+                               node.css_first(LINK_CSS).attributes["href"], street and street.text(),
+                               geo and geo.text(), [img.attributes["src"] for img in node.css(PHOTO_CSS)
+                                                    if img.attributes.get("src")]))
+        except Exception as e:
+            errors.append(type(e).__name__)
+    return items, errors
+
+
+def _parse_bs4(html: str) -> tuple[list[AvitoItem], list[str]]:
+    items, errors = [], []
+    for node in BeautifulSoup(html, "lxml").select(ITEM_CSS):
+        try:
+            street, geo = node.select_one(STREET_CSS), node.select_one(ADDRESS_CSS)
+            items.append(_item(node["data-item-id"], node.select_one(TITLE_CSS).text,
+                               float(node.select_one(PRICE_CSS)["content"]), node.select_one(LINK_CSS)["href"],
+                               street and street.text, geo and geo.text,
+                               [img["src"] for img in node.select(PHOTO_CSS) if img.get("src")]))
+        except Exception as e:
+            errors.append(type(e).__name__)
+    return items, errors
+
+
+BACKENDS = {"lxml": _parse_lxml, "selectolax": _parse_selectolax, "bs4": _parse_bs4}
+
+
+if settings.AVITO_PARSER_BACKEND == "selectolax" and HTMLParser is None:
+    logger.warning("[Avito] selectolax is not installed, parsing with lxml")
+else:
+    logger.info(f"[Avito] Parsing with {settings.AVITO_PARSER_BACKEND}")
+
+
+def parse_html(html: str, backend: str = "lxml") -> tuple[list[AvitoItem], list[str]]:
+    """Items of a result page plus the error type of each item that failed to parse"""
+    if backend == "selectolax" and HTMLParser is None:
+        backend = "lxml"
+    return BACKENDS[backend](html)
+
+
+def to_property(item: AvitoItem) -> PropertyCreate:
+    return PropertyCreate(**item._asdict(), rooms=None, area=None, location=None)
+
 
 class AvitoParser:
-    BASE_URL = "https://www.avito.ru"
+    SOURCE = "avito"
+    BASE_URL = BASE_URL
+
+    def __init__(self, backend: Optional[str] = None, scheduler: Optional[SourceScheduler] = None):
+        self.backend = backend or settings.AVITO_PARSER_BACKEND
+        self.scheduler = scheduler or source_scheduler(self.SOURCE)
+
+    async def fetch_items(self, city: str) -> list[AvitoItem]:
+        html = await self.scheduler.call(self._fetch, f"{self.BASE_URL}/{city}/sdam/na_sutki")
+        return await self.parse_items(html)
+
+    async def _fetch(self, url: str) -> str:
+        async with timed("avito", "fetch"):
+            response = await http_clients.get(url)
+        # Raising lets the scheduler retry, and the retry go out through another proxy
+        if response.status_code in THROTTLE_STATUSES:
+            raise Throttled(f"http_{response.status_code}", retry_after(response.headers.get("retry-after")))
+        response.raise_for_status()
+        if BLOCKED_MARKER in response.text:
+            raise Throttled("captcha")
+        return response.text
+
+    async def parse_items(self, html: str) -> list[AvitoItem]:
+        # Parsing runs in the process pool so large pages never stall the event loop
+        async with timed("avito", "parse"):
+            items, errors = await run_cpu_bound(parse_html, html, self.backend)
+        for error in errors:
+            PARSE_FAILURES.labels(source="avito", stage="card", error=error).inc()
+        if errors:
+            logger.warning(f"[Avito] {len(errors)} items failed to parse: {sorted(set(errors))}")
+        CARDS_PARSED.labels(source="avito").inc(len(items))
+        return items
 
-    @retry(stop=stop_after_attempt(3))
     async def parse_listing(self, city: str) -> list[PropertyCreate]:
-        url = f"{self.BASE_URL}/{city}/sdam/na_sutki"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            return self._parse_html(response.text)
-
-    def _parse_html(self, html: str) -> list[PropertyCreate]:
-        soup = BeautifulSoup(html, "lxml")
-        properties = []
-        
-        for item in soup.select("[data-marker='item']"):
-            try:
-                props = {
-                    "source": "avito",
-                    "external_id": item["data-item-id"],
-                    "title": item.select_one("[itemprop='name']").text,
-                    "price": float(item.select_one("[itemprop='price']")["content"]),
-                    "link": self.BASE_URL + item.select_one("a[data-marker='item-title']")["href"]
-                }
-                properties.append(PropertyCreate(**props))
-            except Exception as e:
-                print(f"Error parsing item: {e}")
-        return properties
+        return [to_property(item) for item in await self.fetch_items(city)]
+
+    async def parse(self, city: str, params: Optional[dict] = None) -> list[PropertyCreate]:
+        """Entry point for the /properties fan-out; the search page only lists flats, so ``params`` is unused"""
+        return await self.parse_listing(city)
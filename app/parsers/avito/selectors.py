@@ -0,0 +1,20 @@
+from lxml import etree
+
+# CSS for selectolax / BeautifulSoup
+ITEM_CSS = "[data-marker='item']"
+TITLE_CSS = "[itemprop='name']"
+PRICE_CSS = "[itemprop='price']"
+LINK_CSS = "a[data-marker='item-title']"
+# First span is the street address, the whole block also names the metro or district
+ADDRESS_CSS = "[data-marker='item-address']"
+STREET_CSS = "[data-marker='item-address'] span"
+PHOTO_CSS = "img[itemprop='image']"
+
+# Compiled once per process, evaluated relative to an item node
+ITEM_XPATH = etree.XPath("//*[@data-marker='item']")
+TITLE_XPATH = etree.XPath(".//*[@itemprop='name']")
+PRICE_XPATH = etree.XPath(".//*[@itemprop='price']/@content")
+LINK_XPATH = etree.XPath(".//a[@data-marker='item-title']/@href")
+ADDRESS_XPATH = etree.XPath(".//*[@data-marker='item-address']")
+STREET_XPATH = etree.XPath(".//*[@data-marker='item-address']//span")
+PHOTO_XPATH = etree.XPath(".//img[@itemprop='image']/@src")
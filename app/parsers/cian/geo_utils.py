@@ -0,0 +1,91 @@
+import json
+import re
+from functools import lru_cache
+from typing import Iterable, Optional
+
+TTK_DISTRICT_IDS = {
+    "Арбат": 13, "Басманный": 14, "Замоскворечье": 15,
+    "Красносельский": 16, "Мещанский": 17, "Пресненский": 18,
+    "Таганский": 19, "Тверской": 20, "Хамовники": 21, "Якиманка": 22,
+    "Беговой": 94, "Савёловский": 96, "Марьина Роща": 160,
+    "Сокольники": 149, "Лефортово": 150, "Южнопортовый": 154,
+    "Даниловский": 136, "Донской": 137, "Дорогомилово": 109,
+}
+
+TTK_DISTRICT_NAMES = list(TTK_DISTRICT_IDS.keys())
+
+# Mentions of the Central okrug count as inside the TTK even without a district name
+CENTRAL_MARKERS = ("цао", "центральный")
+_CENTRAL = "\0central"
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+class DistrictMatcher:
+    """Resolves an address to a district in one regex pass.
+
+    All known names and aliases are normalized (case, ё/е, whitespace) and
+    compiled into a single alternation; results for repeated strings are
+    memoized.
+    """
+
+    def __init__(self, ttk_names: Iterable[str], aliases: Optional[dict[str, list[str]]] = None,
+                 cache_size: int = 65536):
+        self.ttk = set(ttk_names)
+        variants: dict[str, str] = {}
+        for name in [*TTK_DISTRICT_NAMES, *self.ttk]:
+            variants[normalize(name)] = name
+        for name, names in (aliases or {}).items():
+            for alias in names:
+                variants[normalize(alias)] = name
+        for marker in CENTRAL_MARKERS:
+            variants.setdefault(marker, _CENTRAL)
+        self._variants = variants
+        # Longest first so overlapping names resolve to the most specific one
+        alternation = "|".join(re.escape(v) for v in sorted(variants, key=len, reverse=True))
+        # Lookahead on the possible first letters lets the engine skip most positions cheaply
+        first_chars = "".join(sorted({re.escape(v[0]) for v in variants}))
+        self._regex = re.compile(f"(?=[{first_chars}])(?:{alternation})")
+        self._resolve = lru_cache(maxsize=cache_size)(self._scan)
+
+    def _scan(self, text: str) -> tuple[Optional[str], Optional[str], bool]:
+        """(first district, first TTK district, central okrug mentioned)"""
+        first, central = None, False
+        for m in self._regex.finditer(normalize(text)):
+            name = self._variants[m.group(0)]
+            if name is _CENTRAL:
+                central = True
+                continue
+            first = first or name
+            if name in self.ttk:
+                return first, name, central
+        return first, None, central
+
+    def district_name(self, text: Optional[str]) -> Optional[str]:
+        return self._resolve(text)[0] if text else None
+
+    def district_id(self, text: Optional[str]) -> Optional[int]:
+        return TTK_DISTRICT_IDS.get(self.district_name(text))
+
+    def is_in_ttk(self, address: Optional[str], district: Optional[str] = None) -> bool:
+        if district and self._resolve(district)[1]:
+            return True
+        if address:
+            _, ttk_name, central = self._resolve(address)
+            return bool(ttk_name) or central
+        return False
+
+
+@lru_cache(maxsize=32)
+def _cached_matcher(ttk_names: tuple[str, ...], aliases_json: str) -> DistrictMatcher:
+    return DistrictMatcher(ttk_names, json.loads(aliases_json))
+
+
+def matcher_from_filters(filters: dict) -> DistrictMatcher:
+    """Shared matcher for a filters config (steinik_filters.json), built once per distinct config"""
+    ttk = filters.get("ttk_districts", {})
+    names = tuple(ttk.get("cao", [])) + tuple(ttk.get("partial", []))
+    aliases = json.dumps(filters.get("district_aliases", {}), sort_keys=True, ensure_ascii=False)
+    return _cached_matcher(names or tuple(TTK_DISTRICT_NAMES), aliases)
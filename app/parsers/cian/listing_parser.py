@@ -1,12 +1,21 @@
 import asyncio
 import json
-from playwright.async_api import async_playwright, Browser
+from dataclasses import dataclass, field
+from playwright.async_api import Page
 from typing import Optional
 from pydantic import BaseModel
-from tenacity import retry, stop_after_attempt, wait_exponential
 import re
 
+from app.core.config import settings
+from app.models.listing import Listing
+from app.parsers.cian.geo_utils import TTK_DISTRICT_IDS, TTK_DISTRICT_NAMES, matcher_from_filters
+from app.parsers.otello.session_manager import BrowserPool, browser_pool
+from app.parsers.politeness import THROTTLE_STATUSES, SourceScheduler, Throttled, retry_after, source_scheduler
+from app.services.dedup import CrawlWatermarks, DedupService, crawl_watermarks, seen_listings
+from app.utils.metrics import CARDS_PARSED, parse_failed, timed
 
+
+# Validated shape for the API boundary; the crawler itself yields app.models.listing.Listing records
 class CianListing(BaseModel):
     external_id: str
     source: str = "cian"
@@ -27,25 +36,90 @@ class CianListing(BaseModel):
     photos: list[str] = []
 
 
-TTK_DISTRICT_IDS = {
-    "Арбат": 13, "Басманный": 14, "Замоскворечье": 15,
-    "Красносельский": 16, "Мещанский": 17, "Пресненский": 18,
-    "Таганский": 19, "Тверской": 20, "Хамовники": 21, "Якиманка": 22,
-    "Беговой": 94, "Савёловский": 96, "Марьина Роща": 160,
-    "Сокольники": 149, "Лефортово": 150, "Южнопортовый": 154,
-    "Даниловский": 136, "Донской": 137, "Дорогомилово": 109,
-}
+CARD_SELECTOR = "article[data-name='CardComponent']"
+SUMMARY_SELECTOR = "[data-name='SummaryHeader']"
+# Cian redirects suspected bots to /cian-captcha/ or renders a captcha form in place of the results
+CAPTCHA_URL_RE = re.compile(r"captcha", re.I)
+CAPTCHA_SELECTOR = "#captcha, form[action*='captcha'], iframe[src*='captcha']"
+
+# Cian stops serving pages past 54 x 28 results for a single query
+CARDS_PER_PAGE = 28
+MAX_PAGES_PER_QUERY = 54
+PRICE_CEILING = 2_000_000_000
+MIN_PRICE_SPLIT = 1_000_000
+
+FLAT_ID_RE = re.compile(r"/flat/(\d+)/")
+NON_DIGIT_RE = re.compile(r"[^\d]")
+AREA_RE = re.compile(r"(\d+(?:[,.]\d+)?)\s*м")
+ROOMS_RE = re.compile(r"(\d+)-комн")
+FLOOR_RE = re.compile(r"(\d+)/(\d+)\s*этаж")
+RESULT_COUNT_RE = re.compile(r"(\d[\d\s\u00a0]*)\s*объявлен")
+
+# Card photos; also spelled out in EXTRACT_CARDS_JS
+PHOTO_SELECTOR = "[data-name='Gallery'] img"
+# Pulls every card on the page in a single evaluate() round-trip
+EXTRACT_CARDS_JS = """
+(selector) => Array.from(document.querySelectorAll(selector), (card) => {
+    const text = (sel) => {
+        const el = card.querySelector(sel);
+        return el ? el.innerText : "";
+    };
+    const link = card.querySelector("a[href*='/flat/']");
+    return {
+        link: link ? link.getAttribute("href") : "",
+        title: text("[data-name='TitleComponent']"),
+        address: text("[data-name='GeoLabel']"),
+        price: text("[data-name='Price']") || "0",
+        photos: Array.from(card.querySelectorAll("[data-name='Gallery'] img"), (img) => img.getAttribute("src"))
+            .filter(Boolean),
+    };
+})
+"""
+
+
+@dataclass
+class CrawlShard:
+    district_ids: list[int] = field(default_factory=list)
+    price_min: Optional[int] = None
+    price_max: Optional[int] = None
 
-TTK_DISTRICT_NAMES = list(TTK_DISTRICT_IDS.keys())
+    @property
+    def label(self) -> str:
+        price = f" {self.price_min or 0}-{self.price_max}" if self.price_max else ""
+        return f"d{','.join(map(str, self.district_ids))}{price}"
+
+    def split_by_price(self, price_max: int) -> list["CrawlShard"]:
+        lo, hi = self.price_min or 0, self.price_max or price_max
+        if hi - lo < 2 * MIN_PRICE_SPLIT:
+            return []
+        mid = (lo + hi) // 2
+        return [CrawlShard(self.district_ids, lo or None, mid), CrawlShard(self.district_ids, mid + 1, hi)]
 
 
 class CianParser:
+    SOURCE = "cian"
     BASE_URL = "https://www.cian.ru"
 
-    def __init__(self, filters_path: str = "/root/rentscout/config/steinik_filters.json"):
-        self.browser: Optional[Browser] = None
+    def __init__(self, filters_path: str = "/root/rentscout/config/steinik_filters.json",
+                 pool: Optional[BrowserPool] = None, batch_extract: bool = True, incremental: bool = False,
+                 seen: Optional[DedupService] = None, watermarks: Optional[CrawlWatermarks] = None,
+                 parallelism: Optional[int] = None, shard_size: Optional[int] = None, track_prices: bool = False,
+                 filters: Optional[dict] = None, scheduler: Optional[SourceScheduler] = None):
+        self.pool = pool or browser_pool
+        # Paces and retries page loads; shared by every CianParser in the process
+        self.scheduler = scheduler or source_scheduler(self.SOURCE)
+        self.parallelism = min(parallelism or settings.CIAN_PARALLEL_PAGES, settings.CIAN_PARALLEL_PAGES)
+        self.shard_size = shard_size or settings.CIAN_SHARD_SIZE
+        self.batch_extract = batch_extract
+        self.incremental = incremental
+        self.track_prices = track_prices
+        # Set by parse_listings: every shard ran out of results within max_pages
+        self.complete = False
+        self.seen = seen or seen_listings
+        self.watermarks = watermarks or crawl_watermarks
         self.filters_path = filters_path
-        self.filters = self._load_filters()
+        self.filters = self._load_filters() if filters is None else filters
+        self.districts = matcher_from_filters(self.filters)
 
     def _load_filters(self) -> dict:
         try:
@@ -55,14 +129,11 @@ class CianParser:
             return {}
 
     async def init_browser(self):
-        playwright = await async_playwright().start()
-        self.browser = await playwright.chromium.launch(
-            headless=True, args=["--no-sandbox", "--disable-dev-shm-usage"]
-        )
+        await self.pool.start()
 
     async def close(self):
-        if self.browser:
-            await self.browser.close()
+        # The browser belongs to the shared pool and stays warm between cycles
+        pass
 
     def _get_ttk_districts(self) -> list[str]:
         districts = []
@@ -71,16 +142,22 @@ class CianParser:
         districts.extend(ttk.get("partial", []))
         return districts if districts else TTK_DISTRICT_NAMES
 
-    def _build_url(self, district_ids: list[int] = None) -> str:
+    def district_ids(self) -> list[int]:
+        return [TTK_DISTRICT_IDS[d] for d in self._get_ttk_districts() if d in TTK_DISTRICT_IDS]
+
+    def _build_url(self, district_ids: list[int] = None, price_min: Optional[int] = None,
+                   price_max: Optional[int] = None) -> str:
         cfg = self.filters
         area = cfg.get("area_range", {})
-        params = ["deal_type=sale", "offer_type=flat", "region=1", "engine_version=2"]
+        params = ["deal_type=sale", "offer_type=flat", "region=1", "engine_version=2", "sort=creation_date_desc"]
         if area.get("min"):
             params.append(f"minarea={area['min']}")
         if area.get("max"):
             params.append(f"maxarea={area['max']}")
-        if cfg.get("price_max"):
-            params.append(f"maxprice={cfg['price_max']}")
+        if price_min:
+            params.append(f"minprice={price_min}")
+        if price_max or cfg.get("price_max"):
+            params.append(f"maxprice={price_max or cfg['price_max']}")
         floor = cfg.get("floor", {})
         if floor.get("not_first"):
             params.append("floornl=1")
@@ -90,94 +167,248 @@ class CianParser:
         return f"{self.BASE_URL}/cat.php?" + "&".join(params)
 
     def _is_in_ttk(self, address: str, district: str = None) -> bool:
-        ttk_districts = self._get_ttk_districts()
-        if district:
-            for d in ttk_districts:
-                if d.lower() in district.lower():
-                    return True
-        if address:
-            addr_lower = address.lower()
-            for d in ttk_districts:
-                if d.lower() in addr_lower:
-                    return True
-            if "цао" in addr_lower or "центральный" in addr_lower:
-                return True
-        return False
+        return self.districts.is_in_ttk(address, district)
 
     def _extract_district(self, address: str) -> Optional[str]:
-        for district in TTK_DISTRICT_NAMES:
-            if district.lower() in address.lower():
-                return district
-        return None
-
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    async def parse_listings(self, max_pages: int = 3) -> list[CianListing]:
-        if not self.browser:
-            await self.init_browser()
-        ttk_districts = self._get_ttk_districts()
-        district_ids = [TTK_DISTRICT_IDS[d] for d in ttk_districts if d in TTK_DISTRICT_IDS]
-        ctx = await self.browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            viewport={"width": 1920, "height": 1080}
-        )
-        page = await ctx.new_page()
+        return self.districts.district_name(address)
+
+    async def parse_listings(self, max_pages: int = 3, full_recrawl: bool = False,
+                             district_ids: Optional[list[int]] = None) -> list[Listing]:
+        """Crawl newest-first result pages for the district set, split into shards.
+
+        Shards of ``shard_size`` districts are crawled on separate pages, at
+        most ``parallelism`` at a time, fewer while the source scheduler's
+        current rate cannot keep that many busy. Page loads are paced and
+        retried one by one by the scheduler. A shard with more results than
+        ``max_pages`` can reach (at most Cian's pagination cap) is split by
+        price range until it fits; incremental runs never split. Results are
+        merged and deduplicated by external_id.
+
+        In incremental mode cards at or below a shard's stored watermark, or
+        already in the dedup store, are not parsed, and paging stops at the
+        first page with nothing new. A shard cut off by ``max_pages`` before
+        that point keeps its watermark and saves a resume page instead: the
+        next run catches up with the newest listings, then jumps there and
+        continues down to the watermark. ``full_recrawl`` ignores all of this
+        but still moves the watermarks forward once a shard ran out of pages. With ``track_prices`` known cards on the
+        pages that were loaded anyway are returned too (batch mode only, where
+        they are already extracted), so price changes can be detected.
+        """
+        if district_ids is None:
+            district_ids = self.district_ids()
+        size = self.shard_size
+        pending = [CrawlShard(district_ids[i:i + size]) for i in range(0, len(district_ids), size)] or [CrawlShard()]
+        sem = asyncio.Semaphore(self.scheduler.concurrency(self.parallelism))
+        merged: dict[str, Listing] = {}
+        errors = []
+        exhausted = True
+
+        async def crawl(shard: CrawlShard):
+            async with sem:
+                return await self._crawl_shard(shard, max_pages, full_recrawl)
+
+        while pending:
+            results = await asyncio.gather(*(crawl(shard) for shard in pending), return_exceptions=True)
+            pending = []
+            for result in results:
+                if isinstance(result, Exception):
+                    errors.append(result)
+                    continue
+                listings, splits, shard_exhausted = result
+                # A split shard is covered by its sub-shards, so only leaf shards decide completeness
+                if not splits:
+                    exhausted &= shard_exhausted
+                for listing in listings:
+                    merged.setdefault(listing.external_id, listing)
+                pending.extend(splits)
+
+        self.complete = exhausted and not errors
+        if errors:
+            if not merged:
+                raise errors[0]
+            print(f"[Cian] {len(errors)} shard(s) failed: {errors[0]}")
+        return list(merged.values())
+
+    async def _crawl_shard(self, shard: CrawlShard, max_pages: int,
+                           full_recrawl: bool) -> tuple[list[Listing], list[CrawlShard], bool]:
+        """Listings of one shard, or the sub-shards to crawl instead if it is too large.
+
+        The flag is True when paging reached the last result page.
+        """
+        query_url = self._build_url(shard.district_ids, shard.price_min, shard.price_max)
+        skip_known = self.incremental and not full_recrawl
+        watermark = await self.watermarks.get(query_url) if skip_known else None
+        resume = await self.watermarks.resume_page(query_url) if skip_known else None
+        top_id = 0
         listings = []
-        try:
-            for p_num in range(1, max_pages + 1):
-                url = self._build_url(district_ids) + f"&p={p_num}"
-                print(f"[Cian] Page {p_num}...")
-                await page.goto(url, wait_until="networkidle", timeout=45000)
-                await asyncio.sleep(2)
-                try:
-                    await page.wait_for_selector("article[data-name='CardComponent']", timeout=15000)
-                except:
+        exhausted = caught_up = resumed = False
+        p_num = 1
+        async with self.pool.page() as page:
+            for _ in range(max_pages):
+                url = query_url + f"&p={p_num}"
+                print(f"[Cian] {shard.label} page {p_num}...")
+                if not await self.scheduler.call(self._load_page, page, url):
+                    exhausted = True
                     break
-                items = await page.query_selector_all("article[data-name='CardComponent']")
-                print(f"[Cian] Found {len(items)} items")
-                for item in items:
-                    listing = await self._parse_card(item)
-                    if listing and self._is_in_ttk(listing.address, listing.district):
-                        listings.append(listing)
-                await asyncio.sleep(3)
-        finally:
-            await ctx.close()
-        return listings
-
-    async def _parse_card(self, item) -> Optional[CianListing]:
+                # Incremental runs only need the newest pages, and the watermark and resume
+                # page cover depth, so only full crawls split a query that is too deep
+                if p_num == 1 and not skip_known:
+                    total = await self._result_count(page)
+                    if total and total > min(max_pages, MAX_PAGES_PER_QUERY) * CARDS_PER_PAGE:
+                        splits = shard.split_by_price(self.filters.get("price_max") or PRICE_CEILING)
+                        if splits:
+                            print(f"[Cian] {shard.label}: {total} results, splitting by price")
+                            return [], splits, False
+                cards = await self._page_cards(page)
+                print(f"[Cian] Found {len(cards)} items")
+                # A short page is the last one, no need to load an empty page to find out
+                last_page = len(cards) < CARDS_PER_PAGE
+                only_known = reached_watermark = False
+                if self.incremental:
+                    ids = [await self._card_id(card) for card in cards]
+                    top_id = max([top_id, *(int(i) for i in ids if i)])
+                    reached_watermark = watermark is not None and any(int(i) <= watermark for i in ids if i)
+                    if skip_known:
+                        new_ids = await self._new_ids(ids, watermark)
+                        only_known = not new_ids
+                        if not (self.track_prices and self.batch_extract):
+                            cards = [card for card, i in zip(cards, ids) if i in new_ids]
+                with timed(self.SOURCE, "parse"):
+                    parsed = [l for l in [await self._parse_raw(card) for card in cards] if l]
+                CARDS_PARSED.labels(source=self.SOURCE).inc(len(parsed))
+                # district[] already limits the results; only an unrestricted query needs the address check
+                listings.extend(parsed if shard.district_ids else
+                                (l for l in parsed if self._is_in_ttk(l.address, l.district)))
+                if resumed:
+                    # Past the jump the known listings are the ones an earlier run already got to
+                    if reached_watermark:
+                        caught_up = True
+                        break
+                elif only_known and resume:
+                    print(f"[Cian] {shard.label} caught up, resuming at page {resume}")
+                    p_num, resumed = resume, True
+                    continue
+                elif only_known:
+                    print(f"[Cian] {shard.label} page {p_num} has only known listings, stopping")
+                    caught_up = True
+                    break
+                if last_page:
+                    exhausted = True
+                    break
+                p_num += 1
+        if self.incremental and top_id:
+            if exhausted or caught_up:
+                await self.watermarks.advance(query_url, top_id)
+                if resume:
+                    await self.watermarks.set_resume_page(query_url, None)
+            elif skip_known:
+                # Cut off by max_pages: listings below this page are still unseen
+                await self.watermarks.set_resume_page(query_url, p_num if resumed else min(p_num, resume or p_num))
+        return listings, [], exhausted
+
+    async def _result_count(self, page: Page) -> Optional[int]:
+        try:
+            text = await page.evaluate(
+                "(sel) => { const el = document.querySelector(sel); return el ? el.innerText : ''; }",
+                SUMMARY_SELECTOR,
+            )
+        except Exception:
+            return None
+        m = RESULT_COUNT_RE.search(text or "")
+        return int(NON_DIGIT_RE.sub("", m.group(1))) if m else None
+
+    async def _new_ids(self, ids: list[Optional[str]], watermark: Optional[int]) -> set[str]:
+        candidates = [i for i in ids if i and (watermark is None or int(i) > watermark)]
+        if not candidates:
+            return set()
+        return set(await self.seen.filter_new(self.SOURCE, candidates))
+
+    async def _load_page(self, page: Page, url: str) -> bool:
+        """False past the last result page; raises Throttled when Cian answers with a block or a captcha"""
+        async with timed(self.SOURCE, "fetch"):
+            response = await page.goto(url, wait_until="domcontentloaded", timeout=45000)
+            if response is not None and response.status in THROTTLE_STATUSES:
+                raise Throttled(f"http_{response.status}", retry_after(response.headers.get("retry-after")))
+            try:
+                await page.wait_for_selector(CARD_SELECTOR, timeout=15000)
+            except:
+                if CAPTCHA_URL_RE.search(page.url) or await page.query_selector(CAPTCHA_SELECTOR):
+                    raise Throttled("captcha")
+                return False
+        return True
+
+    async def _page_cards(self, page: Page) -> list:
+        """Card dicts in batch mode, element handles otherwise"""
+        async with timed(self.SOURCE, "extract"):
+            if self.batch_extract:
+                return await self._extract_cards(page)
+            return await page.query_selector_all(CARD_SELECTOR)
+
+    async def _card_id(self, card) -> Optional[str]:
+        if isinstance(card, dict):
+            link = card.get("link") or ""
+        else:
+            link_el = await card.query_selector("a[href*='/flat/']")
+            link = (await link_el.get_attribute("href") if link_el else "") or ""
+        ext_id = FLAT_ID_RE.search(link)
+        return ext_id.group(1) if ext_id else None
+
+    async def _parse_raw(self, card) -> Optional[Listing]:
+        if isinstance(card, dict):
+            return self._parse_card_data(card)
+        return await self._parse_card(card)
+
+    async def _parse_page(self, page: Page) -> list[Listing]:
+        cards = await self._page_cards(page)
+        print(f"[Cian] Found {len(cards)} items")
+        parsed = [await self._parse_raw(card) for card in cards]
+        return [l for l in parsed if l]
+
+    async def _parse_card(self, item) -> Optional[Listing]:
         try:
             link_el = await item.query_selector("a[href*='/flat/']")
             if not link_el:
                 return None
             link = await link_el.get_attribute("href")
-            ext_id = re.search(r"/flat/(\d+)/", link)
-            if not ext_id:
-                return None
             title_el = await item.query_selector("[data-name='TitleComponent']")
             title = await title_el.inner_text() if title_el else ""
             addr_el = await item.query_selector("[data-name='GeoLabel']")
             address = await addr_el.inner_text() if addr_el else ""
-            district = self._extract_district(address)
             price_el = await item.query_selector("[data-name='Price']")
             price_txt = await price_el.inner_text() if price_el else "0"
-            price = float(re.sub(r"[^\d]", "", price_txt) or 0)
-            area_m = re.search(r"(\d+(?:[,.]\d+)?)\s*м", title)
+            photos = [await img.get_attribute("src") for img in await item.query_selector_all(PHOTO_SELECTOR)]
+            return self._parse_card_data({"link": link, "title": title, "address": address, "price": price_txt,
+                                          "photos": [p for p in photos if p]})
+        except Exception as e:
+            parse_failed(self.SOURCE, "card_dom", e)
+            return None
+
+    async def _extract_cards(self, page: Page) -> list[dict]:
+        return await page.evaluate(EXTRACT_CARDS_JS, CARD_SELECTOR)
+
+    def _parse_card_data(self, card: dict) -> Optional[Listing]:
+        try:
+            link = card.get("link") or ""
+            ext_id = FLAT_ID_RE.search(link)
+            if not ext_id:
+                return None
+            title = card.get("title") or ""
+            address = card.get("address") or ""
+            district = self._extract_district(address)
+            price = float(NON_DIGIT_RE.sub("", card.get("price") or "0") or 0)
+            area_m = AREA_RE.search(title)
             area = float(area_m.group(1).replace(",", ".")) if area_m else 0
-            rooms_m = re.search(r"(\d+)-комн", title)
+            rooms_m = ROOMS_RE.search(title)
             rooms = int(rooms_m.group(1)) if rooms_m else 0
-            floor_m = re.search(r"(\d+)/(\d+)\s*этаж", title)
+            floor_m = FLOOR_RE.search(title)
             floor = int(floor_m.group(1)) if floor_m else 0
             total_fl = int(floor_m.group(2)) if floor_m else 0
             ppm2 = round(price / area, 0) if area > 0 else 0
-            cfg = self.filters.get("floor", {})
-            if cfg.get("not_first") and floor == 1:
-                return None
-            if cfg.get("not_last") and floor == total_fl and total_fl > 0:
-                return None
-            return CianListing(
-                external_id=ext_id.group(1), title=title, address=address,
+            return Listing(
+                source=self.SOURCE, external_id=ext_id.group(1), title=title, address=address,
                 district=district, area=area, floor=floor, total_floors=total_fl,
-                rooms=rooms, price=price, price_per_m2=ppm2, link=link, photos=[]
+                rooms=rooms, price=price, price_per_m2=ppm2, link=link, photos=card.get("photos") or []
             )
-        except:
+        except Exception as e:
+            parse_failed(self.SOURCE, "card", e)
             return None
-
@@ -0,0 +1,165 @@
+import asyncio
+import random
+import time
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+from app.utils.common import DEFAULT_USER_AGENT, LocalLRU
+from app.utils.logger import logger
+from app.utils.replay import Cassette, CassetteTransport, active_cassette
+
+try:
+    import h2  # noqa: F401  installed with httpx[http2]
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_HEADERS = {
+    "User-Agent": DEFAULT_USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/json;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.5",
+}
+# Answers that say more about the exit IP than about the request
+BLOCKED_STATUSES = frozenset({403, 407, 429})
+
+
+class ProxyPool:
+    """Proxies ranked by an EWMA success score.
+
+    A failing proxy loses score and sits out a cooldown that doubles with
+    every consecutive failure; picks are weighted by score so healthy
+    proxies share the load instead of one taking everything.
+    """
+
+    def __init__(self, proxies: list[str], decay: float = 0.3, base_cooldown: float = 30.0,
+                 max_cooldown: float = 600.0):
+        self.proxies = list(proxies)
+        self.decay = decay
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.score = {p: 1.0 for p in self.proxies}
+        self.failures = {p: 0 for p in self.proxies}
+        self.cooldown_until = {p: 0.0 for p in self.proxies}
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def choose(self) -> Optional[str]:
+        if not self.proxies:
+            return None
+        now = time.monotonic()
+        ready = [p for p in self.proxies if self.cooldown_until[p] <= now]
+        if not ready:
+            # Everything is cooling down: use the one that recovers first rather than failing outright
+            return min(self.proxies, key=self.cooldown_until.__getitem__)
+        weights = [max(self.score[p], 0.05) for p in ready]
+        return random.choices(ready, weights)[0]
+
+    def report(self, proxy: Optional[str], ok: bool):
+        if proxy is None or proxy not in self.score:
+            return
+        self.score[proxy] = (1 - self.decay) * self.score[proxy] + self.decay * (1.0 if ok else 0.0)
+        if ok:
+            self.failures[proxy] = 0
+            return
+        self.failures[proxy] += 1
+        cooldown = min(self.base_cooldown * 2 ** (self.failures[proxy] - 1), self.max_cooldown)
+        self.cooldown_until[proxy] = time.monotonic() + cooldown
+        logger.warning(f"[HTTP] Proxy {proxy} failed {self.failures[proxy]}x, cooling down {cooldown:g}s")
+
+
+class HttpClientPool:
+    """Shared httpx clients for HTTP-based parsers (avito, sutochno, yandex_travel).
+
+    One keep-alive client per exit (direct or proxy), HTTP/2 when ``h2`` is
+    installed, at most ``max_per_host`` requests in flight per host. GETs
+    are conditional: ETag / Last-Modified validators are remembered, and a
+    304 is answered with the stored body so callers always see a full 200.
+    """
+
+    def __init__(self, proxies: Optional[list[str]] = None, max_connections: Optional[int] = None,
+                 max_per_host: Optional[int] = None, timeout: Optional[float] = None,
+                 http2: Optional[bool] = None, conditional_cache_size: int = 512, headers: Optional[dict] = None,
+                 cassette: Optional[Cassette] = None):
+        if proxies is None:
+            proxies = settings.PROXY_LIST if settings.PROXY_ENABLED else []
+        self.proxies = ProxyPool(proxies)
+        self.limits = httpx.Limits(max_connections=max_connections or settings.HTTP_MAX_CONNECTIONS,
+                                   max_keepalive_connections=max_connections or settings.HTTP_MAX_CONNECTIONS)
+        self.max_per_host = max_per_host or settings.HTTP_MAX_PER_HOST
+        self.timeout = httpx.Timeout(timeout or settings.HTTP_TIMEOUT)
+        self.http2 = HTTP2_AVAILABLE and (settings.HTTP_HTTP2 if http2 is None else http2)
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.validators = LocalLRU(conditional_cache_size)
+        # Record/replay (app/utils/replay.py): requests go through the cassette instead of straight out
+        self.cassette = cassette
+        self.stats = {"requests": 0, "not_modified": 0, "clients": 0}
+        self._clients: dict[Optional[str], httpx.AsyncClient] = {}
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+
+    def client(self, proxy: Optional[str] = None) -> httpx.AsyncClient:
+        client = self._clients.get(proxy)
+        if client is None or client.is_closed:
+            if self.cassette is not None:
+                transport = httpx.AsyncHTTPTransport(http2=self.http2, limits=self.limits, proxy=proxy)
+                client = httpx.AsyncClient(transport=CassetteTransport(self.cassette, transport),
+                                           timeout=self.timeout, headers=self.headers, follow_redirects=True)
+            else:
+                client = httpx.AsyncClient(
+                    http2=self.http2, limits=self.limits, timeout=self.timeout, headers=self.headers,
+                    follow_redirects=True, proxy=proxy,
+                )
+            self._clients[proxy] = client
+            self.stats["clients"] += 1
+        return client
+
+    def _slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_slots[host]
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        proxy = self.proxies.choose()
+        async with self._slot(url):
+            self.stats["requests"] += 1
+            try:
+                response = await self.client(proxy).request(method, url, **kwargs)
+            except httpx.TransportError:
+                self.proxies.report(proxy, ok=False)
+                raise
+        self.proxies.report(proxy, ok=response.status_code not in BLOCKED_STATUSES)
+        return response
+
+    async def get(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                  conditional: bool = True) -> httpx.Response:
+        key = str(httpx.URL(url, params=params))
+        cached = self.validators.get(key) if conditional else None
+        headers = dict(headers or {})
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        response = await self.request("GET", url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            self.stats["not_modified"] += 1
+            return httpx.Response(200, headers=cached["headers"], content=cached["content"],
+                                  request=response.request, extensions={"not_modified": True})
+        etag, last_modified = response.headers.get("etag"), response.headers.get("last-modified")
+        if conditional and response.status_code == 200 and (etag or last_modified):
+            headers = {k: v for k, v in response.headers.items()
+                       if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")}
+            self.validators.set(key, {"etag": etag, "last_modified": last_modified,
+                                      "headers": headers, "content": response.content})
+        return response
+
+    async def close(self):
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+
+
+http_clients = HttpClientPool(cassette=active_cassette())
@@ -0,0 +1,139 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, Route, async_playwright
+
+from app.utils.common import DEFAULT_USER_AGENT
+from app.utils.logger import logger
+from app.utils.metrics import BROWSER_LAUNCH_SECONDS
+from app.utils.replay import replay_route
+
+LAUNCH_ARGS = ["--no-sandbox", "--disable-dev-shm-usage"]
+
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font"})
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "mc.yandex.ru", "an.yandex.ru", "top-fwz1.mail.ru", "vk.com/rtrg",
+    "facebook.net", "criteo", "adfox",
+)
+
+
+async def block_heavy_requests(route: Route):
+    """Abort images, fonts and tracker requests; let everything else through"""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(h in request.url for h in BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class _Lease:
+    __slots__ = ("context", "uses")
+
+    def __init__(self, context: BrowserContext):
+        self.context = context
+        self.uses = 0
+
+
+class BrowserPool:
+    """One long-lived Chromium shared by Playwright parsers (cian, tvil).
+
+    Contexts are leased out and returned to the pool; a context is recycled
+    after ``max_uses`` leases so cookies and memory do not accumulate.
+    ``route_handler`` replaces the resource blocking for every context
+    (e.g. ``Cassette.route`` to record or replay pages).
+    """
+
+    def __init__(self, max_contexts: int = 4, max_uses: int = 20, block_resources: bool = True,
+                 headless: bool = True, context_options: Optional[dict] = None,
+                 route_handler: Optional[Callable[[Route], Awaitable[Any]]] = None):
+        self.max_contexts = max_contexts
+        self.max_uses = max_uses
+        self.block_resources = block_resources
+        self.route_handler = route_handler
+        self.headless = headless
+        self.context_options = context_options or {
+            "user_agent": DEFAULT_USER_AGENT,
+            "viewport": {"width": 1920, "height": 1080},
+        }
+        self.playwright: Optional[Playwright] = None
+        self.browser: Optional[Browser] = None
+        self._idle: list[_Lease] = []
+        self._slots = asyncio.Semaphore(max_contexts)
+        self._lock = asyncio.Lock()
+        self.launches = 0
+
+    async def start(self) -> Browser:
+        async with self._lock:
+            if self.browser and self.browser.is_connected():
+                return self.browser
+            if not self.playwright:
+                self.playwright = await async_playwright().start()
+            self._idle.clear()
+            with BROWSER_LAUNCH_SECONDS.time():
+                self.browser = await self.playwright.chromium.launch(headless=self.headless, args=LAUNCH_ARGS)
+            self.launches += 1
+            logger.info(f"[BrowserPool] Chromium launched (#{self.launches})")
+            return self.browser
+
+    async def _new_lease(self) -> _Lease:
+        browser = await self.start()
+        ctx = await browser.new_context(**self.context_options)
+        handler = self.route_handler or (block_heavy_requests if self.block_resources else None)
+        if handler:
+            await ctx.route("**/*", handler)
+        return _Lease(ctx)
+
+    async def _release(self, lease: _Lease, broken: bool):
+        for page in list(lease.context.pages):
+            try:
+                await page.close()
+            except Exception:
+                pass
+        lease.uses += 1
+        if broken or lease.uses >= self.max_uses or not (self.browser and self.browser.is_connected()):
+            try:
+                await lease.context.close()
+            except Exception:
+                pass
+        else:
+            self._idle.append(lease)
+
+    @asynccontextmanager
+    async def context(self) -> AsyncIterator[BrowserContext]:
+        async with self._slots:
+            lease = self._idle.pop() if self._idle else await self._new_lease()
+            broken = False
+            try:
+                yield lease.context
+            except Exception:
+                broken = True
+                raise
+            finally:
+                await self._release(lease, broken)
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        async with self.context() as ctx:
+            page = await ctx.new_page()
+            yield page
+
+    async def close(self):
+        async with self._lock:
+            for lease in self._idle:
+                try:
+                    await lease.context.close()
+                except Exception:
+                    pass
+            self._idle.clear()
+            if self.browser:
+                await self.browser.close()
+                self.browser = None
+            if self.playwright:
+                await self.playwright.stop()
+                self.playwright = None
+
+
+# Shared pool for all Playwright-based parsers
+browser_pool = BrowserPool(route_handler=replay_route())
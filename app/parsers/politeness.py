@@ -0,0 +1,245 @@
+import asyncio
+import math
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from app.core.config import settings
+from app.utils.logger import logger
+from app.utils.metrics import SOURCE_CIRCUIT_OPEN, SOURCE_RATE, SOURCE_THROTTLED
+
+T = TypeVar("T")
+
+# Answers that mean "slow down" rather than "this page is broken"
+THROTTLE_STATUSES = frozenset({403, 429, 503})
+# Growth per clean response until the first throttle signal (TCP slow start)
+SLOW_START_FACTOR = 1.2
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+
+class Throttled(Exception):
+    """The source pushed back (429, captcha, ban page); the scheduler slows down and retries"""
+
+    def __init__(self, reason: str, retry_after: Optional[float] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class SourceUnavailable(Exception):
+    """The circuit breaker is open: the source failed too often and is left alone for a while"""
+
+
+def retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header, which is either a number or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Closed -> open after ``threshold`` failures in a row -> half-open after a cooldown.
+
+    Half-open lets a single probe through: success closes the circuit, a
+    failure opens it again with the cooldown doubled, up to ``max_cooldown``.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0, max_cooldown: float = 900.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() < self.open_until:
+                return False
+            self.state, self._probing = "half_open", False
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def release(self):
+        """Give back a half-open probe that ended without a verdict (cancelled)"""
+        self._probing = False
+
+    def success(self):
+        self.state, self.failures, self.trips, self._probing = "closed", 0, 0, False
+
+    def failure(self) -> bool:
+        """Record a failure; True if it opened the circuit"""
+        self.failures += 1
+        if self.state != "half_open" and self.failures < self.threshold:
+            return False
+        self.trips += 1
+        wait = min(self.cooldown * 2 ** (self.trips - 1), self.max_cooldown)
+        self.state, self.failures, self._probing = "open", 0, False
+        self.open_until = time.monotonic() + wait
+        return True
+
+
+class SourceScheduler:
+    """Request pacing, per-request retries and a circuit breaker for one source.
+
+    Requests are spaced ``1 / rate`` apart. The rate follows AIMD: a throttle
+    signal (429/403/503, captcha, a response slower than ``latency_target``)
+    or an error multiplies it by ``decrease``, at most once per observed
+    latency since the responses already in flight were sent at the old rate.
+    Until the first cut every clean response grows it by
+    ``SLOW_START_FACTOR``, afterwards by ``increase / rate`` (about
+    ``increase`` req/s per second of clean traffic), so it finds the rate
+    the source allows quickly and then probes slowly around it. A throttled or failed
+    request pauses the source for Retry-After or an exponential backoff and
+    is retried on its own, up to ``max_attempts``.
+    """
+
+    def __init__(self, source: str, rate: float = 1.0, min_rate: float = 0.05, max_rate: float = 5.0,
+                 increase: float = 0.05, decrease: float = 0.7, latency_target: float = 5.0,
+                 max_attempts: int = 3, breaker: Optional[CircuitBreaker] = None):
+        self.source = source
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.max_attempts = max_attempts
+        self.breaker = breaker or CircuitBreaker()
+        # EWMA of response latency, None until the first response
+        self.latency: Optional[float] = None
+        self.paused_until = 0.0
+        self.stats = {"requests": 0, "retried": 0, "throttled": 0, "errors": 0, "rejected": 0}
+        self._next = 0.0
+        self._cut_at = 0.0
+        self.slow_start = True
+        self._lock = asyncio.Lock()
+        self.rate = 0.0
+        self._set_rate(rate)
+
+    def _set_rate(self, rate: float):
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        SOURCE_RATE.labels(source=self.source).set(self.rate)
+
+    async def acquire(self):
+        # The lock queues waiters, so slots go out in arrival order
+        async with self._lock:
+            wait = max(self._next, self.paused_until) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next = time.monotonic() + 1 / self.rate
+
+    def concurrency(self, cap: int) -> int:
+        """Requests worth keeping in flight at the current rate (Little's law), between 1 and ``cap``"""
+        if self.latency is None:
+            return max(cap, 1)
+        return max(1, min(cap, math.ceil(self.rate * self.latency)))
+
+    def _observe(self, latency: float):
+        self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+
+    def _slow_down(self, reason: str):
+        now = time.monotonic()
+        if now < self._cut_at:
+            return
+        self._cut_at = now + (self.latency or 1 / self.rate)
+        self._set_rate(self.rate * self.decrease)
+        self.slow_start = False
+        logger.warning(f"[Politeness] {self.source}: {reason}, rate down to {self.rate:.3g}/s")
+
+    def on_success(self, latency: float):
+        self._observe(latency)
+        if latency > self.latency_target:
+            self._slow_down(f"slow response ({latency:.1f}s)")
+        elif self.slow_start:
+            self._set_rate(self.rate * SLOW_START_FACTOR)
+        else:
+            self._set_rate(self.rate + self.increase / self.rate)
+
+    def on_failure(self, error: Exception, attempt: int):
+        if isinstance(error, Throttled):
+            self.stats["throttled"] += 1
+            SOURCE_THROTTLED.labels(source=self.source, reason=error.reason).inc()
+            delay = error.retry_after
+        else:
+            self.stats["errors"] += 1
+            delay = None
+        self._slow_down(f"{type(error).__name__}: {error}")
+        if delay is None:
+            delay = min(BACKOFF_BASE * 2 ** (attempt - 1), BACKOFF_MAX) * random.uniform(0.5, 1.0)
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        if self.breaker.failure():
+            SOURCE_CIRCUIT_OPEN.labels(source=self.source).set(1)
+            logger.error(f"[Politeness] {self.source}: circuit open for "
+                         f"{self.breaker.open_until - time.monotonic():.0f}s")
+
+    async def call(self, func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """Run one request under the scheduler, retrying it alone on throttling or errors"""
+        error: Optional[Exception] = None
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.breaker.allow():
+                self.stats["rejected"] += 1
+                raise SourceUnavailable(f"{self.source} is degraded, circuit open") from error
+            try:
+                await self.acquire()
+                if attempt > 1:
+                    self.stats["retried"] += 1
+                self.stats["requests"] += 1
+                started = time.monotonic()
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                error = e
+                self.on_failure(e, attempt)
+                continue
+            except BaseException:
+                # Cancelled, e.g. by the fan-out's per-source timeout: says nothing about the source,
+                # and a half-open breaker must not wait forever for this probe
+                self.breaker.release()
+                raise
+            self.on_success(time.monotonic() - started)
+            if self.breaker.state != "closed":
+                SOURCE_CIRCUIT_OPEN.labels(source=self.source).set(0)
+            self.breaker.success()
+            return result
+        raise error
+
+    def snapshot(self) -> dict:
+        return {"rate": round(self.rate, 4), "latency": self.latency and round(self.latency, 3),
+                "circuit": self.breaker.state, **self.stats}
+
+
+_schedulers: dict[str, SourceScheduler] = {}
+
+
+def source_scheduler(source: str) -> SourceScheduler:
+    """The process-wide scheduler of a source, built from settings on first use"""
+    if source not in _schedulers:
+        _schedulers[source] = SourceScheduler(
+            source,
+            rate=settings.SOURCE_START_RATES.get(source, 1.0),
+            min_rate=settings.SOURCE_MIN_RATE,
+            max_rate=settings.SOURCE_MAX_RATES.get(source, 5.0),
+            increase=settings.SOURCE_RATE_INCREASE,
+            decrease=settings.SOURCE_RATE_DECREASE,
+            latency_target=settings.SOURCE_LATENCY_TARGETS.get(source, 5.0),
+            max_attempts=settings.SOURCE_MAX_ATTEMPTS,
+            breaker=CircuitBreaker(settings.SOURCE_BREAKER_FAILURES, settings.SOURCE_BREAKER_COOLDOWN),
+        )
+    return _schedulers[source]
+
+
+def snapshot() -> dict[str, dict]:
+    return {source: s.snapshot() for source, s in _schedulers.items()}
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import time
+from dataclasses import asdict, dataclass
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.models.listing import dumps, loads
+from app.utils.common import LocalLRU
+from app.utils.logger import logger
+from app.utils.metrics import CACHE_EVENTS
+
+KEY_TYPES = (str, int, float, bool, type(None))
+
+
+@dataclass
+class CacheStats:
+    local_hits: int = 0
+    remote_hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    refreshes: int = 0
+    backend_errors: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        hits = self.local_hits + self.remote_hits + self.stale_hits
+        total = hits + self.misses
+        return hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "hit_ratio": round(self.hit_ratio, 4)}
+
+
+class MemoryBackend:
+    """In-process stand-in for Redis (tests, local runs)"""
+
+    def __init__(self):
+        self._data: dict[str, tuple[bytes, float]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if not item:
+            return None
+        if item[1] < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return item[0]
+
+    async def set(self, key: str, value: bytes, ex: int):
+        self._data[key] = (value, time.monotonic() + ex)
+
+
+def normalize_params(params: dict) -> dict:
+    """Keep only plain query values; injected dependencies are not part of the key"""
+    normalized = {}
+    for name, value in params.items():
+        if not isinstance(value, KEY_TYPES):
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.split()).lower()
+        normalized[name] = value
+    return dict(sorted(normalized.items()))
+
+
+def build_key(namespace: str, func_name: str, params: dict) -> str:
+    raw = json.dumps(normalize_params(params), ensure_ascii=False, separators=(",", ":"))
+    digest = hashlib.sha1(raw.encode()).hexdigest()[:16]
+    return f"{namespace}:{func_name}:{digest}"
+
+
+class TwoTierCache:
+    """Local LRU in front of Redis with single-flight and stale-while-revalidate.
+
+    Entries are stored as ``{"v": value, "t": stored_at}``. Past ``expire``
+    an entry is served stale while one background refresh recomputes it;
+    only after ``expire + stale_ttl`` does a request wait on the source.
+    A local copy is trusted for ``local_ttl`` seconds only, then Redis is
+    read again, so a value refreshed by another replica is picked up
+    instead of being recomputed here. While Redis is unreachable the local
+    copy is used whatever its age.
+    """
+
+    def __init__(self, backend: Any = None, local_size: int = 256, namespace: str = "rentscout",
+                 local_ttl: float = 5.0):
+        self._backend = backend
+        # key -> (entry, monotonic time it was stored locally)
+        self.local = LocalLRU(local_size)
+        self.local_ttl = local_ttl
+        self.namespace = namespace
+        self.stats = CacheStats()
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    def _count(self, event: str):
+        setattr(self.stats, event, getattr(self.stats, event) + 1)
+        CACHE_EVENTS.labels(cache=self.namespace, event=event).inc()
+
+    @property
+    def backend(self) -> Any:
+        if self._backend is None:
+            from redis import asyncio as aioredis
+            self._backend = aioredis.from_url(settings.REDIS_URL)
+        return self._backend
+
+    async def _read(self, key: str) -> tuple[Optional[dict], str]:
+        """The entry and the tier it came from, "local" or "remote" """
+        cached = self.local.get(key)
+        if cached is not None and time.monotonic() - cached[1] < self.local_ttl:
+            return cached[0], "local"
+        try:
+            raw = await self.backend.get(key)
+        except Exception as e:
+            self._count("backend_errors")
+            logger.warning(f"Cache backend read failed: {str(e)}")
+            return (cached[0], "local") if cached else (None, "")
+        if raw is None:
+            return None, ""
+        entry = loads(raw)
+        self.local.set(key, (entry, time.monotonic()))
+        return entry, "remote"
+
+    async def _write(self, key: str, value: Any, expire: int, stale_ttl: int) -> Any:
+        payload = dumps({"v": value, "t": time.time()})
+        entry = loads(payload)
+        self.local.set(key, (entry, time.monotonic()))
+        try:
+            await self.backend.set(key, payload, ex=expire + stale_ttl)
+        except Exception as e:
+            self._count("backend_errors")
+            logger.warning(f"Cache backend write failed: {str(e)}")
+        return entry["v"]
+
+    def _compute(self, key: str, compute: Callable[[], Awaitable[Any]], expire: int, stale_ttl: int) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            return task
+
+        async def run():
+            try:
+                return await self._write(key, await compute(), expire, stale_ttl)
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        return task
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                             expire: int, stale_ttl: Optional[int] = None) -> Any:
+        stale_ttl = expire if stale_ttl is None else stale_ttl
+        entry, tier = await self._read(key)
+        if entry is not None:
+            age = time.time() - entry["t"]
+            if age < expire:
+                self._count(f"{tier}_hits")
+                return entry["v"]
+            if age < expire + stale_ttl:
+                self._count("stale_hits")
+                if key not in self._inflight:
+                    self._count("refreshes")
+                    self._compute(key, compute, expire, stale_ttl).add_done_callback(self._log_refresh)
+                return entry["v"]
+        if key in self._inflight:
+            self._count("coalesced")
+        else:
+            self._count("misses")
+        return await asyncio.shield(self._compute(key, compute, expire, stale_ttl))
+
+    @staticmethod
+    def _log_refresh(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.error(f"Background cache refresh failed: {str(task.exception())}")
+
+    def cached(self, expire: int, stale_ttl: Optional[int] = None):
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                bound = signature.bind_partial(*args, **kwargs)
+                bound.apply_defaults()
+                key = build_key(self.namespace, func.__qualname__, bound.arguments)
+                return await self.get_or_compute(key, lambda: func(*args, **kwargs), expire, stale_ttl)
+
+            return wrapper
+        return decorator
+
+
+response_cache = TwoTierCache()
+
+
+def cache(expire: int = 300, stale_ttl: Optional[int] = None):
+    return response_cache.cached(expire, stale_ttl)
+
+
+def cache_stats() -> dict:
+    return response_cache.stats.as_dict()
@@ -0,0 +1,262 @@
+import hashlib
+import re
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+# Same flat on two sources: area may be rounded differently, the price may carry a markup
+AREA_TOLERANCE = 0.03
+PRICE_TOLERANCE = 0.25
+# District blocks only have a title to go on, so they also need a close price
+WEAK_PRICE_TOLERANCE = 0.10
+SIMHASH_MAX_DISTANCE = 8
+MINHASH_PERMUTATIONS = 16
+MINHASH_BAND = 2
+MAX_PHOTOS = 8
+# A block bigger than this is too generic to be evidence of anything; skipping it keeps the pass linear
+MAX_BLOCK = 200
+
+ADDRESS_DROP = {
+    "россия", "москва", "г", "город", "мо", "ул", "улица", "пр-т", "пр", "проспект", "пер", "переулок",
+    "б-р", "бульвар", "ш", "шоссе", "наб", "набережная", "пл", "площадь", "пр-д", "проезд", "д", "дом",
+}
+ADDRESS_ALIASES = {"корпус": "к", "корп": "к", "строение": "с", "стр": "с"}
+ADDRESS_SPLIT_RE = re.compile(r"[\s,.;/]+")
+WORD_RE = re.compile(r"\w+")
+PHOTO_SUFFIX_RE = re.compile(r"(?:-\d+x\d+)?(?:\.\w+)?$")
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240611)
+_MINHASH_A = _rng.integers(1, _PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_MINHASH_B = _rng.integers(0, _PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def _hash64(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+
+def normalize_address(address: Optional[str]) -> str:
+    """Order-insensitive street + house key: "ул. Тверская, д. 12" == "Тверская ул., 12" """
+    if not address:
+        return ""
+    tokens = ADDRESS_SPLIT_RE.split(address.lower().replace("ё", "е"))
+    tokens = [ADDRESS_ALIASES.get(t, t) for t in tokens if t and t not in ADDRESS_DROP]
+    # Without a house number a street name alone is far too coarse to block on
+    if not any(t[0].isdigit() for t in tokens):
+        return ""
+    return " ".join(sorted(tokens))
+
+
+def photo_key(url: str) -> str:
+    """File name of a photo without size suffix or extension; CDNs differ, the image id usually does not"""
+    return PHOTO_SUFFIX_RE.sub("", url.rsplit("/", 1)[-1].split("?", 1)[0], count=1)
+
+
+def simhash(text: str) -> int:
+    tokens = WORD_RE.findall(text.lower())
+    if not tokens:
+        return 0
+    hashes = np.array([_hash64(t) for t in tokens], dtype=np.uint64)
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0) * 2 > len(tokens)
+    return int.from_bytes(np.packbits(votes, bitorder="little").tobytes(), "little")
+
+
+def minhash(keys: Iterable[str]) -> Optional[tuple[int, ...]]:
+    hashes = np.array([_hash64(k) % _PRIME for k in keys], dtype=np.uint64)
+    if not len(hashes):
+        return None
+    # uint64 products wrap modulo 2**64; still a serviceable universal hash for this
+    mixed = (_MINHASH_A[:, None] * hashes[None, :] + _MINHASH_B[:, None]) % _PRIME
+    return tuple(mixed.min(axis=1).tolist())
+
+
+def _field(item: Any, name: str) -> Any:
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+class _Record:
+    __slots__ = ("item", "source", "price", "area", "floor", "total_floors", "rooms", "title",
+                 "photos", "signature", "_simhash", "keys")
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.source = _field(item, "source")
+        self.price = _field(item, "price") or 0
+        self.area = _field(item, "area") or 0
+        self.floor = _field(item, "floor") or 0
+        self.total_floors = _field(item, "total_floors") or 0
+        self.rooms = _field(item, "rooms") or 0
+        self.title = _field(item, "title") or ""
+        self.photos = {photo_key(p) for p in (_field(item, "photos") or [])[:MAX_PHOTOS]}
+        self.signature = minhash(self.photos) if self.photos else None
+        self._simhash = None
+        self.keys = self._block_keys(item)
+
+    def _block_keys(self, item: Any) -> list[tuple]:
+        keys = []
+        address = normalize_address(_field(item, "address"))
+        if address:
+            keys.append(("address", address, self.floor))
+        district = _field(item, "district")
+        if district and self.area:
+            keys.append(("district", district.lower(), round(self.area), self.floor, self.rooms))
+        if self.signature:
+            # LSH bands: listings sharing most photos collide in at least one band
+            for b in range(0, MINHASH_PERMUTATIONS, MINHASH_BAND):
+                keys.append(("photos", b, self.signature[b:b + MINHASH_BAND]))
+        return keys
+
+    @property
+    def simhash(self) -> int:
+        if self._simhash is None:
+            self._simhash = simhash(self.title)
+        return self._simhash
+
+
+def _close(a: float, b: float, tolerance: float) -> bool:
+    return abs(a - b) <= tolerance * max(a, b)
+
+
+def _same_flat(a: _Record, b: _Record, via: str) -> bool:
+    if a.area and b.area and abs(a.area - b.area) > max(1.0, AREA_TOLERANCE * max(a.area, b.area)):
+        return False
+    for x, y in ((a.floor, b.floor), (a.total_floors, b.total_floors), (a.rooms, b.rooms)):
+        if x and y and x != y:
+            return False
+    if a.price and b.price and not _close(a.price, b.price, PRICE_TOLERANCE):
+        return False
+    if a.signature and b.signature:
+        same = sum(x == y for x, y in zip(a.signature, b.signature))
+        if same * 2 >= MINHASH_PERMUTATIONS:
+            return True
+    if via == "address":
+        return True
+    if via == "district":
+        return (bool(a.price and b.price) and _close(a.price, b.price, WEAK_PRICE_TOLERANCE)
+                and bin(a.simhash ^ b.simhash).count("1") <= SIMHASH_MAX_DISTANCE)
+    return False
+
+
+class ListingResolver:
+    """Incremental entity resolution across sources.
+
+    Listings are blocked by normalized address + floor, by district + area +
+    floor + rooms, and by LSH bands of a photo MinHash; only listings sharing
+    a block are compared, and oversized blocks are skipped, so work stays
+    linear in the number of listings. Matches are merged with union-find,
+    at most one listing per source per cluster.
+    """
+
+    def __init__(self, max_block: int = MAX_BLOCK):
+        self.max_block = max_block
+        self.records: list[_Record] = []
+        self.parent: list[int] = []
+        # Sources present in each cluster, kept on the root
+        self.sources: list[set] = []
+        self.blocks: dict[tuple, list[int]] = {}
+        self.stats = {"compared": 0, "merged": 0, "oversized": 0}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def add(self, item: Any) -> Optional[Any]:
+        """Add a listing; returns the earliest listing it duplicates, or None if it is new"""
+        record, i = _Record(item), len(self.records)
+        self.records.append(record)
+        self.parent.append(i)
+        self.sources.append({record.source})
+        for key in record.keys:
+            block = self.blocks.setdefault(key, [])
+            if len(block) >= self.max_block:
+                self.stats["oversized"] += 1
+                continue
+            for j in block:
+                root_i, root_j = self._find(i), self._find(j)
+                # One listing per source in a cluster, so matches cannot chain two reposts together
+                if root_i == root_j or self.sources[root_i] & self.sources[root_j]:
+                    continue
+                self.stats["compared"] += 1
+                if _same_flat(record, self.records[j], key[0]):
+                    # The earlier listing stays the root so "first seen" is stable
+                    root, child = min(root_i, root_j), max(root_i, root_j)
+                    self.parent[child] = root
+                    self.sources[root] |= self.sources[child]
+                    self.stats["merged"] += 1
+            block.append(i)
+        root = self._find(i)
+        return self.records[root].item if root != i else None
+
+    def match(self, item: Any) -> Optional[Any]:
+        """The earliest listing of a cluster ``item`` would join, without adding it"""
+        record = _Record(item)
+        for key in record.keys:
+            block = self.blocks.get(key, ())
+            if len(block) >= self.max_block:
+                continue
+            for j in block:
+                root = self._find(j)
+                if record.source not in self.sources[root] and _same_flat(record, self.records[j], key[0]):
+                    return self.records[root].item
+        return None
+
+    def clusters(self) -> list[list[Any]]:
+        groups: dict[int, list[Any]] = {}
+        for i, record in enumerate(self.records):
+            groups.setdefault(self._find(i), []).append(record.item)
+        return list(groups.values())
+
+
+class RollingResolver:
+    """ListingResolver over roughly the last ``window`` listings, for streams that never end.
+
+    Listings go into the current generation and are also checked against the
+    previous one; when the current one fills half the window it becomes the
+    previous and the oldest generation is dropped, so the window slides
+    instead of starting over empty.
+    """
+
+    def __init__(self, window: int, max_block: int = MAX_BLOCK):
+        self.half = max(window // 2, 1)
+        self.max_block = max_block
+        self.current = ListingResolver(max_block)
+        self.previous: Optional[ListingResolver] = None
+
+    def __len__(self) -> int:
+        return len(self.current) + (len(self.previous) if self.previous else 0)
+
+    def add(self, item: Any) -> Optional[Any]:
+        """Add a listing; returns an earlier listing in the window it duplicates, or None if it is new"""
+        duplicate = self.current.add(item)
+        if duplicate is None and self.previous is not None:
+            duplicate = self.previous.match(item)
+        if len(self.current) >= self.half:
+            self.previous, self.current = self.current, ListingResolver(self.max_block)
+        return duplicate
+
+
+def _completeness(item: dict) -> int:
+    return sum(1 for v in item.values() if v not in (None, "", 0, [], {}))
+
+
+def canonical(group: list[Any]) -> dict:
+    """The most complete listing of a group (cheapest on ties) with every source it appears on"""
+    items = [dict(i.model_dump() if hasattr(i, "model_dump") else i) for i in group]
+    best = dict(min(items, key=lambda i: (-_completeness(i), i.get("price") or float("inf"))))
+    best["sources"] = [{"source": i.get("source"), "external_id": i.get("external_id"),
+                        "price": i.get("price"), "link": i.get("link")} for i in items]
+    return best
+
+
+def cluster_listings(listings: Iterable[Any], max_block: int = MAX_BLOCK) -> list[dict]:
+    """Collapse cross-source duplicates to one canonical record each, in first-seen order"""
+    resolver = ListingResolver(max_block)
+    for listing in listings:
+        resolver.add(listing)
+    return [canonical(group) for group in resolver.clusters()]
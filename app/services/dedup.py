@@ -0,0 +1,198 @@
+import hashlib
+import time
+from typing import Any, Iterable, Optional
+
+from app.core.config import settings
+
+# Adds unseen IDs, refreshes last-seen for known ones and returns the new IDs
+CHECK_AND_MARK_LUA = """
+local new = {}
+local now = ARGV[1]
+for i = 2, #ARGV do
+    if redis.call('ZADD', KEYS[1], 'NX', now, ARGV[i]) == 1 then
+        new[#new + 1] = ARGV[i]
+    else
+        redis.call('ZADD', KEYS[1], 'XX', now, ARGV[i])
+    end
+end
+return new
+"""
+
+
+class RedisSeenStore:
+    """Exact per-source store: one sorted set per source, scored by last-seen time"""
+
+    def __init__(self, client: Any = None, prefix: str = "rentscout:seen"):
+        self._client = client
+        self.prefix = prefix
+        self._script = None
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            from redis import asyncio as aioredis
+            self._client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._client
+
+    def _key(self, source: str) -> str:
+        return f"{self.prefix}:{source}"
+
+    async def check_and_mark(self, source: str, ids: list[str], now: float) -> list[str]:
+        if self._script is None:
+            self._script = self.client.register_script(CHECK_AND_MARK_LUA)
+        new = await self._script(keys=[self._key(source)], args=[now, *ids])
+        return [i.decode() if isinstance(i, bytes) else i for i in new]
+
+    async def contains(self, source: str, ids: list[str]) -> list[bool]:
+        scores = await self.client.zmscore(self._key(source), ids)
+        return [score is not None for score in scores]
+
+    async def forget_older_than(self, source: str, cutoff: float) -> int:
+        return await self.client.zremrangebyscore(self._key(source), "-inf", cutoff)
+
+    async def count(self, source: str) -> int:
+        return await self.client.zcard(self._key(source))
+
+    async def sources(self) -> list[str]:
+        keys = [k async for k in self.client.scan_iter(match=f"{self.prefix}:*")]
+        return [(k.decode() if isinstance(k, bytes) else k)[len(self.prefix) + 1:] for k in keys]
+
+
+class MemorySeenStore:
+    """In-process store with the same interface, for tests and single-process runs"""
+
+    def __init__(self):
+        self._data: dict[str, dict[str, float]] = {}
+
+    async def check_and_mark(self, source: str, ids: list[str], now: float) -> list[str]:
+        seen = self._data.setdefault(source, {})
+        new = [i for i in ids if i not in seen]
+        for i in ids:
+            seen[i] = now
+        return list(dict.fromkeys(new))
+
+    async def contains(self, source: str, ids: list[str]) -> list[bool]:
+        seen = self._data.get(source, {})
+        return [i in seen for i in ids]
+
+    async def forget_older_than(self, source: str, cutoff: float) -> int:
+        seen = self._data.get(source, {})
+        stale = [i for i, ts in seen.items() if ts <= cutoff]
+        for i in stale:
+            del seen[i]
+        return len(stale)
+
+    async def count(self, source: str) -> int:
+        return len(self._data.get(source, {}))
+
+    async def sources(self) -> list[str]:
+        return list(self._data)
+
+
+class DedupService:
+    """Seen-listing dedup shared by the bot, the scheduler and the Sheets export.
+
+    The store is exact and shared, so one batch call per page answers for
+    every replica: ``check_and_mark`` marks atomically and returns the new
+    IDs, ``filter_new`` only looks. A local probabilistic filter cannot
+    save either round-trip, since an ID missing from it may still have been
+    marked by another replica.
+    """
+
+    def __init__(self, store: Any = None, ttl_days: Optional[float] = None):
+        self.store = store or RedisSeenStore()
+        self.ttl = (ttl_days or settings.DEDUP_TTL_DAYS) * 86400
+
+    async def filter_new(self, source: str, ids: Iterable[str]) -> list[str]:
+        """IDs not seen before, without marking them; one store round-trip"""
+        ids = list(dict.fromkeys(str(i) for i in ids))
+        if not ids:
+            return []
+        return [i for i, hit in zip(ids, await self.store.contains(source, ids)) if not hit]
+
+    async def check_and_mark(self, source: str, ids: Iterable[str]) -> list[str]:
+        """Atomically mark a page of IDs as seen and return the ones that were new"""
+        ids = list(dict.fromkeys(str(i) for i in ids))
+        if not ids:
+            return []
+        return await self.store.check_and_mark(source, ids, time.time())
+
+    async def expire(self) -> int:
+        """Forget listings not seen for DEDUP_TTL_DAYS"""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for source in await self.store.sources():
+            removed += await self.store.forget_older_than(source, cutoff)
+        return removed
+
+    async def count(self, source: Optional[str] = None) -> int:
+        sources = [source] if source else await self.store.sources()
+        total = 0
+        for s in sources:
+            total += await self.store.count(s)
+        return total
+
+
+# Raises the stored mark only if the new value is higher
+ADVANCE_WATERMARK_LUA = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if tonumber(ARGV[2]) > current then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class CrawlWatermarks:
+    """Highest listing ID seen per query URL, used to stop newest-first crawls early.
+
+    A crawl cut off before reaching the watermark also stores the result page
+    to resume from, so listings below the cut are not skipped.
+    """
+
+    def __init__(self, client: Any = None, key: str = "rentscout:crawl:watermarks"):
+        self._client = client
+        self.key = key
+        self._script = None
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            from redis import asyncio as aioredis
+            self._client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._client
+
+    @staticmethod
+    def _field(query_url: str) -> str:
+        return hashlib.sha1(query_url.encode()).hexdigest()
+
+    async def get(self, query_url: str) -> Optional[int]:
+        value = await self.client.hget(self.key, self._field(query_url))
+        return int(value) if value else None
+
+    async def advance(self, query_url: str, value: int) -> bool:
+        if self._script is None:
+            self._script = self.client.register_script(ADVANCE_WATERMARK_LUA)
+        return bool(await self._script(keys=[self.key], args=[self._field(query_url), value]))
+
+    async def resume_page(self, query_url: str) -> Optional[int]:
+        value = await self.client.hget(self.key, self._field(query_url) + ":resume")
+        return int(value) if value else None
+
+    async def set_resume_page(self, query_url: str, page: Optional[int]):
+        field = self._field(query_url) + ":resume"
+        if page is None:
+            await self.client.hdel(self.key, field)
+        else:
+            await self.client.hset(self.key, field, page)
+
+    async def reset(self, query_url: Optional[str] = None):
+        if query_url:
+            await self.client.hdel(self.key, self._field(query_url), self._field(query_url) + ":resume")
+        else:
+            await self.client.delete(self.key)
+
+
+seen_listings = DedupService()
+crawl_watermarks = CrawlWatermarks()
@@ -0,0 +1,85 @@
+from typing import Any, AsyncIterator, Optional
+
+from app.core.config import settings
+from app.models.listing import dumps, loads
+from app.utils.logger import logger
+
+
+class ListingEvents:
+    """Redis stream of listing events produced by scrape tasks.
+
+    Consumers read through a consumer group, so every event is delivered to
+    one consumer of the group and acknowledged only after it was handled.
+    """
+
+    def __init__(self, client: Any = None, stream: str = "rentscout:events:listings", maxlen: int = 100_000):
+        self._client = client
+        self.stream = stream
+        self.maxlen = maxlen
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            from redis import asyncio as aioredis
+            self._client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._client
+
+    async def publish(self, events: list[dict]) -> int:
+        if not events:
+            return 0
+        pipe = self.client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(self.stream, {"data": dumps(event)},
+                      maxlen=self.maxlen, approximate=True)
+        await pipe.execute()
+        return len(events)
+
+    async def publish_new(self, source: str, listings: list[dict]) -> int:
+        return await self.publish([{"type": "new", "source": source, "listing": l} for l in listings])
+
+    async def _ensure_group(self, group: str):
+        try:
+            await self.client.xgroup_create(self.stream, group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _batches(self, group: str, consumer: str, count: int,
+                       block_ms: int) -> AsyncIterator[list[tuple[str, dict]]]:
+        """(entry id, event) batches as read from the group; malformed entries are acked and dropped"""
+        await self._ensure_group(group)
+        # Redeliver what this consumer read but never acked (crash, restart), then new events
+        last_id: Optional[str] = "0"
+        while True:
+            reply = await self.client.xreadgroup(group, consumer, {self.stream: last_id}, count=count,
+                                                 block=None if last_id == "0" else block_ms)
+            entries = reply[0][1] if reply else []
+            if last_id == "0" and not entries:
+                last_id = ">"
+                continue
+            batch = []
+            for entry_id, fields in entries:
+                try:
+                    batch.append((entry_id, loads(fields["data"])))
+                except (KeyError, ValueError):
+                    logger.error(f"[Events] Dropping malformed event {entry_id}")
+                    await self.client.xack(self.stream, group, entry_id)
+            if batch:
+                yield batch
+
+    async def consume(self, group: str, consumer: str, count: int = 50,
+                      block_ms: int = 5000) -> AsyncIterator[dict]:
+        """Yield events forever; each is acked once the consumer asks for the next one"""
+        async for batch in self._batches(group, consumer, count, block_ms):
+            for entry_id, event in batch:
+                yield event
+                await self.client.xack(self.stream, group, entry_id)
+
+    async def consume_batches(self, group: str, consumer: str, count: int = 200,
+                              block_ms: int = 5000) -> AsyncIterator[list[dict]]:
+        """Like ``consume``, one read at a time; the whole batch is acked when the next one is asked for"""
+        async for batch in self._batches(group, consumer, count, block_ms):
+            yield [event for _, event in batch]
+            await self.client.xack(self.stream, group, *(entry_id for entry_id, _ in batch))
+
+listing_events = ListingEvents()
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.utils.logger import logger
+from app.utils.metrics import STAGE_SECONDS
+
+SourceCall = Callable[[], Awaitable[list]]
+
+
+@dataclass
+class SourceResult:
+    source: str
+    items: list = field(default_factory=list)
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def source_name(parser: Any) -> str:
+    """Short source key ("avito", "cian") used for budgets and logging"""
+    name = getattr(parser, "SOURCE", None)
+    if name:
+        return name
+    cls = parser.__class__.__name__
+    return (cls[:-len("Parser")] if cls.endswith("Parser") else cls).lower()
+
+
+def source_timeout(source: str, timeouts: Optional[dict[str, float]] = None,
+                   default: Optional[float] = None) -> float:
+    budgets = settings.PARSER_TIMEOUTS if timeouts is None else timeouts
+    return budgets.get(source, settings.PARSER_TIMEOUT if default is None else default)
+
+
+async def _run_source(source: str, call: SourceCall, budget: float,
+                      sem: asyncio.Semaphore) -> SourceResult:
+    async with sem:
+        started = time.perf_counter()
+        try:
+            items = await asyncio.wait_for(call(), timeout=budget)
+            result = SourceResult(source, list(items or []), time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            logger.warning(f"Parser {source} exceeded its {budget:g}s budget")
+            result = SourceResult(source, [], time.perf_counter() - started, "timeout")
+        except Exception as e:
+            logger.error(f"Parser {source} failed: {str(e)}")
+            result = SourceResult(source, [], time.perf_counter() - started, str(e) or e.__class__.__name__)
+        STAGE_SECONDS.labels(source=source, stage="search").observe(result.elapsed)
+        return result
+
+
+async def fan_out(
+    calls: dict[str, SourceCall],
+    timeouts: Optional[dict[str, float]] = None,
+    default_timeout: Optional[float] = None,
+    concurrency: Optional[int] = None,
+) -> list[SourceResult]:
+    """Run every source at once, each under its own time budget.
+
+    A slow or failing source yields an empty SourceResult with ``error`` set
+    instead of failing the whole request, so callers always get partial results.
+    """
+    sem = asyncio.Semaphore(concurrency or settings.PARSER_CONCURRENCY)
+    return await asyncio.gather(*(
+        _run_source(name, call, source_timeout(name, timeouts, default_timeout), sem)
+        for name, call in calls.items()
+    ))
+
+
+async def iter_results(
+    calls: dict[str, SourceCall],
+    timeouts: Optional[dict[str, float]] = None,
+    default_timeout: Optional[float] = None,
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[SourceResult]:
+    """Same budgets as ``fan_out``, but each SourceResult is yielded as soon as its source finishes.
+
+    Closing the iterator early (client went away) cancels the sources still running.
+    """
+    sem = asyncio.Semaphore(concurrency or settings.PARSER_CONCURRENCY)
+    tasks = [
+        asyncio.ensure_future(_run_source(name, call, source_timeout(name, timeouts, default_timeout), sem))
+        for name, call in calls.items()
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def merge_results(results: list[SourceResult]) -> list:
+    merged = []
+    for result in results:
+        merged.extend(result.items)
+    return merged
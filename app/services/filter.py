@@ -1,8 +1,125 @@
+from app.core.config import settings
 from app.models.schemas import PropertySchema
-from typing import List
+from typing import List, Optional
+import json
+import re
 
-def filter_properties(properties: List[PropertySchema]) -> List[PropertySchema]:
-    return sorted(
-        [p for p in properties if p.price > 0],
-        key=lambda x: x.price
-    )[:1000]
\ No newline at end of file
+import numpy as np
+import pandas as pd
+
+NUMERIC_COLUMNS = ("price", "area", "floor", "total_floors", "rooms")
+TEXT_COLUMNS = ("district", "renovation", "seller_type", "source")
+
+
+def _column(items: list, name: str) -> list:
+    if items and isinstance(items[0], dict):
+        return [i.get(name) for i in items]
+    return [getattr(i, name, None) for i in items]
+
+
+def _numeric(items: list, name: str) -> np.ndarray:
+    # Parsers use 0 for "not found"; treat it as unknown like None
+    return np.array([v or np.nan for v in _column(items, name)], dtype=float)
+
+
+def _categorical(items: list, name: str) -> pd.Categorical:
+    codes, uniques = pd.factorize(np.array(_column(items, name), dtype=object))
+    # Lowercase only the distinct values, then fold codes that collapse together
+    lowered, categories = pd.factorize(np.array([str(u).lower() for u in uniques], dtype=object))
+    codes = np.where(codes >= 0, lowered[codes] if len(lowered) else codes, -1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def load_filters() -> dict:
+    """The steinik_filters config, or no filters if it cannot be read"""
+    try:
+        with open(settings.FILTERS_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+class ListingFrame:
+    """Columnar view over merged listings; build once, filter and rank many times"""
+
+    def __init__(self, items: list):
+        self.items = items
+        self.df = pd.DataFrame({name: _numeric(items, name) for name in NUMERIC_COLUMNS})
+        for name in TEXT_COLUMNS:
+            self.df[name] = _categorical(items, name)
+        area = self.df["area"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.df["price_per_m2"] = self.df["price"].to_numpy() / area
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def mask(self, filters: Optional[dict] = None, strict: bool = False) -> np.ndarray:
+        """Vectorized steinik_filters predicates; unknown values pass unless ``strict``"""
+        df, cfg = self.df, filters or {}
+        price = df["price"].to_numpy()
+        keep = price > 0
+
+        def within(col: str, lo=None, hi=None):
+            values = df[col].to_numpy()
+            ok = np.ones(len(values), dtype=bool)
+            if lo is not None:
+                ok &= values >= lo
+            if hi is not None:
+                ok &= values <= hi
+            return ok | (np.isnan(values) & (not strict))
+
+        if cfg.get("price_max"):
+            keep &= price <= cfg["price_max"]
+        area = cfg.get("area_range", {})
+        if area.get("min") or area.get("max"):
+            keep &= within("area", area.get("min"), area.get("max"))
+
+        floor_cfg = cfg.get("floor", {})
+        floor, total = df["floor"].to_numpy(), df["total_floors"].to_numpy()
+        if floor_cfg.get("not_first"):
+            keep &= floor != 1
+        if floor_cfg.get("not_last"):
+            keep &= ~((floor == total) & (total > 0))
+
+        for col in ("renovation", "seller_type"):
+            allowed = cfg.get(col)
+            if not allowed:
+                continue
+            # Match each distinct value once, then broadcast through the category codes
+            regex = re.compile("|".join(re.escape(a.lower()) for a in allowed))
+            values = df[col].cat
+            hit = np.array([bool(regex.search(c)) for c in values.categories] + [not strict])
+            keep &= hit[values.codes.to_numpy()]
+        return keep
+
+    def scores(self) -> np.ndarray:
+        """How far below its district's median price per m² each listing is (higher is better)"""
+        ppm2 = self.df["price_per_m2"]
+        median = ppm2.groupby(self.df["district"], observed=True, dropna=False).transform("median")
+        score = 1 - ppm2 / median
+        return score.fillna(0).to_numpy()
+
+    def rank(self, mask: np.ndarray, top_k: int, by: str = "price") -> np.ndarray:
+        """Indices of the top_k rows under ``mask`` via partial selection instead of a full sort"""
+        idx = np.flatnonzero(mask)
+        if by == "score":
+            keys = -self.scores()[idx]
+        else:
+            keys = self.df[by].to_numpy()[idx]
+        keys = np.where(np.isnan(keys), np.inf, keys)
+        if top_k < len(idx):
+            part = np.argpartition(keys, top_k - 1)[:top_k]
+            idx, keys = idx[part], keys[part]
+        return idx[np.argsort(keys, kind="stable")]
+
+    def select(self, filters: Optional[dict] = None, top_k: int = 1000, by: str = "price",
+               strict: bool = False) -> list:
+        return [self.items[i] for i in self.rank(self.mask(filters, strict), top_k, by)]
+
+
+def filter_properties(properties: List[PropertySchema], filters: Optional[dict] = None,
+                      top_k: int = 1000, by: str = "price") -> List[PropertySchema]:
+    if not properties:
+        return []
+    return ListingFrame(properties).select(filters, top_k, by)
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.core.config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    source TEXT NOT NULL,
+    external_id TEXT NOT NULL,
+    scope TEXT,
+    price REAL NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    removed_at REAL,
+    PRIMARY KEY (source, external_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS listings_scope ON listings (source, scope, last_seen);
+CREATE TABLE IF NOT EXISTS price_points (
+    source TEXT NOT NULL,
+    external_id TEXT NOT NULL,
+    observed_at REAL NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (source, external_id, observed_at)
+) WITHOUT ROWID;
+"""
+
+UPSERT_LISTING = """
+INSERT INTO listings (source, external_id, scope, price, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (source, external_id) DO UPDATE SET
+    scope = excluded.scope,
+    price = CASE WHEN excluded.price > 0 THEN excluded.price ELSE listings.price END,
+    last_seen = excluded.last_seen,
+    removed_at = NULL
+"""
+
+# SQLite's default limit on bound parameters is 999
+LOOKUP_CHUNK = 500
+
+
+class PriceHistory:
+    """Append-only price history per (source, external_id) in SQLite.
+
+    ``price_points`` gets a row only when a listing's price changes, so each
+    listing's series stays as short as its number of price moves. ``listings``
+    keeps the latest state each scrape is diffed against.
+    """
+
+    def __init__(self, path: Optional[str] = None, removal_grace: Optional[float] = None):
+        self.path = path or settings.HISTORY_DB_PATH
+        self.removal_grace = (settings.HISTORY_REMOVAL_GRACE_HOURS * 3600
+                              if removal_grace is None else removal_grace)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # WAL lets worker processes on the same host read while another one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _current(self, source: str, ids: list[str]) -> dict[str, float]:
+        prices = {}
+        for i in range(0, len(ids), LOOKUP_CHUNK):
+            chunk = ids[i:i + LOOKUP_CHUNK]
+            rows = self.conn.execute(
+                f"SELECT external_id, price FROM listings WHERE source = ? "
+                f"AND external_id IN ({','.join('?' * len(chunk))})", (source, *chunk))
+            prices.update(rows)
+        return prices
+
+    def record(self, source: str, listings: list[dict], scope: Optional[str] = None,
+               complete: bool = False, now: Optional[float] = None) -> list[dict]:
+        """Store one scrape of ``scope`` and return the change events it implies.
+
+        First sightings are stored silently; announcing new listings is the
+        dedup store's job. Known listings whose price moved yield
+        ``price_changed``. If the scrape covered the whole scope (``complete``),
+        listings of that scope unseen for longer than ``removal_grace`` yield
+        ``removed`` once.
+        """
+        now = now or time.time()
+        by_id = {str(l["external_id"]): l for l in listings}
+        events, points, rows = [], [], []
+        with self._lock, self.conn:
+            current = self._current(source, list(by_id))
+            for ext_id, listing in by_id.items():
+                price = float(listing.get("price") or 0)
+                old = current.get(ext_id)
+                if price and price != old:
+                    points.append((source, ext_id, now, price))
+                    if old:
+                        events.append({"type": "price_changed", "source": source, "listing": listing,
+                                       "old_price": old})
+                rows.append((source, ext_id, scope, price, now, now))
+            self.conn.executemany("INSERT OR IGNORE INTO price_points VALUES (?, ?, ?, ?)", points)
+            self.conn.executemany(UPSERT_LISTING, rows)
+            if complete and scope is not None:
+                events.extend(self._sweep(source, scope, now))
+        return events
+
+    def _sweep(self, source: str, scope: str, now: float) -> list[dict]:
+        gone = self.conn.execute(
+            "SELECT external_id, price FROM listings WHERE source = ? AND scope = ? "
+            "AND removed_at IS NULL AND last_seen < ?", (source, scope, now - self.removal_grace)).fetchall()
+        self.conn.executemany("UPDATE listings SET removed_at = ? WHERE source = ? AND external_id = ?",
+                              [(now, source, ext_id) for ext_id, _ in gone])
+        return [{"type": "removed", "source": source, "listing": {"external_id": ext_id, "price": price}}
+                for ext_id, price in gone]
+
+    def series(self, source: str, external_id: str) -> list[tuple[float, float]]:
+        """(observed_at, price) points of one listing, oldest first"""
+        return self.conn.execute(
+            "SELECT observed_at, price FROM price_points WHERE source = ? AND external_id = ? "
+            "ORDER BY observed_at", (source, str(external_id))).fetchall()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+price_history = PriceHistory()
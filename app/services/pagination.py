@@ -0,0 +1,46 @@
+import base64
+import json
+from bisect import bisect_right
+from typing import Any, Optional
+
+
+def _field(item: Any, name: str) -> Any:
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def sort_key(item: Any) -> tuple[float, str]:
+    """(price, external_id): the same order the index pages in; unknown prices go last"""
+    return (_field(item, "price") or float("inf"), str(_field(item, "external_id") or ""))
+
+
+def encode_cursor(key: Optional[tuple]) -> Optional[str]:
+    if key is None:
+        return None
+    raw = json.dumps(list(key), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    if not cursor:
+        return None
+    try:
+        price, external_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(price), str(external_id)
+    except (ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+
+
+def page_after(items: list, cursor: Optional[str], limit: int) -> tuple[list, Optional[str]]:
+    """One page of ``items`` after ``cursor`` plus the cursor of the next page.
+
+    The cursor is the sort key of the last item served rather than an
+    offset, so a page stays correct when the underlying list was refreshed
+    between requests.
+    """
+    ordered = sorted(items, key=sort_key)
+    keys = [sort_key(i) for i in ordered]
+    after = decode_cursor(cursor)
+    start = bisect_right(keys, after) if after else 0
+    page = ordered[start:start + limit]
+    more = start + limit < len(ordered)
+    return page, encode_cursor(keys[start + limit - 1]) if more else None
@@ -0,0 +1,238 @@
+import copy
+import json
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+from app.core.config import settings
+
+# Keys of the filters file a chat can override; everything else (sources, interval) is crawl-wide
+PROFILE_KEYS = ("districts", "area_range", "price_max", "floor", "renovation", "seller_type")
+PRICE_STEP = 5_000_000
+AREA_STEP = 10
+
+
+@dataclass
+class Subscription:
+    chat_id: int
+    filters: dict = field(default_factory=dict)
+    active: bool = False
+
+    def to_json(self) -> str:
+        return json.dumps({"filters": self.filters, "active": self.active}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, chat_id: int, raw: str) -> "Subscription":
+        data = json.loads(raw)
+        return cls(int(chat_id), data.get("filters") or {}, bool(data.get("active")))
+
+
+def profile_defaults(base: dict) -> dict:
+    return {k: copy.deepcopy(base[k]) for k in PROFILE_KEYS if k in base}
+
+
+class SubscriptionStore:
+    """Per-chat filter profiles in a Redis hash (chat_id -> JSON).
+
+    Every write bumps a version counter so readers can tell when an index
+    built from the profiles is stale.
+    """
+
+    def __init__(self, client: Any = None, key: str = "rentscout:subscriptions"):
+        self._client = client
+        self.key = key
+        self.version_key = f"{key}:version"
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            from redis import asyncio as aioredis
+            self._client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._client
+
+    async def get(self, chat_id: int, base: Optional[dict] = None) -> Subscription:
+        raw = await self.client.hget(self.key, str(chat_id))
+        if raw is None:
+            return Subscription(chat_id, profile_defaults(base or {}))
+        return Subscription.from_json(chat_id, raw)
+
+    async def save(self, sub: Subscription):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(self.key, str(sub.chat_id), sub.to_json())
+        pipe.incr(self.version_key)
+        await pipe.execute()
+
+    async def update(self, chat_id: int, base: Optional[dict] = None, **changes: Any) -> Subscription:
+        sub = await self.get(chat_id, base)
+        sub.filters.update(changes)
+        await self.save(sub)
+        return sub
+
+    async def set_active(self, chat_id: int, active: bool, base: Optional[dict] = None) -> Subscription:
+        sub = await self.get(chat_id, base)
+        sub.active = active
+        await self.save(sub)
+        return sub
+
+    async def all(self) -> list[Subscription]:
+        raw = await self.client.hgetall(self.key)
+        return [Subscription.from_json(chat_id, data) for chat_id, data in raw.items()]
+
+    async def active(self) -> list[Subscription]:
+        return [s for s in await self.all() if s.active]
+
+    async def version(self) -> int:
+        return int(await self.client.get(self.version_key) or 0)
+
+
+def union_filters(base: dict, subs: Iterable[Subscription]) -> dict:
+    """Widest crawl that covers every profile; matching narrows results back per chat"""
+    profiles = [s.filters for s in subs]
+    if not profiles:
+        return base
+    merged = dict(base)
+
+    def widest(values: list, pick):
+        # One unrestricted profile makes the whole crawl unrestricted
+        return None if any(v in (None, 0, []) for v in values) else pick(values)
+
+    areas = [p.get("area_range") or {} for p in profiles]
+    area = {"min": widest([a.get("min") for a in areas], min), "max": widest([a.get("max") for a in areas], max)}
+    merged["area_range"] = {k: v for k, v in area.items() if v is not None}
+    merged["price_max"] = widest([p.get("price_max") for p in profiles], max)
+    floors = [p.get("floor") or {} for p in profiles]
+    merged["floor"] = {rule: all(f.get(rule) for f in floors) for rule in ("not_first", "not_last")}
+    for key in ("renovation", "seller_type"):
+        merged[key] = widest([p.get(key) for p in profiles], lambda vs: sorted({x for v in vs for x in v}))
+
+    districts = widest([p.get("districts") for p in profiles], lambda vs: {x for v in vs for x in v})
+    if districts:
+        ttk = base.get("ttk_districts", {})
+        merged["ttk_districts"] = {group: [d for d in names if d in districts] for group, names in ttk.items()}
+    return merged
+
+
+def accepts(profile: dict, listing: dict) -> bool:
+    """Exact profile check; values the parser could not extract pass, as in ListingFrame.mask"""
+    price = listing.get("price") or 0
+    if profile.get("price_max") and price > profile["price_max"]:
+        return False
+    area, bounds = listing.get("area") or 0, profile.get("area_range") or {}
+    if area and ((bounds.get("min") and area < bounds["min"]) or (bounds.get("max") and area > bounds["max"])):
+        return False
+    district = listing.get("district")
+    if profile.get("districts") and district and district not in profile["districts"]:
+        return False
+    floor_cfg, floor, total = profile.get("floor") or {}, listing.get("floor") or 0, listing.get("total_floors") or 0
+    if floor_cfg.get("not_first") and floor == 1:
+        return False
+    if floor_cfg.get("not_last") and total and floor == total:
+        return False
+    for key in ("renovation", "seller_type"):
+        allowed, value = profile.get(key), listing.get(key)
+        if allowed and value and not any(a.lower() in value.lower() for a in allowed):
+            return False
+    return True
+
+
+def _range_masks(ranges: list[tuple[Optional[float], Optional[float]]], step: float) -> tuple[list[int], int]:
+    """Per-bucket bitmask of the ranges overlapping it, plus the mask for values past the last bucket"""
+    finite = [hi for _, hi in ranges if hi]
+    masks = [0] * (int(max(finite) // step) + 1 if finite else 0)
+    overflow = 0
+    for bit, (lo, hi) in enumerate(ranges):
+        first = int((lo or 0) // step)
+        last = int(hi // step) if hi else len(masks) - 1
+        for b in range(first, last + 1):
+            masks[b] |= 1 << bit
+        if not hi:
+            overflow |= 1 << bit
+    return masks, overflow
+
+
+class SubscriptionIndex:
+    """Inverted index from listing attributes to the subscriptions that may want it.
+
+    Each subscription is one bit. District, price bucket, area bucket, floor
+    rules and renovation/seller values map to bitmasks of the subscriptions
+    accepting a listing there, so the candidates for a listing are a few
+    lookups and ANDs. Only price and area are bucketed, so candidates just
+    get their exact bounds checked.
+    """
+
+    def __init__(self, subs: Iterable[Subscription], price_step: float = PRICE_STEP, area_step: float = AREA_STEP):
+        self.subs = list(subs)
+        self.price_step = price_step
+        self.area_step = area_step
+        self.everyone = (1 << len(self.subs)) - 1
+        self._any_district = 0
+        self._district: dict[str, int] = {}
+        for bit, sub in enumerate(self.subs):
+            districts = sub.filters.get("districts")
+            if not districts:
+                self._any_district |= 1 << bit
+            for name in districts or []:
+                self._district[name] = self._district.get(name, 0) | 1 << bit
+        self._price, self._price_overflow = _range_masks(
+            [(None, s.filters.get("price_max")) for s in self.subs], price_step)
+        areas = [s.filters.get("area_range") or {} for s in self.subs]
+        self._area, self._area_overflow = _range_masks([(a.get("min"), a.get("max")) for a in areas], area_step)
+        floors = [s.filters.get("floor") or {} for s in self.subs]
+        self._not_first = sum(1 << bit for bit, f in enumerate(floors) if f.get("not_first"))
+        self._not_last = sum(1 << bit for bit, f in enumerate(floors) if f.get("not_last"))
+        # Text rules are substring matches, so masks are computed per distinct listing value on demand
+        self._text_masks: dict[tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.subs)
+
+    def _bucket(self, masks: list[int], overflow: int, value: Optional[float], step: float) -> int:
+        if not value or value < 0:
+            return self.everyone
+        b = int(value // step)
+        return masks[b] if b < len(masks) else overflow
+
+    def _text_mask(self, key: str, value: Optional[str]) -> int:
+        if not value:
+            return self.everyone
+        cached = self._text_masks.get((key, value))
+        if cached is None:
+            lowered = value.lower()
+            cached = sum(1 << bit for bit, s in enumerate(self.subs)
+                         if not s.filters.get(key) or any(a.lower() in lowered for a in s.filters[key]))
+            self._text_masks[(key, value)] = cached
+        return cached
+
+    def candidates(self, listing: dict) -> int:
+        district = listing.get("district")
+        mask = self._any_district | self._district.get(district, 0) if district else self.everyone
+        mask &= self._bucket(self._price, self._price_overflow, listing.get("price"), self.price_step)
+        if not mask:
+            return 0
+        mask &= self._bucket(self._area, self._area_overflow, listing.get("area"), self.area_step)
+        floor, total = listing.get("floor") or 0, listing.get("total_floors") or 0
+        if floor == 1:
+            mask &= ~self._not_first
+        if total and floor == total:
+            mask &= ~self._not_last
+        for key in ("renovation", "seller_type"):
+            if mask:
+                mask &= self._text_mask(key, listing.get(key))
+        return mask
+
+    def match(self, listing: dict) -> list[int]:
+        """chat_ids whose profile accepts the listing, same as filtering with ``accepts``"""
+        mask, chats = self.candidates(listing), []
+        price, area = listing.get("price") or 0, listing.get("area") or 0
+        while mask:
+            low = mask & -mask
+            profile = self.subs[low.bit_length() - 1].filters
+            bounds = profile.get("area_range") or {}
+            if not ((profile.get("price_max") and price > profile["price_max"])
+                    or (area and ((bounds.get("min") and area < bounds["min"])
+                                  or (bounds.get("max") and area > bounds["max"])))):
+                chats.append(self.subs[low.bit_length() - 1].chat_id)
+            mask ^= low
+        return chats
+
+
+subscriptions = SubscriptionStore()
@@ -0,0 +1,227 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from celery import Celery
+from celery.signals import worker_ready
+
+from app.core.config import settings
+from app.db.elastic import index_listings
+from app.services.dedup import seen_listings
+from app.services.events import listing_events
+from app.services.filter import load_filters
+from app.services.history import price_history
+from app.services.subscriptions import subscriptions, union_filters
+from app.utils.logger import logger
+from app.utils.metrics import serve_metrics
+
+app = Celery("rentscout", broker="memory://" if settings.CELERY_EAGER else settings.CELERY_BROKER_URL)
+app.conf.update(
+    task_always_eager=settings.CELERY_EAGER,
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    task_ignore_result=True,
+    task_routes={"rentscout.scrape.*": {"queue": "scrape"}},
+    beat_schedule={
+        "scrape-tick": {"task": "rentscout.schedule.tick", "schedule": 60.0},
+        "full-recrawl": {"task": "rentscout.schedule.tick", "schedule": settings.FULL_RECRAWL_HOURS * 3600,
+                         "kwargs": {"force": True, "full_recrawl": True}},
+        "dedup-expire": {"task": "rentscout.dedup.expire", "schedule": 3600.0},
+    },
+)
+
+
+@worker_ready.connect
+def _serve_metrics(**kwargs):
+    # Prefork children report through PROMETHEUS_MULTIPROC_DIR, this exporter aggregates them
+    if settings.METRICS_PORT:
+        serve_metrics(settings.METRICS_PORT)
+
+
+NEXT_CYCLE_KEY = "rentscout:schedule:next_cycle"
+CYCLE_LOCK_KEY = "rentscout:schedule:lock"
+RATE_LIMIT_KEY = "rentscout:ratelimit"
+RATE_PERIODS = {"s": 1, "m": 60, "h": 3600}
+AVITO_CITIES = {"Moscow": "moskva"}
+# Avito's parser scrapes daily rentals (/sdam/na_sutki). Profiles are for flats on sale, so these
+# sources stay out of the cycle until their parsers target sale listings; chunks can still be queued by hand
+RENT_SOURCES = {"avito"}
+
+# One loop per worker process: the browser pool and Redis clients are bound to it
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def run(coro: Awaitable) -> Any:
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+        return _loop.run_until_complete(coro)
+
+
+async def crawl_filters() -> dict:
+    """One crawl for everybody: the filters file widened to cover every active subscription"""
+    return union_filters(load_filters(), await subscriptions.active())
+
+
+# Scrapers return (listings, complete); complete means every result page of the query was seen
+async def _scrape_cian(city: str, district_ids: Optional[list[int]], full_recrawl: bool) -> tuple[list[dict], bool]:
+    from app.parsers.cian.listing_parser import CianParser
+    parser = CianParser(settings.FILTERS_PATH, incremental=True, track_prices=True, filters=await crawl_filters())
+    listings = await parser.parse_listings(max_pages=settings.MAX_PAGES_PER_SOURCE, full_recrawl=full_recrawl,
+                                           district_ids=district_ids)
+    return [l.dict() for l in listings], full_recrawl and parser.complete
+
+
+async def _scrape_avito(city: str, district_ids: Optional[list[int]], full_recrawl: bool) -> tuple[list[dict], bool]:
+    from app.parsers.avito.parser import AvitoParser
+    items = await AvitoParser().fetch_items(AVITO_CITIES.get(city, city))
+    return [item._asdict() for item in items], False
+
+
+SCRAPERS: dict[str, Callable[[str, Optional[list[int]], bool], Awaitable[tuple[list[dict], bool]]]] = {
+    "cian": _scrape_cian,
+    "avito": _scrape_avito,
+}
+
+
+async def scrape_chunk(source: str, city: str, district_ids: Optional[list[int]] = None,
+                       full_recrawl: bool = False) -> int:
+    """Scrape one (source, city, district chunk) and publish only what changed.
+
+    New listings come from the dedup store, price changes and removals from
+    the price history. Both make the task idempotent: a retried or
+    duplicated chunk finds no differences and publishes nothing. Every
+    listing is also fed to the Elasticsearch bulk indexer, which skips the
+    unchanged ones.
+    """
+    listings, complete = await SCRAPERS[source](city, district_ids, full_recrawl)
+    by_id = {str(l["external_id"]): l for l in listings}
+    new_ids = await seen_listings.check_and_mark(source, list(by_id))
+    scope = f"{city}:{','.join(map(str, district_ids or []))}"
+    changes = price_history.record(source, listings, scope=scope, complete=complete)
+    events = [{"type": "new", "source": source, "listing": by_id[i]} for i in new_ids]
+    await listing_events.publish(events + changes)
+    try:
+        # /properties/page?from_index=true reads this index
+        await index_listings(listings)
+    except Exception as e:
+        logger.error(f"[Tasks] Indexing {source}/{city} failed: {str(e)}")
+    logger.info(f"[Tasks] {source}/{city} {district_ids or ''}: {len(listings)} parsed, {len(new_ids)} new, "
+                f"{len(changes)} changed")
+    return len(events) + len(changes)
+
+
+async def source_slot(source: str, client: Any = None) -> float:
+    """Take one slot of the source's SOURCE_RATE_LIMITS budget; 0.0 if granted, else seconds to wait.
+
+    Counted in Redis per fixed window, so the cap holds across all workers;
+    Celery's own ``rate_limit`` is per worker and multiplies with their number.
+    """
+    limit = settings.SOURCE_RATE_LIMITS.get(source)
+    if not limit:
+        return 0.0
+    count, _, unit = limit.partition("/")
+    period = RATE_PERIODS[unit[:1] or "s"]
+    client = client or listing_events.client
+    now = time.time()
+    window = int(now // period)
+    key = f"{RATE_LIMIT_KEY}:{source}:{window}"
+    pipe = client.pipeline(transaction=True)
+    pipe.incr(key)
+    pipe.expire(key, period * 2)
+    taken, _ = await pipe.execute()
+    if taken <= int(count):
+        return 0.0
+    return (window + 1) * period - now
+
+
+def _make_scrape_task(source: str):
+    @app.task(name=f"rentscout.scrape.{source}", bind=True, max_retries=2, default_retry_delay=60)
+    def scrape(self, city: str, district_ids: Optional[list[int]] = None, full_recrawl: bool = False) -> int:
+        try:
+            wait = run(source_slot(source))
+            if wait:
+                # Over the source's budget: requeue for the next window without using up a retry
+                self.apply_async((city, district_ids, full_recrawl), countdown=wait + random.uniform(0, 1))
+                return 0
+            return run(scrape_chunk(source, city, district_ids, full_recrawl))
+        except Exception as e:
+            logger.error(f"[Tasks] {source} chunk failed: {str(e)}")
+            raise self.retry(exc=e)
+
+    return scrape
+
+
+scrape_tasks = {source: _make_scrape_task(source) for source in SCRAPERS}
+
+
+def plan_cycle(filters: dict) -> list[tuple[str, str, Optional[list[int]]]]:
+    """(source, city, district chunk) jobs for one cycle"""
+    city = filters.get("location", "Moscow")
+    jobs = []
+    for source in filters.get("sources", list(SCRAPERS)):
+        if source not in SCRAPERS or source in RENT_SOURCES:
+            continue
+        if source == "cian":
+            from app.parsers.cian.listing_parser import CianParser
+            ids = CianParser(settings.FILTERS_PATH, filters=filters).district_ids()
+            size = settings.SCRAPE_DISTRICT_CHUNK
+            jobs.extend((source, city, ids[i:i + size]) for i in range(0, len(ids), size))
+        else:
+            jobs.append((source, city, None))
+    return jobs
+
+
+async def _claim_cycle(interval: float, force: bool) -> bool:
+    client = listing_events.client
+    now = time.time()
+    if not force and now < float(await client.get(NEXT_CYCLE_KEY) or 0):
+        return False
+    if not await client.set(CYCLE_LOCK_KEY, "1", nx=True, ex=30) and not force:
+        return False
+    jitter = random.uniform(-1, 1) * interval * settings.SCRAPE_JITTER
+    await client.set(NEXT_CYCLE_KEY, now + interval + jitter)
+    return True
+
+
+async def start_cycle(force: bool = False, full_recrawl: bool = False, inline: bool = False) -> int:
+    """Start a cycle once parse_interval_minutes has passed; returns the number of jobs.
+
+    Jobs go to the scrape queue, or with ``inline`` run right here one after
+    another. Inline is for CELERY_EAGER, where the caller is the bot: the
+    module-wide Redis clients and the browser pool are bound to the bot's
+    loop, and an eager task would run them on this module's private loop.
+    """
+    filters = await crawl_filters()
+    interval = filters.get("parse_interval_minutes", 30) * 60
+    if not await _claim_cycle(interval, force):
+        return 0
+    jobs = plan_cycle(filters)
+    if inline:
+        for source, city, chunk in jobs:
+            try:
+                await scrape_chunk(source, city, chunk, full_recrawl)
+            except Exception as e:
+                logger.error(f"[Tasks] {source} chunk failed: {str(e)}")
+        return len(jobs)
+    spread = interval * settings.SCRAPE_JITTER
+    for source, city, chunk in jobs:
+        scrape_tasks[source].apply_async((city, chunk, full_recrawl), countdown=random.uniform(0, spread))
+    logger.info(f"[Tasks] Cycle scheduled: {len(jobs)} jobs")
+    return len(jobs)
+
+
+@app.task(name="rentscout.schedule.tick")
+def tick(force: bool = False, full_recrawl: bool = False) -> int:
+    """Runs every minute from beat"""
+    return run(start_cycle(force, full_recrawl))
+
+
+@app.task(name="rentscout.dedup.expire")
+def expire_seen() -> int:
+    return run(seen_listings.expire())
+
@@ -12,7 +12,15 @@ from aiogram.client.default import DefaultBotProperties
 import os
 from dotenv import load_dotenv
 
-from app.parsers.cian.listing_parser import CianParser
+from app.core.config import settings
+from app.integrations.google_sheets import exporter
+from app.services.clustering import RollingResolver
+from app.services.dedup import seen_listings
+from app.services.events import listing_events
+from app.services.subscriptions import SubscriptionIndex, subscriptions
+from app.tasks.celery import RENT_SOURCES, start_cycle, tick
+from app.telegram_bot.dispatcher import NotificationDispatcher
+from app.utils.metrics import serve_metrics
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -21,12 +29,14 @@ logger = logging.getLogger(__name__)
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_CHAT_ID", 0))
 FILTERS_PATH = os.getenv("FILTERS_PATH", "/root/rentscout/config/steinik_filters.json")
+# Recent new listings kept for cross-source duplicate checks
+DUPLICATE_WINDOW = 50_000
 
 bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp = Dispatcher()
+notifier = NotificationDispatcher(bot)
 
 search_task = None
-found_ids = set()
 
 def load_filters():
     try:
@@ -46,12 +56,20 @@ def main_kb():
         [InlineKeyboardButton(text="Statistika", callback_data="stats")]
     ])
 
+async def load_profile(chat_id: int) -> dict:
+    # Crawl-wide settings (interval) come from the shared file, the rest from the chat's profile
+    return {**load_filters(), **(await subscriptions.get(chat_id, load_filters())).filters}
+
+async def update_profile(chat_id: int, **changes) -> dict:
+    await subscriptions.update(chat_id, load_filters(), **changes)
+    return await load_profile(chat_id)
+
 def settings_kb(f):
     a = f.get("area_range", {})
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=f"{a.get(chr(39)+min+chr(39),38)}-{a.get(chr(39)+max+chr(39),150)} m2", callback_data="set_area")],
-        [InlineKeyboardButton(text=f"do {f.get(chr(39)+price_max+chr(39),100000000)//1000000} mln", callback_data="set_price")],
-        [InlineKeyboardButton(text=f"{f.get(chr(39)+parse_interval_minutes+chr(39),30)} min", callback_data="set_interval")],
+        [InlineKeyboardButton(text=f"{a.get('min', 38)}-{a.get('max', 150)} m2", callback_data="set_area")],
+        [InlineKeyboardButton(text=f"do {(f.get('price_max') or 100000000)//1000000} mln", callback_data="set_price")],
+        [InlineKeyboardButton(text=f"{f.get('parse_interval_minutes', 30)} min", callback_data="set_interval")],
         [InlineKeyboardButton(text="Nazad", callback_data="back")]
     ])
 
@@ -62,16 +80,29 @@ async def cmd_start(msg: types.Message):
 @dp.message(Command("stop"))
 async def cmd_stop(msg: types.Message):
     global search_task
-    if search_task:
-        search_task.cancel()
-        search_task = None
+    if (await subscriptions.get(msg.chat.id)).active:
+        await subscriptions.set_active(msg.chat.id, False, load_filters())
+        notifier.unsubscribe(msg.chat.id)
+        # Without subscribers stop reading, so events wait in the stream instead of being dropped
+        if not await subscriptions.active() and search_task:
+            search_task.cancel()
+            search_task = None
         await msg.answer("Poisk ostanovlen")
     else:
         await msg.answer("Poisk ne zapushen")
 
+@dp.message(Command("recrawl"))
+async def cmd_recrawl(msg: types.Message):
+    if settings.CELERY_EAGER:
+        # Runs on this loop, like local_scheduler, so the shared Redis clients stay on one loop
+        asyncio.create_task(start_cycle(force=True, full_recrawl=True, inline=True))
+    else:
+        await asyncio.to_thread(tick.delay, force=True, full_recrawl=True)
+    await msg.answer("Zapushen polnyy poisk po vsem stranitsam")
+
 @dp.callback_query(F.data == "settings")
 async def cb_settings(cb: types.CallbackQuery):
-    await cb.message.edit_text("<b>Nastroyki</b>\nRayony: TTK (CAO + chast)", reply_markup=settings_kb(load_filters()))
+    await cb.message.edit_text("<b>Nastroyki</b>\nRayony: TTK (CAO + chast)", reply_markup=settings_kb(await load_profile(cb.message.chat.id)))
     await cb.answer()
 
 @dp.callback_query(F.data == "back")
@@ -92,9 +123,9 @@ async def cb_area(cb: types.CallbackQuery):
 
 @dp.callback_query(F.data.startswith("area_"))
 async def cb_area_set(cb: types.CallbackQuery):
-    p = cb.data.split("_"); f = load_filters()
-    f["area_range"] = {"min": int(p[1]), "max": int(p[2])}
-    save_filters(f); await cb.answer(f"OK {p[1]}-{p[2]} m2")
+    p = cb.data.split("_")
+    f = await update_profile(cb.message.chat.id, area_range={"min": int(p[1]), "max": int(p[2])})
+    await cb.answer(f"OK {p[1]}-{p[2]} m2")
     await cb.message.edit_text("<b>Nastroyki</b>", reply_markup=settings_kb(f))
 
 @dp.callback_query(F.data == "set_price")
@@ -110,8 +141,8 @@ async def cb_price(cb: types.CallbackQuery):
 
 @dp.callback_query(F.data.startswith("price_"))
 async def cb_price_set(cb: types.CallbackQuery):
-    v = int(cb.data.split("_")[1]) * 1000000; f = load_filters()
-    f["price_max"] = v; save_filters(f)
+    v = int(cb.data.split("_")[1]) * 1000000
+    f = await update_profile(cb.message.chat.id, price_max=v)
     await cb.answer(f"OK do {v//1000000} mln")
     await cb.message.edit_text("<b>Nastroyki</b>", reply_markup=settings_kb(f))
 
@@ -131,70 +162,131 @@ async def cb_int_set(cb: types.CallbackQuery):
     v = int(cb.data.split("_")[1]); f = load_filters()
     f["parse_interval_minutes"] = v; save_filters(f)
     await cb.answer(f"OK {v} min")
-    await cb.message.edit_text("<b>Nastroyki</b>", reply_markup=settings_kb(f))
+    await cb.message.edit_text("<b>Nastroyki</b>", reply_markup=settings_kb(await load_profile(cb.message.chat.id)))
 
 @dp.callback_query(F.data == "stats")
 async def cb_stats(cb: types.CallbackQuery):
-    status = "aktiven" if search_task else "ostanovlen"
-    txt = f"<b>Statistika</b>\n\nNaydeno: {len(found_ids)}\nPoisk: {status}"
+    status = "aktiven" if (await subscriptions.get(cb.message.chat.id)).active else "ostanovlen"
+    txt = f"<b>Statistika</b>\n\nNaydeno: {await seen_listings.count('cian')}\nPoisk: {status}"
     await cb.message.edit_text(txt, reply_markup=InlineKeyboardMarkup(
         inline_keyboard=[[InlineKeyboardButton(text="<", callback_data="back")]]))
     await cb.answer()
 
-async def do_search(chat_id: int):
-    global found_ids
-    parser = CianParser(FILTERS_PATH)
-    try:
-        listings = await parser.parse_listings(max_pages=2)
-        new_count = 0
-        for l in listings:
-            if l.external_id not in found_ids:
-                found_ids.add(l.external_id)
-                new_count += 1
-                district = l.district or "CAO"
-                txt = (
-                    f"<b>{l.rooms}-komn, {l.area} m2</b>\n"
-                    f"Rayon: {district}\n"
-                    f"Etazh: {l.floor}/{l.total_floors}\n"
-                    f"Cena: {l.price/1e6:.1f} mln rub ({int(l.price_per_m2):,} rub/m2)\n"
-                    f"Adres: {l.address[:80]}\n\n"
-                    f"<a href=\"{l.link}\">Smotret na Cian</a>"
-                )
-                await bot.send_message(chat_id, txt)
-                await asyncio.sleep(0.5)
-        return len(listings), new_count
-    finally:
-        await parser.close()
-
-async def search_loop(chat_id: int):
+SOURCE_NAMES = {"cian": "Cian", "avito": "Avito"}
+
+def format_price(price: float, source: str) -> str:
+    if source in RENT_SOURCES:
+        return f"{int(price):,} rub/sutki"
+    return f"{price/1e6:.1f} mln rub"
+
+def format_listing(l: dict) -> str:
+    source = l.get("source") or "cian"
+    price = l.get("price") or 0
+    lines = [f"<b>{l.get('title')}</b>" if source in RENT_SOURCES else
+             f"<b>{l.get('rooms', 0)}-komn, {l.get('area', 0)} m2</b>"]
+    if l.get("district") or source not in RENT_SOURCES:
+        lines.append(f"Rayon: {l.get('district') or 'CAO'}")
+    if l.get("total_floors"):
+        lines.append(f"Etazh: {l.get('floor', 0)}/{l.get('total_floors', 0)}")
+    if l.get("price_per_m2"):
+        lines.append(f"Cena: {format_price(price, source)} ({int(l['price_per_m2']):,} rub/m2)")
+    else:
+        lines.append(f"Cena: {format_price(price, source)}")
+    lines.append(f"Adres: {(l.get('address') or '')[:80]}")
+    name = SOURCE_NAMES.get(source, source)
+    return "\n".join(lines) + f"\n\n<a href=\"{l.get('link', '')}\">Smotret na {name}</a>"
+
+def format_event(event: dict):
+    l = event.get("listing") or {}
+    if event.get("type") == "new":
+        return format_listing(l)
+    if event.get("type") == "price_changed":
+        source = l.get("source") or event.get("source") or "cian"
+        old, new = event.get("old_price") or 0, l.get("price") or 0
+        arrow = "snizhena" if new < old else "povyshena"
+        return (f"<b>Cena {arrow}: {format_price(old, source)} -> {format_price(new, source)}</b>\n\n"
+                + format_listing(l))
+    return None
+
+async def search_loop():
+    # Scraping runs in Celery workers once for all chats; each event goes to the chats whose profile matches
+    index, version = SubscriptionIndex([]), None
+    resolver = RollingResolver(DUPLICATE_WINDOW)
+    while True:
+        try:
+            async for batch in listing_events.consume_batches("telegram-bot", "bot", count=50):
+                # One version round-trip per batch; subscription changes apply from the next batch
+                current = await subscriptions.version()
+                if current != version:
+                    index, version = SubscriptionIndex(await subscriptions.active()), current
+                for event in batch:
+                    # The same flat already announced from another source
+                    if event.get("type") == "new" and resolver.add(event.get("listing") or {}) is not None:
+                        continue
+                    text = format_event(event)
+                    if text:
+                        notifier.publish(text, chats=index.match(event.get("listing") or {}))
+                # The batch is acked when the next one is read, so only once Telegram took every message
+                await notifier.join()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Event stream error: {e}")
+            await asyncio.sleep(5)
+
+async def sheets_loop():
+    # The sheet follows the same stream under its own consumer group, independent of notifications
     while True:
         try:
-            total, new_count = await do_search(chat_id)
-            logger.info(f"Parsed: {total}, new: {new_count}")
-            if new_count == 0:
-                await bot.send_message(chat_id, f"Novyh obyektov net. Provereno: {total}")
+            await exporter.follow(listing_events)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Sheets sync error: {e}")
+            await asyncio.sleep(30)
+
+async def local_scheduler():
+    # CELERY_EAGER: no beat/worker processes, so cycles run on the bot's own loop
+    loop = asyncio.get_running_loop()
+    next_full = loop.time() + settings.FULL_RECRAWL_HOURS * 3600
+    while True:
+        try:
+            # Like beat's full-recrawl entry: only a complete crawl detects removed listings
+            full_recrawl = loop.time() >= next_full
+            await start_cycle(force=full_recrawl, full_recrawl=full_recrawl, inline=True)
+            if full_recrawl:
+                next_full = loop.time() + settings.FULL_RECRAWL_HOURS * 3600
         except Exception as e:
             logger.error(f"Search error: {e}")
-            await bot.send_message(chat_id, f"Oshibka: {str(e)[:100]}")
-        f = load_filters()
-        interval = f.get("parse_interval_minutes", 30)
-        await asyncio.sleep(interval * 60)
+        await asyncio.sleep(60)
 
 @dp.callback_query(F.data == "search")
 async def cb_search(cb: types.CallbackQuery):
     global search_task
-    if search_task and not search_task.done():
+    if (await subscriptions.get(cb.message.chat.id)).active:
         await cb.answer("Poisk uzhe zapushen!")
         return
+    await subscriptions.set_active(cb.message.chat.id, True, load_filters())
     await cb.answer("Poisk zapushen!")
     await cb.message.edit_text(
         "<b>Poisk zapushen...</b>\n\nRayony: TTK (CAO + chast)\n/stop dlya ostanovki",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="< Menu", callback_data="back")]])
     )
-    search_task = asyncio.create_task(search_loop(cb.message.chat.id))
+    if not search_task or search_task.done():
+        search_task = asyncio.create_task(search_loop())
 
 async def main():
+    global search_task
     logger.info("RealtyHunter started - TTK mode")
+    if settings.METRICS_PORT:
+        serve_metrics(settings.METRICS_PORT)
+    if settings.CELERY_EAGER:
+        asyncio.create_task(local_scheduler())
+    if exporter.spreadsheet_id:
+        asyncio.create_task(sheets_loop())
+    # Subscriptions outlive the process, so resume delivery if anyone is subscribed
+    if await subscriptions.active():
+        search_task = asyncio.create_task(search_loop())
     await dp.start_polling(bot)
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+import asyncio
+import time
+from typing import Any, Iterable, Optional
+
+from app.core.config import settings
+from app.utils.logger import logger
+from app.utils.metrics import TELEGRAM_QUEUE_DEPTH
+
+MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n— — —\n\n"
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second with bursts of up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Hand out nothing for ``seconds`` (Telegram flood control)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        # The lock queues waiters, so tokens go out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+
+
+class NotificationDispatcher:
+    """Outbound Telegram queue, decoupled from whatever produces the messages.
+
+    Every chat has its own queue and worker, so a busy chat never delays the
+    others. Sends respect a per-chat and a bot-wide token bucket; a
+    ``RetryAfter`` from Telegram pauses the bot-wide bucket and the message
+    is retried. With ``digest_size`` > 1 up to that many queued messages
+    (collected for at most ``digest_window`` seconds) go out as one.
+    """
+
+    def __init__(self, bot: Any, global_rate: Optional[float] = None, chat_rate: Optional[float] = None,
+                 digest_size: Optional[int] = None, digest_window: Optional[float] = None,
+                 max_attempts: int = 3):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate or settings.TELEGRAM_GLOBAL_RATE)
+        self.chat_rate = chat_rate or settings.TELEGRAM_CHAT_RATE
+        self.digest_size = settings.TELEGRAM_DIGEST_SIZE if digest_size is None else digest_size
+        self.digest_window = settings.TELEGRAM_DIGEST_WINDOW if digest_window is None else digest_window
+        self.max_attempts = max_attempts
+        self.subscribers: set[int] = set()
+        self.stats = {"queued": 0, "delivered": 0, "messages": 0, "retried": 0, "dropped": 0}
+        self._queues: dict[int, asyncio.Queue] = {}
+        self._buckets: dict[int, TokenBucket] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+
+    def subscribe(self, chat_id: int):
+        self.subscribers.add(chat_id)
+
+    def unsubscribe(self, chat_id: int):
+        self.subscribers.discard(chat_id)
+        worker = self._workers.pop(chat_id, None)
+        if worker:
+            worker.cancel()
+        queue = self._queues.pop(chat_id, None)
+        if queue is not None:
+            TELEGRAM_QUEUE_DEPTH.dec(queue.qsize())
+
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues.values())
+
+    def enqueue(self, chat_id: int, text: str):
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = asyncio.Queue()
+            self._buckets.setdefault(chat_id, TokenBucket(self.chat_rate, capacity=1))
+        queue.put_nowait(text)
+        self.stats["queued"] += 1
+        TELEGRAM_QUEUE_DEPTH.inc()
+        worker = self._workers.get(chat_id)
+        if worker is None or worker.done():
+            self._workers[chat_id] = asyncio.create_task(self._work(chat_id, queue))
+
+    def publish(self, text: str, chats: Optional[Iterable[int]] = None) -> int:
+        """Queue ``text`` for ``chats``, or for every subscriber"""
+        targets = list(self.subscribers if chats is None else chats)
+        for chat_id in targets:
+            self.enqueue(chat_id, text)
+        return len(targets)
+
+    async def join(self):
+        """Wait until everything queued so far was sent or dropped"""
+        await asyncio.gather(*(q.join() for q in list(self._queues.values())))
+
+    async def close(self):
+        for worker in self._workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+
+    async def _work(self, chat_id: int, queue: asyncio.Queue):
+        while True:
+            texts = [await queue.get()]
+            try:
+                if self.digest_size > 1:
+                    texts.extend(await self._collect(queue, self.digest_size - 1))
+                for message in self._compose(texts):
+                    await self._send(chat_id, message)
+                self.stats["delivered"] += len(texts)
+            finally:
+                for _ in texts:
+                    queue.task_done()
+                TELEGRAM_QUEUE_DEPTH.dec(len(texts))
+
+    async def _collect(self, queue: asyncio.Queue, limit: int) -> list[str]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.digest_window
+        texts = []
+        while len(texts) < limit:
+            if not queue.empty():
+                texts.append(queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                texts.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return texts
+
+    @staticmethod
+    def _compose(texts: list[str]) -> list[str]:
+        """One message per text, or digests packed under Telegram's length limit"""
+        if len(texts) == 1:
+            return texts
+        messages, current = [], []
+        for text in texts:
+            candidate = DIGEST_SEPARATOR.join([*current, text])
+            if current and len(candidate) > MESSAGE_LIMIT - 64:
+                messages.append(current)
+                current = []
+            current.append(text)
+        messages.append(current)
+        return [f"<b>Novyh obyavleniy: {len(group)}</b>\n\n" + DIGEST_SEPARATOR.join(group)
+                if len(group) > 1 else group[0] for group in messages]
+
+    async def _send(self, chat_id: int, text: str) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            await self._buckets[chat_id].acquire()
+            await self.global_bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                self.stats["messages"] += 1
+                return True
+            except Exception as e:
+                # aiogram's TelegramRetryAfter; duck-typed so fakes and other clients work too
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is None or attempt == self.max_attempts:
+                    logger.error(f"[Dispatcher] Send to {chat_id} failed: {str(e)}")
+                    self.stats["dropped"] += 1
+                    return False
+                logger.warning(f"[Dispatcher] Flood control, retrying in {retry_after}s")
+                self.stats["retried"] += 1
+                # Flood limits apply to the whole bot, so hold every chat
+                self.global_bucket.pause(retry_after)
+        return False
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+from fakeredis import aioredis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import properties
+from app.dependencies.parsers import get_parsers
+from app.models.schemas import PropertyCreate
+from app.services.cache import response_cache
+from app.utils.common import LocalLRU
+
+
+class FakeParser:
+    def __init__(self, source, prices, delay=0.0):
+        self.SOURCE = source
+        self.prices = prices
+        self.delay = delay
+        self.calls = 0
+
+    async def parse(self, city, params):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return [PropertyCreate(source=self.SOURCE, external_id=f"{self.SOURCE}{i}", title=f"{city} {i}", price=p,
+                               rooms=None, area=None, location=None) for i, p in enumerate(self.prices)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    parsers = [FakeParser("avito", [300, 100, 0]), FakeParser("cian", [200, 400], delay=0.05)]
+    monkeypatch.setattr(properties, "load_filters", lambda: {})
+    # The /properties cache starts empty for every test, with fakeredis behind it
+    monkeypatch.setattr(response_cache, "_backend", aioredis.FakeRedis())
+    monkeypatch.setattr(response_cache, "local", LocalLRU(16))
+    app = FastAPI()
+    app.include_router(properties.router)
+    app.dependency_overrides[get_parsers] = lambda: parsers
+    with TestClient(app) as c:
+        c.parsers = parsers
+        yield c
+
+
+def test_stream_ndjson_yields_every_source(client):
+    response = client.get("/properties/stream", params={"city": "moskva"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    listings = [json.loads(line) for line in response.text.splitlines()]
+    # The faster source comes first, each filtered (price > 0) and sorted on its own
+    assert [l["external_id"] for l in listings] == ["avito1", "avito0", "cian0", "cian1"]
+
+
+def test_stream_sse_reports_sources_and_done(client):
+    response = client.get("/properties/stream", params={"city": "moskva", "format": "sse"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    names = [e[0].removeprefix("event: ") for e in events]
+    assert names == ["listing", "listing", "source", "listing", "listing", "source", "done"]
+    assert json.loads(events[-1][1].removeprefix("data: ")) == {"count": 4}
+
+
+def test_page_walks_the_cached_result(client):
+    seen, cursor = [], None
+    while True:
+        body = client.get("/properties/page", params={"city": "moskva", "limit": 3, "cursor": cursor}).json()
+        seen += [item["external_id"] for item in body["items"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert seen == ["avito1", "cian0", "avito0", "cian1"]
+    # Every page came from one fan-out
+    assert [p.calls for p in client.parsers] == [1, 1]
+
+
+def test_page_from_index(client, monkeypatch):
+    calls = []
+
+    async def search_page(size, after=None):
+        calls.append((size, after))
+        return [{"external_id": "x", "price": 1.0}], [1.0, "x"]
+
+    monkeypatch.setattr(properties, "search_page", search_page)
+    body = client.get("/properties/page", params={"from_index": True, "limit": 1}).json()
+    following = client.get("/properties/page", params={"from_index": True, "limit": 1,
+                                                       "cursor": body["next_cursor"]})
+    assert following.status_code == 200 and calls == [(1, None), (1, [1.0, "x"])]
+
+
+def test_page_rejects_filters_the_index_cannot_apply(client):
+    assert client.get("/properties/page", params={"from_index": True, "city": "moskva"}).status_code == 400
+    assert client.get("/properties/page", params={"from_index": True, "property_type": "Дом"}).status_code == 400
+    assert client.get("/properties/page").status_code == 400
+    assert client.get("/properties/page", params={"city": "moskva", "cursor": "%%%"}).status_code == 400
+
+
+def test_app_serves_metrics():
+    from app.main import app
+
+    with TestClient(app) as c:
+        text = c.get("/metrics").text
+    assert "rentscout_cache_events_total" in text and "http_request" in text
@@ -0,0 +1,46 @@
+import asyncio
+
+from app.parsers.avito.parser import BACKENDS, HTMLParser, AvitoParser, parse_html, to_property
+
+PAGE = """<html><body>
+<div data-marker="item" data-item-id="11">
+  <img itemprop="image" src="https://00.img.avito.st/image/1/a1.jpg"><img itemprop="image" src="https://00.img.avito.st/image/1/a2.jpg">
+  <a data-marker="item-title" href="/moskva/kvartiry/11"><h3 itemprop="name">1-к. квартира, 35 м²</h3></a>
+  <meta itemprop="price" content="3200">
+  <div data-marker="item-address"><p><span>Тверская ул., 12</span></p><div><span>р-н Тверской</span></div></div>
+</div>
+<div data-marker="item" data-item-id="12">
+  <a data-marker="item-title" href="/moskva/kvartiry/12"><h3 itemprop="name">Студия</h3></a>
+</div>
+</body></html>"""
+
+
+def test_backends_agree():
+    results = {name: parse(PAGE) for name, parse in BACKENDS.items() if name != "selectolax" or HTMLParser}
+    items, errors = results["lxml"]
+    assert [(i.external_id, i.title, i.price, i.link) for i in items] == [
+        ("11", "1-к. квартира, 35 м²", 3200.0, "https://www.avito.ru/moskva/kvartiry/11")]
+    assert len(errors) == 1
+    assert all(r[0] == items for r in results.values())
+    assert (items[0].address, items[0].district) == ("Тверская ул., 12", "Тверской")
+    assert items[0].photos == ("https://00.img.avito.st/image/1/a1.jpg", "https://00.img.avito.st/image/1/a2.jpg")
+
+
+def test_avito_items_cluster_with_cian():
+    from app.services.clustering import cluster_listings
+
+    avito = parse_html(PAGE)[0][0]._asdict()
+    cian = {"source": "cian", "external_id": "7", "title": "1-комн. кв., 35 м²", "price": 3300.0, "area": 35.0,
+            "address": "Москва, ул. Тверская, д. 12", "link": "https://www.cian.ru/sale/flat/7/"}
+    assert len(cluster_listings([cian, avito])) == 1
+
+
+def test_empty_page_and_property_conversion():
+    assert parse_html("") == ([], [])
+    prop = to_property(parse_html(PAGE)[0][0])
+    assert prop.source == "avito" and prop.area is None
+
+
+def test_parse_items_offloads():
+    items = asyncio.run(AvitoParser(backend="lxml").parse_items(PAGE))
+    assert [i.external_id for i in items] == ["11"]
@@ -0,0 +1,18 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_pipeline_benchmark_runs(tmp_path):
+    # A fresh interpreter: the benchmark has to set the replay settings before anything imports app
+    out = tmp_path / "bench.json"
+    env = {**os.environ, "REDIS_URL": "redis://127.0.0.1:1/0", "ELASTICSEARCH_URL": "http://127.0.0.1:1"}
+    proc = subprocess.run([sys.executable, "-m", "scripts.bench_pipeline", "--repeat", "1", "--out", str(out)],
+                          cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    stages = json.loads(out.read_text())["stages"]
+    assert stages["extract"]["items"] > 0
+    assert stages["cluster"]["items"] > 0
@@ -0,0 +1,116 @@
+import asyncio
+
+import fakeredis
+from fakeredis import aioredis
+
+from app.services import cache as cache_module
+from app.services.cache import TwoTierCache
+
+
+class Clock:
+    """Stands in for the time module inside app.services.cache"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+class DownBackend:
+    async def get(self, key):
+        raise ConnectionError("redis down")
+
+    async def set(self, key, value, ex):
+        raise ConnectionError("redis down")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def counter():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"n": len(calls)}
+
+    return compute, calls
+
+
+def test_single_flight(monkeypatch):
+    monkeypatch.setattr(cache_module, "time", Clock())
+    compute, calls = counter()
+
+    async def scenario():
+        c = TwoTierCache(aioredis.FakeRedis(), namespace="t-flight")
+        return await asyncio.gather(*(c.get_or_compute("k", compute, expire=60) for _ in range(10))), c.stats
+
+    results, stats = run(scenario())
+    assert calls == [1] and all(r == {"n": 1} for r in results)
+    assert stats.misses == 1 and stats.coalesced == 9
+
+
+def test_stale_while_revalidate(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    compute, calls = counter()
+
+    async def scenario():
+        c = TwoTierCache(aioredis.FakeRedis(), namespace="t-swr")
+        await c.get_or_compute("k", compute, expire=60)
+        clock.now += 90
+        stale = await c.get_or_compute("k", compute, expire=60, stale_ttl=60)
+        await asyncio.sleep(0.05)
+        fresh = await c.get_or_compute("k", compute, expire=60, stale_ttl=60)
+        clock.now += 200
+        waited = await c.get_or_compute("k", compute, expire=60, stale_ttl=60)
+        return stale, fresh, waited, c.stats
+
+    stale, fresh, waited, stats = run(scenario())
+    assert stale == {"n": 1} and fresh == {"n": 2} and waited == {"n": 3}
+    assert stats.stale_hits == 1 and stats.refreshes == 1
+
+
+def test_replicas_pick_up_a_peers_refresh(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    compute, calls = counter()
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        a = TwoTierCache(aioredis.FakeRedis(server=server), namespace="t-peer-a")
+        b = TwoTierCache(aioredis.FakeRedis(server=server), namespace="t-peer-b")
+        await a.get_or_compute("k", compute, expire=60)
+        await b.get_or_compute("k", compute, expire=60)
+        clock.now += 61
+        # a refreshes; b's local copy is past local_ttl, so it reads a's value from Redis
+        await a.get_or_compute("k", compute, expire=60, stale_ttl=0)
+        value = await b.get_or_compute("k", compute, expire=60, stale_ttl=0)
+        return value, b.stats
+
+    value, stats = run(scenario())
+    assert calls == [1, 1] and value == {"n": 2}
+    assert stats.remote_hits == 2 and stats.misses == 0
+
+
+def test_redis_down_falls_back_to_local(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    compute, calls = counter()
+
+    async def scenario():
+        c = TwoTierCache(DownBackend(), namespace="t-down")
+        first = await c.get_or_compute("k", compute, expire=60)
+        clock.now += 30
+        second = await c.get_or_compute("k", compute, expire=60)
+        return first, second, c.stats
+
+    first, second, stats = run(scenario())
+    assert first == second == {"n": 1} and calls == [1]
+    assert stats.local_hits == 1 and stats.backend_errors == 3
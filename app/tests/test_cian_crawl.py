@@ -0,0 +1,184 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+from fakeredis import aioredis
+
+from app.parsers.cian.listing_parser import CARD_SELECTOR, CARDS_PER_PAGE as PER_PAGE, CianParser, CrawlShard
+from app.parsers.politeness import SourceScheduler
+from app.services.dedup import CrawlWatermarks, DedupService, MemorySeenStore
+
+
+class FakeSite:
+    """Newest-first Cian search results for a list of (id, price, district id or ids) listings"""
+
+    def __init__(self, listings):
+        self.listings = list(listings)
+        self.loads = []
+
+    def results(self, url):
+        q = parse_qs(urlsplit(url).query)
+        districts = {int(d) for d in q.get("district[]", [])}
+        lo, hi = int(q.get("minprice", [0])[0]), int(q.get("maxprice", [10 ** 12])[0])
+        found = [l for l in self.listings
+                 if lo <= l[1] <= hi and (not districts or districts & set(l[2] if isinstance(l[2], tuple) else [l[2]]))]
+        return sorted(found, reverse=True)
+
+    def leaves(self) -> list[str]:
+        """Queries (URLs without the page) that returned results and were not split into narrower ones"""
+        def bounds(query):
+            q = parse_qs(urlsplit(query).query)
+            return q.get("district[]"), int(q.get("minprice", [0])[0]), int(q.get("maxprice", [10 ** 12])[0])
+
+        queries = {url.rsplit("&p=", 1)[0] for url in self.loads if self.results(url)}
+        narrower = lambda a, b: a != b and a[0] == b[0] and b[1] <= a[1] and a[2] <= b[2]
+        return sorted(q for q in queries if not any(narrower(bounds(o), bounds(q)) for o in queries))
+
+    def page(self, url):
+        self.loads.append(url)
+        found = self.results(url)
+        p = int(parse_qs(urlsplit(url).query)["p"][0])
+        cards = [{"link": f"https://www.cian.ru/sale/flat/{i}/", "title": "2-комн. кв., 50 м², 3/9 этаж",
+                  "address": "Москва, ЦАО, р-н Арбат, Тверская ул., 1", "price": f"{price} ₽"}
+                 for i, price, _ in found[(p - 1) * PER_PAGE:p * PER_PAGE]]
+        return cards, len(found)
+
+
+class FakePage:
+    def __init__(self, site):
+        self.site = site
+        self.url = ""
+        self.cards, self.total = [], 0
+
+    async def goto(self, url, **kwargs):
+        self.url = url
+        self.cards, self.total = self.site.page(url)
+        return SimpleNamespace(status=200, headers={})
+
+    async def wait_for_selector(self, selector, timeout=None):
+        if not self.cards:
+            raise TimeoutError(selector)
+
+    async def query_selector(self, selector):
+        return None
+
+    async def evaluate(self, script, arg=None):
+        return self.cards if arg == CARD_SELECTOR else f"Найдено {self.total} объявлений"
+
+
+class FakePool:
+    def __init__(self, site):
+        self.site = site
+
+    @asynccontextmanager
+    async def page(self):
+        yield FakePage(self.site)
+
+
+def make_parser(site, **kwargs):
+    return CianParser(pool=FakePool(site), filters={}, scheduler=SourceScheduler("cian-test", rate=1e6, max_rate=1e6),
+                      **kwargs)
+
+
+def test_incremental_crawl_resumes_below_max_pages_cut():
+    site = FakeSite((i, 10_000_000 + i, 13) for i in range(1, 201))
+
+    async def scenario():
+        seen = DedupService(MemorySeenStore())
+        watermarks = CrawlWatermarks(aioredis.FakeRedis(decode_responses=True))
+        got = []
+        for run in range(12):
+            if run == 3:
+                # Newer listings arrive while the backlog is still being worked through
+                site.listings += [(i, 10_000_000 + i, 13) for i in range(201, 211)]
+            parser = make_parser(site, incremental=True, seen=seen, watermarks=watermarks)
+            listings = await parser.parse_listings(max_pages=2, district_ids=[13])
+            got += await seen.check_and_mark("cian", [l.external_id for l in listings])
+        # The listings sit in one price band too narrow to split, so one leaf query holds them all
+        [query] = site.leaves()
+        return got, await watermarks.get(query), await watermarks.resume_page(query)
+
+    got, watermark, resume = asyncio.run(scenario())
+    assert sorted(map(int, got)) == list(range(1, 211))
+    assert watermark == 210 and resume is None
+
+
+def test_cut_off_crawl_keeps_the_watermark():
+    site = FakeSite((i, 10_000_000 + i, 13) for i in range(1, 101))
+
+    async def scenario():
+        watermarks = CrawlWatermarks(aioredis.FakeRedis(decode_responses=True))
+        parser = make_parser(site, incremental=True, seen=DedupService(MemorySeenStore()), watermarks=watermarks)
+        await parser.parse_listings(max_pages=1, district_ids=[13])
+        [query] = site.leaves()
+        return await watermarks.get(query), await watermarks.resume_page(query)
+
+    assert asyncio.run(scenario()) == (None, 2)
+
+
+def test_split_crawl_is_complete_once_every_leaf_ran_out():
+    site = FakeSite((i, i * 50_000, 13) for i in range(1, 2001))
+
+    async def scenario():
+        parser = make_parser(site)
+        listings = await parser.parse_listings(max_pages=60, district_ids=[13])
+        return listings, parser.complete
+
+    listings, complete = asyncio.run(scenario())
+    assert sorted(int(l.external_id) for l in listings) == list(range(1, 2001))
+    assert complete
+    assert any("maxprice" in url for url in site.loads)
+
+
+def test_split_by_price():
+    shard = CrawlShard([13, 14])
+    low, high = shard.split_by_price(100_000_000)
+    assert (low, high) == (CrawlShard([13, 14], None, 50_000_000), CrawlShard([13, 14], 50_000_001, 100_000_000))
+    assert high.split_by_price(100_000_000) == [CrawlShard([13, 14], 50_000_001, 75_000_000),
+                                                 CrawlShard([13, 14], 75_000_001, 100_000_000)]
+    assert CrawlShard([13], 10_000_000, 11_999_999).split_by_price(100_000_000) == []
+    assert high.label == "d13,14 50000001-100000000"
+
+
+def test_split_threshold_follows_max_pages():
+    site = FakeSite((i, i * 500_000, 13) for i in range(1, 61))
+    asyncio.run(make_parser(site).parse_listings(max_pages=3, district_ids=[13]))
+    assert not any("maxprice" in url for url in site.loads)
+    site.loads.clear()
+    asyncio.run(make_parser(site).parse_listings(max_pages=2, district_ids=[13]))
+    assert len(site.leaves()) > 1 and any("maxprice" in url for url in site.loads)
+
+
+def test_shards_are_merged_without_duplicates():
+    # Listing 0 is on the border of two districts and shows up in both shards
+    site = FakeSite([(0, 20_000_000, (13, 14)), *((i, i * 100_000, 13 + i % 2) for i in range(1, 301))])
+
+    async def scenario():
+        parser = make_parser(site, shard_size=1)
+        return await parser.parse_listings(max_pages=2, district_ids=[13, 14]), parser.complete
+
+    listings, complete = asyncio.run(scenario())
+    ids = [int(l.external_id) for l in listings]
+    assert sorted(ids) == list(range(0, 301)) and complete
+    assert len(site.leaves()) > 2
+
+
+def test_incremental_run_with_nothing_new_does_not_split():
+    site = FakeSite((i, i * 30_000, 13) for i in range(1, 3001))
+
+    async def scenario():
+        seen = DedupService(MemorySeenStore())
+        watermarks = CrawlWatermarks(aioredis.FakeRedis(decode_responses=True))
+        loads = []
+        for full_recrawl in (True, False, False):
+            site.loads.clear()
+            parser = make_parser(site, incremental=True, seen=seen, watermarks=watermarks)
+            listings = await parser.parse_listings(max_pages=5, full_recrawl=full_recrawl, district_ids=[13])
+            await seen.check_and_mark("cian", [l.external_id for l in listings])
+            loads.append(len(site.loads))
+        return loads
+
+    full, *incremental = asyncio.run(scenario())
+    # Only the full recrawl pays for the price split; later runs stop at the first page of known listings
+    assert full > 100 and incremental == [1, 1]
@@ -0,0 +1,70 @@
+from app.services.clustering import (ListingResolver, RollingResolver, cluster_listings, normalize_address,
+                                    photo_key)
+
+
+def listing(source, ext_id, **fields):
+    base = {"source": source, "external_id": ext_id, "title": "2-комн. квартира, 54 м²", "price": 25_000_000,
+            "area": 54.0, "floor": 5, "total_floors": 9, "rooms": 2, "district": "Хамовники"}
+    return {**base, **fields}
+
+
+def test_address_and_photo_normalization():
+    assert normalize_address("Москва, ул. Тверская, д. 12") == normalize_address("Тверская улица, 12")
+    assert normalize_address("ул. Тверская") == ""
+    assert photo_key("https://cdn.a/img/abc123-1024x768.jpg?v=2") == photo_key("https://img.b/x/abc123.webp")
+
+
+def test_same_address_across_sources_collapses():
+    items = [
+        listing("cian", "1", address="Москва, ул. Тверская, д. 12", link="c/1"),
+        listing("avito", "a1", address="Тверская ул., 12", area=54.4, price=26_000_000, link="a/1"),
+        listing("avito", "a2", address="Тверская ул., 12", floor=6),
+        listing("cian", "2", address="Тверская ул., 12"),
+    ]
+    clusters = cluster_listings(items)
+    assert len(clusters) == 3
+    sources = sorted((s["source"], s["external_id"]) for s in clusters[0]["sources"])
+    # Same-source listings are never merged with each other
+    assert sources == [("avito", "a1"), ("cian", "1")]
+
+
+def test_shared_photos_match_without_address():
+    photos = [f"https://cdn/{i}.jpg" for i in range(6)]
+    resolver = ListingResolver()
+    first = listing("cian", "1", district=None, photos=photos)
+    assert resolver.add(first) is None
+    assert resolver.add(listing("sutochno", "s1", district=None, photos=photos[:5] + ["x.jpg"])) is first
+    assert resolver.add(listing("avito", "a1", district=None, photos=["other.jpg"])) is None
+
+
+def test_district_block_needs_close_price_and_title():
+    resolver = ListingResolver()
+    resolver.add(listing("cian", "1"))
+    assert resolver.add(listing("avito", "a1", price=24_500_000)) is not None
+    assert resolver.add(listing("sutochno", "s1", price=21_000_000)) is None
+
+
+def test_oversized_blocks_are_skipped():
+    resolver = ListingResolver(max_block=3)
+    for i in range(10):
+        resolver.add(listing("cian" if i % 2 else "avito", str(i), price=1_000_000 + i))
+    assert resolver.stats["oversized"] == 7
+    assert resolver.stats["compared"] <= 3
+
+
+def test_rolling_window_keeps_recent_listings():
+    def flat(source, ext_id, address, **fields):
+        # Without a district only the address block applies
+        return listing(source, ext_id, address=address, district=None, **fields)
+
+    resolver = RollingResolver(window=4)
+    first = flat("cian", "1", "ул. Тверская, 12")
+    assert resolver.add(first) is None
+    resolver.add(flat("cian", "2", "ул. Арбат, 1"))
+    # Two more listings only move the window on; the first is still in the previous generation
+    resolver.add(flat("cian", "3", "ул. Арбат, 3"))
+    assert resolver.add(flat("avito", "a1", "Тверская ул., 12")) is first
+    for i in range(4, 8):
+        resolver.add(flat("cian", str(i), f"ул. Арбат, {i}"))
+    assert resolver.add(flat("avito", "a2", "Тверская ул., 12")) is None
+    assert len(resolver) <= 4
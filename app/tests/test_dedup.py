@@ -0,0 +1,60 @@
+import asyncio
+
+import fakeredis
+from fakeredis import aioredis
+
+from app.services.dedup import CrawlWatermarks, DedupService, RedisSeenStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_check_and_mark_script():
+    async def scenario():
+        client = aioredis.FakeRedis()
+        store = RedisSeenStore(client, prefix="t-seen")
+        first = await store.check_and_mark("cian", ["1", "2", "2"], 100.0)
+        second = await store.check_and_mark("cian", ["2", "3"], 200.0)
+        other = await store.check_and_mark("avito", ["1"], 200.0)
+        scores = await client.zrange("t-seen:cian", 0, -1, withscores=True)
+        return first, second, other, scores
+
+    first, second, other, scores = run(scenario())
+    assert first == ["1", "2"] and second == ["3"] and other == ["1"]
+    # Known IDs get their last-seen time refreshed, new ones are stamped
+    assert scores == [(b"1", 100.0), (b"2", 200.0), (b"3", 200.0)]
+
+
+def test_replicas_share_marks_and_expiry():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        a = DedupService(RedisSeenStore(aioredis.FakeRedis(server=server), prefix="t-shared"), ttl_days=1)
+        b = DedupService(RedisSeenStore(aioredis.FakeRedis(server=server), prefix="t-shared"), ttl_days=1)
+        marked = await a.check_and_mark("cian", [1, 2])
+        unseen = await b.filter_new("cian", ["2", "3"])
+        racing = await asyncio.gather(b.check_and_mark("cian", ["3", "4"]), a.check_and_mark("cian", ["4", "3"]))
+        await a.store.client.zadd("t-shared:cian", {"1": 0})
+        removed = await b.expire()
+        return marked, unseen, racing, removed, await a.count(), await b.filter_new("cian", ["1", "2"])
+
+    marked, unseen, racing, removed, count, after = run(scenario())
+    assert marked == ["1", "2"] and unseen == ["3"]
+    # Each ID is new to exactly one replica
+    assert sorted(racing[0] + racing[1]) == ["3", "4"]
+    assert removed == 1 and count == 3 and after == ["1"]
+
+
+def test_watermark_script_only_advances():
+    async def scenario():
+        marks = CrawlWatermarks(aioredis.FakeRedis(), key="t-watermarks")
+        url = "https://www.cian.ru/cat.php?p=1"
+        steps = [await marks.advance(url, 500), await marks.advance(url, 400), await marks.advance(url, 700)]
+        await marks.set_resume_page(url, 3)
+        value, resume = await marks.get(url), await marks.resume_page(url)
+        await marks.reset(url)
+        return steps, value, resume, await marks.get(url), await marks.resume_page(url)
+
+    steps, value, resume, cleared, cleared_resume = run(scenario())
+    assert steps == [True, False, True] and value == 700 and resume == 3
+    assert cleared is None and cleared_resume is None
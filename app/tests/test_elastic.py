@@ -0,0 +1,104 @@
+import asyncio
+
+from app.db import elastic
+from app.db.elastic import BulkIndexer
+
+
+class FakeBulk:
+    """Stands in for elasticsearch.helpers.async_bulk; ``fail`` maps ids to the statuses of their next attempts"""
+
+    def __init__(self, fail=None):
+        self.fail = {doc_id: list(statuses) for doc_id, statuses in (fail or {}).items()}
+        self.calls = []
+
+    async def __call__(self, client, actions, **kwargs):
+        self.calls.append([a["_id"] for a in actions])
+        errors = []
+        for action in actions:
+            statuses = self.fail.get(action["_id"])
+            if statuses:
+                errors.append({"index": {"_id": action["_id"], "status": statuses.pop(0)}})
+        return len(actions) - len(errors), errors
+
+
+def listing(i, price=100.0):
+    return {"source": "cian", "external_id": str(i), "title": f"t{i}", "price": price}
+
+
+def indexer(monkeypatch, fail=None, **kwargs):
+    bulk = FakeBulk(fail)
+    monkeypatch.setattr(elastic, "async_bulk", bulk)
+    return BulkIndexer(client=None, retry_backoff=0, **kwargs), bulk
+
+
+def test_retries_only_throttled_and_unavailable_items(monkeypatch):
+    bulk_indexer, bulk = indexer(monkeypatch, fail={"1": [429], "2": [503, 502], "3": [400]})
+
+    async def scenario():
+        await bulk_indexer.add_many([listing(i) for i in range(5)])
+        await bulk_indexer.flush()
+
+    asyncio.run(scenario())
+    # 400 is not retried; 429 and 5xx go out again on their own
+    assert bulk.calls == [["0", "1", "2", "3", "4"], ["1", "2"], ["2"]]
+    assert bulk_indexer.stats == {"indexed": 4, "skipped": 0, "failed": 1, "retried": 3, "flushes": 3}
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    bulk_indexer, bulk = indexer(monkeypatch, fail={"0": [429] * 10}, max_retries=2)
+
+    async def scenario():
+        await bulk_indexer.add(listing(0))
+        await bulk_indexer.flush()
+
+    asyncio.run(scenario())
+    assert bulk.calls == [["0"]] * 3
+    assert bulk_indexer.stats["failed"] == 1 and bulk_indexer.stats["indexed"] == 0
+
+
+def test_unchanged_documents_are_skipped(monkeypatch):
+    bulk_indexer, bulk = indexer(monkeypatch, fail={"1": [400]})
+
+    async def scenario():
+        await bulk_indexer.add_many([listing(0), listing(1)])
+        await bulk_indexer.flush()
+        # 0 is unchanged, 1 never made it in, 2 changed price
+        await bulk_indexer.add_many([listing(0), listing(1), listing(2)])
+        await bulk_indexer.flush()
+        await bulk_indexer.add_many([listing(2, price=90.0)])
+        await bulk_indexer.flush()
+
+    asyncio.run(scenario())
+    assert bulk.calls == [["0", "1"], ["1", "2"], ["2"]]
+    assert bulk_indexer.stats["skipped"] == 1
+
+
+def test_flushes_by_count_and_size(monkeypatch):
+    bulk_indexer, bulk = indexer(monkeypatch, max_docs=3)
+
+    async def scenario():
+        await bulk_indexer.add_many([listing(i) for i in range(7)])
+
+    asyncio.run(scenario())
+    assert bulk.calls == [["0", "1", "2"], ["3", "4", "5"]] and len(bulk_indexer._buffer) == 1
+
+    bulk_indexer, bulk = indexer(monkeypatch, max_bytes=len(elastic.dumps(elastic.prepare_document(listing(0)))) * 2)
+    asyncio.run(bulk_indexer.add_many([listing(i) for i in range(5)]))
+    assert bulk.calls == [["0", "1"], ["2", "3"]]
+
+
+def test_flushes_on_the_interval(monkeypatch):
+    bulk_indexer, bulk = indexer(monkeypatch, flush_interval=0.02)
+
+    async def scenario():
+        bulk_indexer.start()
+        await bulk_indexer.add(listing(0))
+        assert bulk.calls == []
+        await asyncio.sleep(0.05)
+        calls = list(bulk.calls)
+        await bulk_indexer.add(listing(1))
+        await bulk_indexer.close()
+        return calls
+
+    assert asyncio.run(scenario()) == [["0"]]
+    assert bulk.calls == [["0"], ["1"]] and bulk_indexer._timer is None
@@ -0,0 +1,70 @@
+import asyncio
+
+from app.core.config import settings
+from app.services.fanout import fan_out, iter_results, merge_results, source_timeout
+
+
+async def source(delay, items):
+    await asyncio.sleep(delay)
+    if items is None:
+        raise RuntimeError("blocked")
+    return items
+
+
+def test_fan_out_isolates_slow_and_failing_sources():
+    async def scenario():
+        calls = {"avito": lambda: source(0.01, [1, 2]), "cian": lambda: source(1, [3]),
+                 "broken": lambda: source(0, None), "empty": lambda: source(0, [])}
+        return await fan_out(calls, timeouts={"cian": 0.05}, default_timeout=1)
+
+    results = asyncio.run(scenario())
+    assert [(r.source, r.error) for r in results] == [
+        ("avito", None), ("cian", "timeout"), ("broken", "blocked"), ("empty", None)]
+    assert results[1].elapsed < 0.5 and results[1].items == []
+    assert merge_results(results) == [1, 2]
+
+
+def test_fan_out_caps_concurrency():
+    running, peak = 0, 0
+
+    async def tracked(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return [i]
+
+    async def scenario():
+        calls = {f"s{i}": (lambda i=i: tracked(i)) for i in range(6)}
+        return await fan_out(calls, timeouts={}, default_timeout=1, concurrency=2)
+
+    results = asyncio.run(scenario())
+    assert peak == 2 and merge_results(results) == list(range(6))
+
+
+def test_closing_iter_results_cancels_the_rest():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+        return []
+
+    async def scenario():
+        results = iter_results({"fast": lambda: source(0, [1]), "slow": slow}, timeouts={}, default_timeout=5)
+        first = await results.__anext__()
+        await results.aclose()
+        await asyncio.sleep(0)
+        return first
+
+    assert asyncio.run(scenario()).items == [1] and cancelled == ["slow"]
+
+
+def test_zero_timeout_is_not_unset():
+    assert source_timeout("avito", {}, 0) == 0
+    assert source_timeout("avito", {}, None) == settings.PARSER_TIMEOUT
+    assert source_timeout("avito", {"avito": 0}, 5) == 0
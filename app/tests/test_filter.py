@@ -0,0 +1,50 @@
+import json
+import random
+
+from app.models.listing import Listing
+from app.services.filter import ListingFrame, filter_properties
+from app.services.subscriptions import accepts
+
+with open("config/steinik_filters.json", encoding="utf-8") as f:
+    FILTERS = json.load(f)
+
+RENOVATION = ["евроремонт", "Дизайнерский ремонт", "косметический", "без ремонта", None]
+SELLERS = ["собственник", "Агентство", "застройщик", None]
+
+
+def listings(n: int) -> list[Listing]:
+    rnd = random.Random(7)
+    prices = rnd.sample(range(1_000_000, 150_000_000, 1000), n)
+    out = []
+    for i, price in enumerate(prices):
+        total = rnd.choice([0, 5, 9, 17])
+        out.append(Listing(
+            "cian", str(i), price=float(price) if rnd.random() > 0.05 else 0.0,
+            area=rnd.choice([0.0, rnd.uniform(20, 200)]), floor=rnd.randint(0, max(total, 1)),
+            total_floors=total, district=rnd.choice(["Арбат", "Хамовники", None]),
+            renovation=rnd.choice(RENOVATION), seller_type=rnd.choice(SELLERS),
+        ))
+    return out
+
+
+def per_item(items: list, filters: dict, top_k: int) -> list[str]:
+    """The filter applied one listing at a time, then a full sort"""
+    kept = [l for l in items if l.price > 0 and (not filters or accepts(filters, l.dict()))]
+    return [l.external_id for l in sorted(kept, key=lambda l: l.price)[:top_k]]
+
+
+def test_frame_matches_per_item_filter():
+    items = listings(2000)
+    frame = ListingFrame(items)
+    for filters in ({}, FILTERS, {**FILTERS, "floor": {"not_first": True}, "seller_type": ["агентство"]}):
+        expected = set(per_item(items, filters, len(items)))
+        assert {items[i].external_id for i in frame.mask(filters).nonzero()[0]} == expected
+        for top_k in (1, 50, 1000, 5000):
+            ranked = [items[i].external_id for i in frame.rank(frame.mask(filters), top_k)]
+            assert ranked == per_item(items, filters, top_k)
+
+
+def test_filter_properties_applies_the_filters():
+    items = listings(500)
+    assert [l.external_id for l in filter_properties(items, FILTERS)] == per_item(items, FILTERS, 1000)
+    assert len(filter_properties(items, FILTERS)) < len(filter_properties(items))
@@ -0,0 +1,143 @@
+from collections import Counter
+
+from app.integrations.google_sheets import GoogleSheetsExporter
+
+
+class FakeWorksheet:
+    def __init__(self, rows):
+        self.rows = [list(r) for r in rows]
+        self.calls = Counter()
+
+    def get_all_values(self):
+        self.calls["get_all_values"] += 1
+        return [list(r) for r in self.rows]
+
+    def col_values(self, col):
+        self.calls["col_values"] += 1
+        return [r[col - 1] for r in self.rows]
+
+    def append_row(self, row, **kwargs):
+        self.calls["append_row"] += 1
+        self.rows.append(row)
+
+    def append_rows(self, rows, value_input_option="RAW"):
+        # RAW, as gspread defaults: USER_ENTERED would turn floors like "5/12" into dates
+        assert value_input_option == "RAW"
+        self.calls["append_rows"] += 1
+        self.rows.extend(rows)
+
+    def batch_update(self, data, value_input_option="RAW"):
+        assert value_input_option == "RAW"
+        self.calls["batch_update"] += 1
+        self.updates = data
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self.ws = worksheet
+        self.calls = Counter()
+
+    def worksheet(self, name):
+        self.calls["worksheet"] += 1
+        return self.ws
+
+
+HEADER = ["ID", "Дата", "Источник", "Ссылка"]
+
+
+def make_exporter(rows=(), **kwargs):
+    ws = FakeWorksheet([HEADER, *rows])
+    exp = GoogleSheetsExporter(creds_path="unused", **kwargs)
+    exp.sheet = FakeSpreadsheet(ws)
+    return exp, ws
+
+
+def listing(ext_id, source="cian"):
+    return {"source": source, "external_id": ext_id, "link": f"https://www.cian.ru/sale/flat/{ext_id}/",
+            "price": 25000000, "area": 50}
+
+
+def test_batch_is_one_read_and_one_append():
+    exp, ws = make_exporter([["1", "01.01.2026", "cian", "https://www.cian.ru/sale/flat/111111/"]])
+    ids = exp.add_listings([listing("222222"), listing("333333"), listing("111111")])
+    assert ids == [2, 3]
+    assert ws.calls == Counter({"get_all_values": 1, "append_rows": 1})
+    assert exp.sheet.calls["worksheet"] == 1
+    assert [r[0] for r in ws.rows[1:]] == ["1", "2", "3"]
+
+
+def test_state_is_maintained_incrementally():
+    exp, ws = make_exporter()
+    exp.add_listings([listing("222222")])
+    assert exp.check_exists("222222")
+    assert not exp.check_exists("999999")
+    assert exp.add_listings([listing("222222")]) == []
+    assert exp.add_listing(listing("444444")) == 2
+    assert ws.calls == Counter({"get_all_values": 1, "append_rows": 2})
+
+
+def test_write_behind_coalesces_and_batches():
+    exp, ws = make_exporter(batch_size=3, flush_interval=3600)
+    for ext_id in ("1000001", "1000002", "1000001"):
+        exp.enqueue(listing(ext_id))
+    assert exp.check_exists("1000002")
+    assert ws.calls["append_rows"] == 0
+    exp.enqueue(listing("1000003"))
+    assert ws.calls["append_rows"] == 1
+    assert len(ws.rows) == 4
+    assert exp.flush() == 0
+    assert ws.calls["append_rows"] == 1
+
+
+def test_events_patch_existing_rows_in_one_call():
+    exp, ws = make_exporter([["1", "01.01.2026", "cian", "https://www.cian.ru/sale/flat/111111/"]],
+                            flush_interval=3600)
+    cheaper = {**listing("111111"), "price": 24000000, "price_per_m2": 480000}
+    patched = exp.apply_events([
+        {"type": "new", "source": "cian", "listing": listing("222222")},
+        {"type": "price_changed", "source": "cian", "listing": cheaper, "old_price": 25000000},
+        {"type": "removed", "source": "cian", "listing": {"external_id": "222222", "price": 25000000}},
+        {"type": "removed", "source": "cian", "listing": {"external_id": "999999", "price": 1}},
+    ])
+    assert patched == 2
+    assert ws.calls == Counter({"get_all_values": 1, "append_rows": 1, "batch_update": 1})
+    assert ws.updates == [{"range": "M2:N2", "values": [["24000000", "480000"]]},
+                          {"range": "O3", "values": [["Снято"]]}]
+
+
+def test_follow_writes_the_event_stream_before_acking():
+    import asyncio
+
+    from fakeredis import aioredis
+
+    from app.services.events import ListingEvents
+
+    exp, ws = make_exporter([["1", "01.01.2026", "cian", "https://www.cian.ru/sale/flat/111111/"]],
+                            flush_interval=3600)
+    events = ListingEvents(aioredis.FakeRedis(decode_responses=True), stream="test:sheets")
+    cheaper = {**listing("111111"), "price": 24000000, "price_per_m2": 480000}
+
+    read = events.client.xreadgroup
+
+    async def xreadgroup(*args, **kwargs):
+        # fakeredis answers a blocking read at once; without this the follower never yields
+        reply = await read(*args, **kwargs)
+        if not reply or not reply[0][1]:
+            await asyncio.sleep(0.01)
+        return reply
+
+    events.client.xreadgroup = xreadgroup
+
+    async def scenario():
+        await events.publish_new("cian", [listing("222222"), listing("333333")])
+        await events.publish([{"type": "price_changed", "source": "cian", "listing": cheaper}])
+        follower = asyncio.create_task(exp.follow(events))
+        while len(ws.rows) < 4 or (await events.client.xpending(events.stream, "google-sheets"))["pending"]:
+            await asyncio.sleep(0.01)
+        follower.cancel()
+        return await events.client.xpending(events.stream, "google-sheets")
+
+    pending = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert pending["pending"] == 0
+    assert ws.calls == Counter({"get_all_values": 1, "append_rows": 1, "batch_update": 1})
+    assert [r[3] for r in ws.rows[2:]] == [listing("222222")["link"], listing("333333")["link"]]
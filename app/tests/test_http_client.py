@@ -0,0 +1,85 @@
+import asyncio
+import random
+from collections import Counter
+
+import httpx
+
+from app.parsers.http_client import HttpClientPool, ProxyPool
+
+
+def pool_with(handler, **kwargs) -> HttpClientPool:
+    pool = HttpClientPool(proxies=[], **kwargs)
+    pool._clients[None] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return pool
+
+
+def test_failing_proxy_cools_down_and_loses_score():
+    pool = ProxyPool(["http://a:1", "http://b:1"], base_cooldown=60)
+    pool.report("http://a:1", ok=False)
+    assert pool.score["http://a:1"] < pool.score["http://b:1"]
+    assert {pool.choose() for _ in range(50)} == {"http://b:1"}
+    pool.report("http://a:1", ok=False)
+    assert pool.cooldown_until["http://a:1"] - pool.cooldown_until["http://b:1"] > 100
+
+
+def test_all_cooling_down_picks_the_first_to_recover():
+    pool = ProxyPool(["http://a:1", "http://b:1"], base_cooldown=60)
+    pool.report("http://a:1", ok=False)
+    pool.report("http://a:1", ok=False)
+    pool.report("http://b:1", ok=False)
+    assert pool.choose() == "http://b:1"
+
+
+def test_healthy_proxies_share_load():
+    random.seed(1)
+    pool = ProxyPool(["http://a:1", "http://b:1", "http://c:1"])
+    picks = [pool.choose() for _ in range(300)]
+    assert min(picks.count(p) for p in pool.proxies) > 60
+    assert ProxyPool([]).choose() is None
+
+
+def test_conditional_get_serves_304_from_the_stored_body():
+    sent = []
+
+    def handler(request):
+        sent.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        return httpx.Response(200, headers={"etag": '"v1"', "content-type": "text/html"}, text="<html>1</html>")
+
+    async def scenario():
+        pool = pool_with(handler)
+        first = await pool.get("https://www.avito.ru/moskva")
+        second = await pool.get("https://www.avito.ru/moskva")
+        third = await pool.get("https://www.avito.ru/moskva", conditional=False)
+        await pool.close()
+        return pool, first, second, third
+
+    pool, first, second, third = asyncio.run(scenario())
+    assert sent == [None, '"v1"', None]
+    assert second.status_code == 200 and second.text == first.text == third.text
+    assert second.extensions.get("not_modified") and not first.extensions.get("not_modified")
+    assert second.headers["content-type"] == "text/html"
+    assert pool.stats["not_modified"] == 1
+
+
+def test_requests_in_flight_are_capped_per_host():
+    in_flight, peak = Counter(), Counter()
+
+    async def handler(request):
+        host = request.url.host
+        in_flight[host] += 1
+        peak[host] = max(peak[host], in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return httpx.Response(200)
+
+    async def scenario():
+        pool = pool_with(handler, max_per_host=2)
+        urls = [f"https://{host}/{i}" for host in ("a.test", "b.test") for i in range(6)]
+        responses = await asyncio.gather(*(pool.get(u, conditional=False) for u in urls))
+        await pool.close()
+        return responses
+
+    assert all(r.status_code == 200 for r in asyncio.run(scenario()))
+    assert peak == Counter({"a.test": 2, "b.test": 2})
@@ -0,0 +1,21 @@
+import json
+
+import numpy as np
+
+from app.models.listing import Listing, dumps, loads
+from app.models.schemas import PropertyCreate
+from app.services.filter import filter_properties
+
+
+def test_listing_is_compact_and_round_trips():
+    listing = Listing("cian", "7", title="Студия", price=9_000_000.0, area=25.0, link="https://cian.ru/7/")
+    assert not hasattr(listing, "__dict__")
+    assert Listing.from_dict({**listing.dict(), "unknown": 1}) == listing
+    assert loads(dumps(listing)) == json.loads(json.dumps(listing.dict()))
+    assert listing.to_model(PropertyCreate).external_id == "7"
+
+
+def test_pipeline_accepts_listing_records():
+    listings = [Listing("cian", str(i), price=float(p)) for i, p in enumerate([300, 100, 200])]
+    assert [l.external_id for l in filter_properties(listings)] == ["1", "2", "0"]
+    assert loads(dumps({"price": np.float64(1.5), 1: "a"})) == {"price": 1.5, "1": "a"}
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from app.services.fanout import iter_results
+from app.services.pagination import decode_cursor, page_after
+
+
+def listings(n):
+    return [{"external_id": str(i), "price": 1000 + (i % 5) * 100} for i in range(n)]
+
+
+def test_pages_cover_everything_once():
+    items, seen, cursor = listings(23), [], None
+    while True:
+        page, cursor = page_after(items, cursor, 5)
+        seen.extend(i["external_id"] for i in page)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(i["external_id"] for i in items)
+    assert len(seen) == len(set(seen))
+
+
+def test_cursor_survives_refresh():
+    items = listings(10)
+    first, cursor = page_after(items, None, 4)
+    # A listing cheaper than everything already served shows up between requests
+    refreshed = items + [{"external_id": "new", "price": 1}]
+    second, _ = page_after(refreshed, cursor, 4)
+    assert not {i["external_id"] for i in first} & {i["external_id"] for i in second}
+    assert "new" not in {i["external_id"] for i in second}
+
+
+def test_malformed_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_iter_results_yields_fastest_first():
+    async def source(delay, items):
+        await asyncio.sleep(delay)
+        if items is None:
+            raise RuntimeError("blocked")
+        return items
+
+    async def scenario():
+        calls = {"slow": lambda: source(0.05, [1]), "fast": lambda: source(0, [2]),
+                 "broken": lambda: source(0.01, None)}
+        return [r.source async for r in iter_results(calls, timeouts={}, default_timeout=1)]
+
+    assert asyncio.run(scenario()) == ["fast", "broken", "slow"]
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.parsers.avito import parser as avito
+from app.parsers.politeness import CircuitBreaker, SourceScheduler, SourceUnavailable, Throttled, retry_after
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_aimd_rate():
+    s = SourceScheduler("test", rate=1.0, min_rate=0.1, max_rate=2.0, increase=0.1, latency_target=1.0)
+    s.on_success(0.1)
+    assert s.rate == 1.2 and s.slow_start
+    s.slow_start = False
+    for _ in range(4):
+        s.on_success(0.1)
+    assert 1.5 < s.rate < 1.6
+    s.on_failure(Throttled("http_429", retry_after=0), attempt=1)
+    assert 1.05 < s.rate < 1.06
+    # Responses still in flight were sent at the old rate, so they do not cut it again
+    s.on_success(5.0)
+    assert 1.05 < s.rate < 1.06
+    s._cut_at = 0
+    s.on_success(5.0)
+    assert 0.73 < s.rate < 0.74
+    s.latency = 5.0
+    assert s.concurrency(8) == 4 and s.concurrency(2) == 2
+
+
+def test_only_the_failed_request_is_retried():
+    calls = []
+
+    async def page(n):
+        calls.append(n)
+        if n == 2 and calls.count(2) == 1:
+            raise Throttled("captcha", retry_after=0.05)
+        return n
+
+    async def scenario():
+        s = SourceScheduler("test", rate=100, max_rate=100)
+        started = time.monotonic()
+        pages = [await s.call(page, n) for n in (1, 2, 3)]
+        return pages, time.monotonic() - started, s.stats
+
+    pages, elapsed, stats = run(scenario())
+    assert pages == [1, 2, 3] and calls == [1, 2, 2, 3]
+    assert elapsed >= 0.05 and stats["retried"] == 1 and stats["throttled"] == 1
+
+
+def test_breaker_opens_and_recovers():
+    async def fail():
+        raise Throttled("http_503", retry_after=0)
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        s = SourceScheduler("test", rate=100, max_rate=100, max_attempts=2,
+                            breaker=CircuitBreaker(threshold=3, cooldown=0.05))
+        with pytest.raises(Throttled):
+            await s.call(fail)
+        with pytest.raises(SourceUnavailable):
+            await s.call(fail)
+        with pytest.raises(SourceUnavailable):
+            await s.call(ok)
+        await asyncio.sleep(0.06)
+        return s, await s.call(ok)
+
+    s, result = run(scenario())
+    assert result == "ok" and s.breaker.state == "closed" and s.stats["rejected"] == 2
+
+
+def test_retry_after_header():
+    assert retry_after("7") == 7.0
+    assert retry_after(None) is None and retry_after("soon") is None
+    assert retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_avito_429_is_retried(monkeypatch):
+    statuses = [429, 200]
+
+    async def get(url):
+        return httpx.Response(statuses.pop(0), headers={"retry-after": "0"}, text="<html></html>",
+                              request=httpx.Request("GET", url))
+
+    monkeypatch.setattr(avito.http_clients, "get", get)
+    scheduler = SourceScheduler("avito-test", rate=100, max_rate=100)
+    assert run(avito.AvitoParser(backend="lxml", scheduler=scheduler).fetch_items("moskva")) == []
+    assert scheduler.stats == {"requests": 2, "retried": 1, "throttled": 1, "errors": 0, "rejected": 0}
+
+
+def test_cancelled_probe_is_released():
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        s = SourceScheduler("test", rate=100, max_rate=100, breaker=CircuitBreaker(threshold=1, cooldown=0))
+        s.breaker.failure()
+        # The half-open probe is cancelled by a caller's timeout, as fan_out's wait_for does
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(s.call(slow), 0.05)
+        return s.breaker.state, await s.call(ok), s.breaker.state
+
+    assert run(scenario()) == ("half_open", "ok", "closed")
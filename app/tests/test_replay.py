@@ -0,0 +1,41 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+from app.parsers.http_client import HttpClientPool
+from app.utils.replay import Cassette, CassetteTransport
+
+PAGE = "<html><body>Квартира</body></html>"
+
+
+def origin(request):
+    return httpx.Response(200, headers={"content-type": "text/html", "content-encoding": "gzip"},
+                          content=gzip.compress(PAGE.encode()))
+
+
+def test_key_ignores_param_order_and_cache_busters():
+    assert Cassette.key("get", "https://x.ru/a?b=2&a=1&_=123") == Cassette.key("GET", "https://x.ru/a?a=1&b=2")
+
+
+def test_record_then_replay_offline(tmp_path):
+    async def scenario():
+        recorder = CassetteTransport(Cassette(str(tmp_path), "record"), httpx.MockTransport(origin))
+        async with httpx.AsyncClient(transport=recorder) as client:
+            assert (await client.get("https://www.avito.ru/moskva?ts=1")).text == PAGE
+
+        pool = HttpClientPool(proxies=[], cassette=Cassette(str(tmp_path), "replay"))
+        try:
+            replayed = await pool.get("https://www.avito.ru/moskva?ts=2")
+            with pytest.raises(httpx.ConnectError):
+                await pool.get("https://www.avito.ru/spb")
+        finally:
+            await pool.close()
+        return replayed, pool.cassette.stats
+
+    response, stats = asyncio.run(scenario())
+    assert response.text == PAGE
+    assert "content-encoding" not in response.headers
+    assert stats == {"hits": 1, "misses": 1, "recorded": 0}
+    assert list(tmp_path.glob("*.html"))[0].read_text(encoding="utf-8") == PAGE
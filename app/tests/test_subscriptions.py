@@ -0,0 +1,50 @@
+import random
+
+from app.services.subscriptions import Subscription, SubscriptionIndex, accepts, union_filters
+from scripts.fixtures import random_listing, random_profile
+
+BASE = {
+    "ttk_districts": {"cao": ["Арбат", "Тверской", "Хамовники"], "partial": ["Беговой", "Донской"]},
+    "area_range": {"min": 38, "max": 150},
+    "price_max": 100000000,
+    "floor": {"not_first": True, "not_last": True},
+    "parse_interval_minutes": 30,
+}
+def test_index_matches_brute_force():
+    rnd = random.Random(3)
+    subs = [Subscription(chat_id, random_profile(rnd), True) for chat_id in range(300)]
+    index = SubscriptionIndex(subs)
+    for _ in range(500):
+        listing = random_listing(rnd)
+        expected = [s.chat_id for s in subs if accepts(s.filters, listing)]
+        assert sorted(index.match(listing)) == expected
+
+
+def test_candidates_prune_by_price_and_area():
+    subs = [Subscription(1, {"price_max": 20e6, "area_range": {"min": 38, "max": 60}}),
+            Subscription(2, {"price_max": 80e6, "area_range": {"min": 100}})]
+    index = SubscriptionIndex(subs)
+    assert index.candidates({"price": 15e6, "area": 45}) == 0b01
+    assert index.candidates({"price": 60e6, "area": 120}) == 0b10
+    assert index.candidates({"price": 90e6, "area": 120}) == 0
+    assert index.match({"price": 15e6, "area": 0}) == [1, 2]
+
+
+def test_union_covers_every_profile():
+    subs = [Subscription(1, {"area_range": {"min": 50, "max": 90}, "price_max": 40e6, "districts": ["Арбат"],
+                             "floor": {"not_first": True}}),
+            Subscription(2, {"area_range": {"min": 38, "max": 150}, "price_max": 100e6, "districts": ["Донской"],
+                             "floor": {"not_first": True, "not_last": True}})]
+    merged = union_filters(BASE, subs)
+    assert merged["area_range"] == {"min": 38, "max": 150}
+    assert merged["price_max"] == 100e6
+    assert merged["floor"] == {"not_first": True, "not_last": False}
+    assert merged["ttk_districts"] == {"cao": ["Арбат"], "partial": ["Донской"]}
+    assert merged["parse_interval_minutes"] == 30
+
+    subs.append(Subscription(3, {"area_range": {"min": 30}}))
+    merged = union_filters(BASE, subs)
+    assert merged["area_range"] == {"min": 30}
+    assert merged["price_max"] is None
+    assert merged["ttk_districts"] == BASE["ttk_districts"]
+    assert union_filters(BASE, []) is BASE
@@ -0,0 +1,82 @@
+import asyncio
+
+import fakeredis
+from fakeredis import aioredis
+
+from app.core.config import settings
+from app.services.events import listing_events
+from app.tasks import celery as tasks
+
+
+def test_source_slot_is_shared_across_workers(monkeypatch):
+    monkeypatch.setitem(settings.SOURCE_RATE_LIMITS, "avito", "2/m")
+
+    async def scenario():
+        # Two workers, one Redis: the budget is global, not per worker
+        server = fakeredis.FakeServer()
+        a, b = aioredis.FakeRedis(server=server), aioredis.FakeRedis(server=server)
+        return [await tasks.source_slot("avito", a), await tasks.source_slot("avito", b),
+                await tasks.source_slot("avito", a)]
+
+    first, second, third = asyncio.run(scenario())
+    assert first == second == 0.0
+    assert 0 < third <= 60
+
+
+def test_inline_cycle_runs_on_the_callers_loop(monkeypatch):
+    calls = []
+
+    async def crawl_filters():
+        return {"sources": ["cian", "avito"], "location": "Moscow"}
+
+    async def scrape_chunk(source, city, chunk, full_recrawl):
+        calls.append((source, city, full_recrawl, asyncio.get_running_loop()))
+        return 0
+
+    monkeypatch.setattr(tasks, "crawl_filters", crawl_filters)
+    monkeypatch.setattr(tasks, "scrape_chunk", scrape_chunk)
+    monkeypatch.setattr(settings, "SCRAPE_DISTRICT_CHUNK", 1000)
+
+    async def scenario():
+        monkeypatch.setattr(listing_events, "_client", aioredis.FakeRedis(decode_responses=True))
+        jobs = await tasks.start_cycle(force=True, full_recrawl=True, inline=True)
+        return jobs, asyncio.get_running_loop()
+
+    jobs, loop = asyncio.run(scenario())
+    # Avito's daily rentals stay out of the cycle
+    assert jobs == 1 and calls == [("cian", "Moscow", True, loop)]
+
+
+def test_scrape_chunk_feeds_the_index(monkeypatch):
+    from app.db import elastic
+    from app.services.dedup import DedupService, MemorySeenStore
+    from app.services.history import PriceHistory
+
+    indexed = []
+
+    async def scrape(city, district_ids, full_recrawl):
+        return [{"source": "cian", "external_id": "1", "title": "t", "price": 100.0},
+                {"source": "cian", "external_id": "2", "title": "t", "price": 200.0}], False
+
+    async def async_bulk(client, actions, **kwargs):
+        indexed.extend(a["_id"] for a in actions)
+        return len(actions), []
+
+    async def ensure_index():
+        pass
+
+    monkeypatch.setitem(tasks.SCRAPERS, "cian", scrape)
+    monkeypatch.setattr(tasks, "seen_listings", DedupService(MemorySeenStore()))
+    monkeypatch.setattr(tasks, "price_history", PriceHistory(":memory:"))
+    monkeypatch.setattr(elastic, "async_bulk", async_bulk)
+    monkeypatch.setattr(elastic, "ensure_index", ensure_index)
+    monkeypatch.setattr(elastic, "_index_ready", False)
+    monkeypatch.setattr(elastic, "bulk_indexer", elastic.BulkIndexer(client=None))
+
+    async def scenario():
+        monkeypatch.setattr(listing_events, "_client", aioredis.FakeRedis(decode_responses=True))
+        # The second run changes nothing, so nothing is published or re-indexed
+        return [await tasks.scrape_chunk("cian", "Moscow"), await tasks.scrape_chunk("cian", "Moscow")]
+
+    assert asyncio.run(scenario()) == [2, 0]
+    assert indexed == ["1", "2"]
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+from app.telegram_bot.dispatcher import MESSAGE_LIMIT, NotificationDispatcher, TokenBucket
+
+
+class RetryAfter(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Flood control exceeded, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class FakeBot:
+    def __init__(self, flood_on=()):
+        self.sent = []
+        self.flood_on = set(flood_on)
+
+    async def send_message(self, chat_id, text):
+        n = len(self.sent)
+        if n in self.flood_on:
+            self.flood_on.discard(n)
+            raise RetryAfter(0.05)
+        self.sent.append((chat_id, text, time.monotonic()))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_token_bucket_spaces_acquisitions():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=1)
+        started = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    assert run(scenario()) >= 5 / 50 * 0.9
+
+
+def test_fan_out_to_subscribers_and_per_chat_limit():
+    async def scenario():
+        bot = FakeBot()
+        d = NotificationDispatcher(bot, global_rate=1000, chat_rate=40, digest_size=0)
+        d.subscribe(1)
+        d.subscribe(2)
+        for i in range(5):
+            d.publish(f"listing {i}")
+        await d.join()
+        await d.close()
+        return bot, d
+
+    bot, d = run(scenario())
+    for chat in (1, 2):
+        sent = [(text, ts) for chat_id, text, ts in bot.sent if chat_id == chat]
+        assert [text for text, _ in sent] == [f"listing {i}" for i in range(5)]
+        assert sent[-1][1] - sent[0][1] >= 4 / 40 * 0.9
+    assert d.stats["messages"] == 10
+
+
+def test_retry_after_pauses_and_resends():
+    async def scenario():
+        bot = FakeBot(flood_on={1})
+        d = NotificationDispatcher(bot, global_rate=1000, chat_rate=1000, digest_size=0)
+        for i in range(3):
+            d.enqueue(7, f"m{i}")
+        await d.join()
+        await d.close()
+        return bot, d
+
+    bot, d = run(scenario())
+    assert [text for _, text, _ in bot.sent] == ["m0", "m1", "m2"]
+    assert bot.sent[1][2] - bot.sent[0][2] >= 0.05 * 0.9
+    assert d.stats == {"queued": 3, "delivered": 3, "messages": 3, "retried": 1, "dropped": 0}
+
+
+def test_digest_groups_queued_listings():
+    async def scenario():
+        bot = FakeBot()
+        d = NotificationDispatcher(bot, global_rate=1000, chat_rate=1000, digest_size=4, digest_window=0.05)
+        for i in range(10):
+            d.enqueue(3, f"listing {i}")
+        await d.join()
+        await d.close()
+        return bot
+
+    texts = [text for _, text, _ in run(scenario()).sent]
+    assert len(texts) == 3
+    assert texts[0].startswith("<b>Novyh obyavleniy: 4</b>")
+    assert "listing 9" in texts[2]
+
+
+def test_digest_respects_message_limit():
+    texts = NotificationDispatcher._compose(["x" * 1500] * 5)
+    assert len(texts) == 3
+    assert all(len(t) <= MESSAGE_LIMIT for t in texts)
+
+
+def test_queue_depth_is_one_series_over_all_chats():
+    from app.utils.metrics import TELEGRAM_QUEUE_DEPTH
+
+    def samples():
+        return [sample for metric in TELEGRAM_QUEUE_DEPTH.collect() for sample in metric.samples]
+
+    async def scenario():
+        d = NotificationDispatcher(FakeBot(), global_rate=1000, chat_rate=1000, digest_size=3, digest_window=0.01)
+        [before] = samples()
+        d.publish("listing", chats=range(20))
+        queued = samples()[0].value - before.value
+        await d.join()
+        await d.close()
+        return before.labels, queued, samples()[0].value - before.value
+
+    # No per-chat label, however many chats have a queue
+    assert run(scenario()) == ({}, 20, 0)
@@ -0,0 +1,28 @@
+from collections import OrderedDict
+from typing import Any, Optional
+
+# Sent by the HTTP clients and the browser contexts alike
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+class LocalLRU:
+    """In-process LRU map with a fixed number of entries"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, Any] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: Any):
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
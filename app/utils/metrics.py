@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+from functools import wraps
+from typing import Any, Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess, start_http_server
+
+# Celery prefork children write to this directory; the exporter in the parent aggregates it
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "rentscout_stage_seconds", "Time spent in a pipeline stage (page fetch, extract, parse, search...)",
+    ["source", "stage"], buckets=STAGE_BUCKETS,
+)
+# rate(rentscout_cards_parsed_total[5m]) is the cards/sec throughput
+CARDS_PARSED = Counter("rentscout_cards_parsed_total", "Listing cards parsed successfully", ["source"])
+PARSE_FAILURES = Counter(
+    "rentscout_parse_failures_total", "Cards or pages that could not be parsed", ["source", "stage", "error"],
+)
+BROWSER_LAUNCH_SECONDS = Histogram(
+    "rentscout_browser_launch_seconds", "Chromium launch time", buckets=(0.25, 0.5, 1, 2, 4, 8, 16),
+)
+# Hit ratio, which a per-process gauge could not report under multiprocess mode:
+#   sum by (cache) (rate(rentscout_cache_events_total{event=~".*_hits"}[5m]))
+#   / sum by (cache) (rate(rentscout_cache_events_total{event=~".*_hits|misses"}[5m]))
+CACHE_EVENTS = Counter(
+    "rentscout_cache_events_total", "Response cache lookups by outcome", ["cache", "event"],
+)
+ES_BULK_SECONDS = Histogram(
+    "rentscout_es_bulk_seconds", "Latency of one Elasticsearch bulk round", buckets=STAGE_BUCKETS,
+)
+ES_DOCUMENTS = Counter("rentscout_es_documents_total", "Documents sent to Elasticsearch by outcome", ["result"])
+# Total over all chats: a per-chat label would add a series for every subscriber
+TELEGRAM_QUEUE_DEPTH = Gauge(
+    "rentscout_telegram_queue_depth", "Listing events waiting to be sent, over all chats",
+    multiprocess_mode="livesum",
+)
+# Adaptive politeness (app/parsers/politeness.py); summed over Celery children, each paces its own requests
+SOURCE_RATE = Gauge(
+    "rentscout_source_rate", "Current adaptive request rate per source, requests/sec", ["source"],
+    multiprocess_mode="livesum",
+)
+SOURCE_CIRCUIT_OPEN = Gauge(
+    "rentscout_source_circuit_open", "1 while a source's circuit breaker is open", ["source"],
+    multiprocess_mode="livemax",
+)
+SOURCE_THROTTLED = Counter(
+    "rentscout_source_throttled_total", "Requests a source pushed back on (429, captcha...)", ["source", "reason"],
+)
+
+
+class timed:
+    """Observe the duration of a block or a call in a histogram.
+
+        with timed("cian", "fetch"): ...
+        async with timed("cian", "fetch"): ...
+
+        @timed("avito", "parse")
+        async def parse(...): ...
+    """
+
+    def __init__(self, source: str, stage: str, histogram: Histogram = STAGE_SECONDS):
+        self.metric = histogram.labels(source=source, stage=stage)
+        self.elapsed = 0.0
+        self._started = 0.0
+
+    def __enter__(self) -> "timed":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any):
+        self.elapsed = time.perf_counter() - self._started
+        self.metric.observe(self.elapsed)
+
+    async def __aenter__(self) -> "timed":
+        return self.__enter__()
+
+    async def __aexit__(self, *exc: Any):
+        self.__exit__(*exc)
+
+    def __call__(self, func):
+        metric = self.metric
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    metric.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - started)
+        return wrapper
+
+
+def parse_failed(source: str, stage: str, error: BaseException):
+    PARSE_FAILURES.labels(source=source, stage=stage, error=type(error).__name__).inc()
+
+
+def serve_metrics(port: int, registry: Optional[CollectorRegistry] = None):
+    """Expose /metrics over HTTP for processes without a web app (Celery worker, bot)"""
+    if registry is None and MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, registry=registry or REGISTRY)
+
+
+def instrument_app(app: Any):
+    """Request metrics plus everything above on the FastAPI app's /metrics"""
+    from prometheus_fastapi_instrumentator import Instrumentator
+    Instrumentator().instrument(app).expose(app)
+    return app
@@ -0,0 +1,43 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+from app.utils.logger import logger
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    if settings.PARSE_WORKERS <= 0:
+        return None
+    # Celery prefork children are daemonic and may not start processes of their own
+    if multiprocessing.current_process().daemon:
+        return None
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.PARSE_WORKERS)
+        logger.info(f"[ProcessPool] Started {settings.PARSE_WORKERS} parse workers")
+    return _executor
+
+
+async def run_cpu_bound(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Run ``func`` in the parse process pool, or in a thread where a pool is unavailable.
+
+    ``func`` and its arguments must be picklable (module-level function,
+    plain data), and the result should be compact since it is pickled back.
+    """
+    call = partial(func, *args, **kwargs)
+    executor = _get_executor()
+    if executor is None:
+        return await asyncio.to_thread(call)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
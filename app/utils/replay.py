@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Any, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+from app.core.config import settings
+from app.utils.logger import logger
+
+# Cache busters and trackers that change between otherwise identical requests
+VOLATILE_PARAMS = frozenset({"_", "ts", "timestamp", "rnd", "utm_source", "utm_medium", "utm_campaign"})
+# What the parsers actually read; scripts and styles are not recorded and are aborted on replay
+RECORDED_RESOURCE_TYPES = frozenset({"document", "xhr", "fetch"})
+# The stored body is already decoded, so these would describe the wrong bytes
+DROPPED_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding", "set-cookie"})
+
+
+def _headers(headers: Any) -> dict:
+    return {k.lower(): v for k, v in dict(headers).items() if k.lower() not in DROPPED_HEADERS}
+
+
+class Cassette:
+    """Recorded responses on disk: ``index.json`` plus one raw body file per URL.
+
+    Bodies stay as plain HTML/JSON files so a recording can be inspected and
+    edited by hand. Keys are the method plus the URL with volatile
+    parameters dropped and the rest sorted.
+    """
+
+    def __init__(self, path: str, mode: str = "replay"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        self.entries: dict[str, dict] = {}
+        index = os.path.join(path, "index.json")
+        if os.path.exists(index):
+            with open(index, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        elif mode == "replay":
+            logger.warning(f"[Replay] No recordings in {path}, every request will miss")
+
+    @staticmethod
+    def key(method: str, url: str) -> str:
+        parts = urlsplit(str(url))
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        query = sorted((k, v) for k, v in params if k not in VOLATILE_PARAMS)
+        return f"{method.upper()} {urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))}"
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def urls(self, host: Optional[str] = None) -> list[str]:
+        return [e["url"] for e in self.entries.values() if not host or host in urlsplit(e["url"]).netloc]
+
+    def get(self, method: str, url: str) -> Optional[tuple[int, dict, bytes]]:
+        entry = self.entries.get(self.key(method, url))
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        with open(os.path.join(self.path, entry["body"]), "rb") as f:
+            return entry["status"], entry["headers"], f.read()
+
+    def put(self, method: str, url: str, status: int, headers: Any, body: bytes):
+        # A 304 only means "same as before"; keep the full response it refers to
+        if status == 304:
+            return
+        key = self.key(method, url)
+        content_type = dict(headers).get("content-type", "")
+        ext = ".json" if "json" in content_type else ".html"
+        name = hashlib.sha1(key.encode()).hexdigest()[:16] + ext
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, name), "wb") as f:
+            f.write(body)
+        self.entries[key] = {"url": str(url), "status": status, "headers": _headers(headers), "body": name}
+        self.stats["recorded"] += 1
+        # Written on every put so an interrupted recording is still usable
+        with open(os.path.join(self.path, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1)
+
+    async def route(self, route: Any):
+        """Playwright route handler: ``await context.route("**/*", cassette.route)``"""
+        from app.parsers.otello.session_manager import block_heavy_requests
+
+        request = route.request
+        if self.mode == "record":
+            if request.resource_type not in RECORDED_RESOURCE_TYPES:
+                return await block_heavy_requests(route)
+            response = await route.fetch()
+            body = await response.body()
+            self.put(request.method, request.url, response.status, response.headers, body)
+            return await route.fulfill(response=response, body=body)
+        hit = self.get(request.method, request.url) if request.resource_type in RECORDED_RESOURCE_TYPES else None
+        if hit is None:
+            # Replays never touch the network
+            return await route.abort()
+        status, headers, body = hit
+        await route.fulfill(status=status, headers=headers, body=body)
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records through ``transport`` or answers from the cassette"""
+
+    def __init__(self, cassette: Cassette, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.cassette.mode == "replay":
+            hit = self.cassette.get(request.method, str(request.url))
+            if hit is None:
+                raise httpx.ConnectError(f"Not recorded: {request.method} {request.url}", request=request)
+            status, headers, body = hit
+            return httpx.Response(status, headers=headers, content=body, request=request)
+        if self.transport is None:
+            self.transport = httpx.AsyncHTTPTransport()
+        response = await self.transport.handle_async_request(request)
+        body = await response.aread()
+        await response.aclose()
+        self.cassette.put(request.method, str(request.url), response.status_code, response.headers, body)
+        return httpx.Response(response.status_code, headers=_headers(response.headers), content=body,
+                              request=request)
+
+    async def aclose(self):
+        if self.transport is not None:
+            await self.transport.aclose()
+
+
+@lru_cache(maxsize=None)
+def active_cassette() -> Optional[Cassette]:
+    """The cassette selected by REPLAY_MODE / REPLAY_DIR, shared by the browser pool and HTTP clients"""
+    if not settings.REPLAY_MODE:
+        return None
+    logger.info(f"[Replay] {settings.REPLAY_MODE} mode, cassette {settings.REPLAY_DIR}")
+    return Cassette(settings.REPLAY_DIR, settings.REPLAY_MODE)
+
+
+def replay_route() -> Optional[Any]:
+    cassette = active_cassette()
+    return cassette.route if cassette else None
@@ -0,0 +1,91 @@
+"""BeautifulSoup vs lxml vs selectolax on an Avito-like result page, and event-loop stall.
+
+    python -m scripts.bench_avito_parse [items_per_page] [pages]
+    python -m scripts.bench_avito_parse saved_page.html [...]
+
+Without saved pages a synthetic page with ``items_per_page`` items is used.
+selectolax is optional and skipped when not installed. The second half
+parses ``pages`` pages (or the saved ones) concurrently while a ticker
+measures how late the event loop gets: inline parsing blocks it, the
+process pool does not.
+"""
+import asyncio
+import sys
+import time
+from typing import Optional
+
+from app.parsers.avito.parser import BACKENDS, HTMLParser, parse_html
+from app.utils import process_pool
+from scripts.fixtures import avito_page as page
+
+
+def bench_backends(html: str, n: Optional[int] = None, rounds: int = 5):
+    """``n`` is the expected item count; saved pages are instead checked for agreement between backends"""
+    print(f"{'backend':<12}{'ms/page':>10}{'items':>8}")
+    for name, parse in BACKENDS.items():
+        if name == "selectolax" and HTMLParser is None:
+            print(f"{name:<12}{'skipped (pip install selectolax)':>40}")
+            continue
+        started = time.perf_counter()
+        for _ in range(rounds):
+            items, errors = parse(html)
+        elapsed = (time.perf_counter() - started) / rounds
+        if n is None:
+            n = len(items)
+        assert len(items) == n and not errors, (name, len(items), errors)
+        print(f"{name:<12}{elapsed * 1000:>10.1f}{len(items):>8}")
+
+
+async def stall(pages: list[str], offload: bool, backend: str) -> tuple[float, float]:
+    """Wall time and worst event-loop lag while all pages are parsed"""
+    lag, done = 0.0, False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            before = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - before - 0.005)
+
+    async def parse(html: str):
+        if offload:
+            return await process_pool.run_cpu_bound(parse_html, html, backend)
+        await asyncio.sleep(0)
+        return parse_html(html, backend)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await asyncio.gather(*(parse(html) for html in pages))
+    elapsed = time.perf_counter() - started
+    done = True
+    await tick
+    return elapsed, lag
+
+
+def main(args: list[str]):
+    paths = [a for a in args if not a.isdigit()]
+    if paths:
+        batch = [open(p, encoding="utf-8").read() for p in paths]
+        for path, html in zip(paths, batch):
+            print(f"\n{path}, {len(html) / 1024:.0f} KiB")
+            bench_backends(html)
+    else:
+        n = int(args[0]) if args else 50
+        pages = int(args[1]) if len(args) > 1 else 16
+        html = page(n)
+        print(f"{n} items, {len(html) / 1024:.0f} KiB per page")
+        bench_backends(html, n)
+        batch = [html] * pages
+
+    backend = "selectolax" if HTMLParser is not None else "lxml"
+    print(f"\n{len(batch)} pages with {backend}")
+    for offload in (False, True):
+        elapsed, lag = asyncio.run(stall(batch, offload, backend))
+        label = "process pool" if offload else "inline"
+        print(f"{label:<14}{elapsed * 1000:>8.0f} ms total  {lag * 1000:>6.1f} ms max loop lag")
+    process_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,67 @@
+"""Per-page Cian card extraction: one evaluate() vs per-field element handles.
+
+    python -m scripts.bench_cian_extract [saved_page.html ...]
+
+Without arguments a synthetic 28-card page with Cian's markup is used.
+"""
+import asyncio
+import random
+import sys
+import time
+
+from app.parsers.cian.listing_parser import CianParser
+from app.parsers.otello.session_manager import BrowserPool
+
+ROUNDS = 5
+
+CARD_HTML = """
+<article data-name="CardComponent">
+  <a href="https://www.cian.ru/sale/flat/{id}/"><span data-name="TitleComponent">{rooms}-комн. кв., {area} м², {floor}/{total} этаж</span></a>
+  <div data-name="GeoLabel">Москва, ЦАО, р-н {district}, ул. Тестовая, {house}</div>
+  <span data-name="Price">{price} ₽</span>
+  <img src="data:," /><p>{filler}</p>
+</article>
+"""
+
+
+def synthetic_page(cards: int = 28) -> str:
+    rnd = random.Random(42)
+    districts = ["Арбат", "Хамовники", "Тверской", "Басманный", "Якиманка"]
+    body = "".join(
+        CARD_HTML.format(
+            id=300000000 + i, rooms=rnd.randint(1, 4), area=rnd.randint(38, 150),
+            floor=rnd.randint(2, 9), total=rnd.randint(10, 20), district=rnd.choice(districts),
+            house=rnd.randint(1, 90), price=f"{rnd.randint(15, 99)} 500 000", filler="x" * 400,
+        )
+        for i in range(cards)
+    )
+    return f"<html><body>{body}</body></html>"
+
+
+async def time_mode(parser: CianParser, page, batch: bool) -> tuple[float, int]:
+    parser.batch_extract = batch
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        listings = await parser._parse_page(page)
+    return (time.perf_counter() - started) / ROUNDS, len(listings)
+
+
+async def main(paths: list[str]):
+    pages = [open(p, encoding="utf-8").read() for p in paths] or [synthetic_page()]
+    pool = BrowserPool(max_contexts=1)
+    parser = CianParser("config/steinik_filters.json", pool=pool)
+    try:
+        async with pool.page() as page:
+            for i, html in enumerate(pages):
+                await page.set_content(html)
+                per_card, n1 = await time_mode(parser, page, batch=False)
+                batched, n2 = await time_mode(parser, page, batch=True)
+                name = paths[i] if paths else "synthetic"
+                print(f"{name}: per-card {per_card * 1000:.1f} ms ({n1} listings), "
+                      f"batched {batched * 1000:.1f} ms ({n2} listings), x{per_card / batched:.1f}")
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
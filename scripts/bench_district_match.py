@@ -0,0 +1,74 @@
+"""Legacy per-call substring scans vs the compiled DistrictMatcher.
+
+    python -m scripts.bench_district_match [n_addresses]
+"""
+import json
+import random
+import sys
+import time
+
+from app.parsers.cian.geo_utils import TTK_DISTRICT_NAMES, DistrictMatcher, matcher_from_filters
+
+OTHER_DISTRICTS = ["Митино", "Бутово", "Марьино", "Раменки", "Строгино", "Куркино", "Люблино", "Отрадное"]
+STREETS = ["ул. Тверская", "Ленинский пр-т", "ул. Арбат", "Кутузовский пр-т", "ул. Профсоюзная", "пер. Сивцев Вражек"]
+
+
+def corpus(n: int, unique: int) -> list[str]:
+    rnd = random.Random(7)
+    districts = TTK_DISTRICT_NAMES + OTHER_DISTRICTS * 3
+    base = [
+        f"Москва, {rnd.choice(['ЦАО', 'ЗАО', 'САО', 'ЮАО'])}, р-н {rnd.choice(districts)}, "
+        f"{rnd.choice(STREETS)}, {rnd.randint(1, 120)}к{rnd.randint(1, 5)}"
+        for _ in range(unique)
+    ]
+    return [rnd.choice(base) for _ in range(n)]
+
+
+def legacy_is_in_ttk(filters: dict, address: str) -> bool:
+    ttk = filters.get("ttk_districts", {})
+    ttk_districts = ttk.get("cao", []) + ttk.get("partial", [])
+    addr_lower = address.lower()
+    for d in ttk_districts:
+        if d.lower() in addr_lower:
+            return True
+    return "цао" in addr_lower or "центральный" in addr_lower
+
+
+def legacy_extract(address: str):
+    for district in TTK_DISTRICT_NAMES:
+        if district.lower() in address.lower():
+            return district
+    return None
+
+
+def timed(label: str, fn, addresses: list[str]) -> float:
+    started = time.perf_counter()
+    for a in addresses:
+        fn(a)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed * 1000:8.1f} ms  ({len(addresses) / elapsed / 1e6:.2f} M addr/s)")
+    return elapsed
+
+
+def main(n: int):
+    with open("config/steinik_filters.json", encoding="utf-8") as f:
+        filters = json.load(f)
+    addresses = corpus(n, unique=n // 10)
+    print(f"{n} addresses, {len(set(addresses))} unique")
+
+    legacy = timed("legacy (ttk + extract)", lambda a: (legacy_is_in_ttk(filters, a), legacy_extract(a)), addresses)
+
+    ttk = filters["ttk_districts"]["cao"] + filters["ttk_districts"]["partial"]
+    uncached = DistrictMatcher(ttk, cache_size=0)
+    timed("matcher, no cache", lambda a: (uncached.is_in_ttk(a), uncached.district_name(a)), addresses)
+
+    matcher = matcher_from_filters(filters)
+    cached = timed("matcher, memoized", lambda a: (matcher.is_in_ttk(a), matcher.district_name(a)), addresses)
+    print(f"speedup vs legacy: x{legacy / cached:.1f}")
+
+    mismatches = sum(legacy_is_in_ttk(filters, a) != matcher.is_in_ttk(a) for a in set(addresses))
+    print(f"is_in_ttk disagreements with legacy: {mismatches}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,111 @@
+"""Per-document es.index vs BulkIndexer against a local stub Elasticsearch.
+
+    python -m scripts.bench_es_bulk [n_docs]
+
+The stub accepts _bulk and per-document PUT/POST, adds a fixed per-request
+latency and rejects ~2% of bulk items with 429 to exercise item retries.
+"""
+import asyncio
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from elasticsearch import AsyncElasticsearch
+
+from app.db.elastic import BulkIndexer
+
+LATENCY = 0.002
+REJECT_RATE = 0.02
+
+
+class StubES(BaseHTTPRequestHandler):
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: dict):
+        raw = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _handle(self):
+        StubES.requests += 1
+        time.sleep(LATENCY)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.split("?")[0].endswith("/_bulk"):
+            lines = [json.loads(l) for l in body.splitlines() if l.strip()]
+            items = []
+            for meta in lines[::2]:
+                op, info = next(iter(meta.items()))
+                status = 429 if random.random() < REJECT_RATE else 201
+                item = {"_index": info.get("_index"), "_id": info.get("_id"), "status": status}
+                if status == 429:
+                    item["error"] = {"type": "es_rejected_execution_exception"}
+                items.append({op: item})
+            return self._reply({"took": 1, "errors": any("error" in next(iter(i.values())) for i in items), "items": items})
+        return self._reply({"result": "created", "acknowledged": True, "_id": self.path.rsplit("/", 1)[-1]})
+
+    do_POST = do_PUT = do_GET = _handle
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.end_headers()
+
+
+def docs(n: int) -> list[dict]:
+    return [
+        {"source": "cian", "external_id": str(i), "title": f"2-комн. кв., {40 + i % 60} м²",
+         "price": 20_000_000 + i, "rooms": 2, "area": 40 + i % 60,
+         "location": {"lat": 55.75, "lon": 37.61}, "photos": []}
+        for i in range(n)
+    ]
+
+
+async def main(n: int):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubES)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = AsyncElasticsearch(f"http://127.0.0.1:{server.server_port}")
+    batch = docs(n)
+    try:
+        StubES.requests = 0
+        started = time.perf_counter()
+        for doc in batch:
+            await client.index(index="properties", body=doc, id=doc["external_id"])
+        single = time.perf_counter() - started
+        single_requests = StubES.requests
+
+        indexer = BulkIndexer(client, max_docs=500, retry_backoff=0.05)
+        StubES.requests = 0
+        started = time.perf_counter()
+        async with indexer.bulk_load():
+            await indexer.add_many(batch)
+        bulk = time.perf_counter() - started
+        bulk_requests = StubES.requests
+        bulk_stats = dict(indexer.stats)
+
+        started = time.perf_counter()
+        await indexer.add_many(batch)
+        await indexer.flush()
+        unchanged = time.perf_counter() - started
+
+        print(f"per-document: {single:.2f}s, {single_requests} requests, {n / single:.0f} docs/s")
+        print(f"bulk:         {bulk:.2f}s, {bulk_requests} requests, {n / bulk:.0f} docs/s, stats={bulk_stats}")
+        print(f"re-run, unchanged docs skipped: {unchanged:.2f}s")
+    finally:
+        await client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    logging.getLogger("elastic_transport").setLevel(logging.WARNING)
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,78 @@
+"""Full sort of pydantic objects vs the columnar filter/rank engine.
+
+    python -m scripts.bench_filter [n_listings]
+"""
+import json
+import random
+import sys
+import time
+
+from app.parsers.cian.listing_parser import CianListing
+from app.services.filter import ListingFrame
+
+DISTRICTS = ["Арбат", "Хамовники", "Тверской", "Басманный", "Якиманка", None]
+RENOVATION = ["евроремонт", "дизайнерский", "косметический", "без ремонта", None]
+SELLERS = ["собственник", "агентство", "застройщик", None]
+
+
+def listings(n: int) -> list[CianListing]:
+    rnd = random.Random(1)
+    out = []
+    for i in range(n):
+        area = rnd.uniform(20, 200)
+        total = rnd.randint(5, 25)
+        price = rnd.uniform(5e6, 2e8)
+        out.append(CianListing(
+            external_id=str(i), title="", address="", district=rnd.choice(DISTRICTS), area=area,
+            floor=rnd.randint(1, total), total_floors=total, rooms=rnd.randint(1, 5), price=price,
+            price_per_m2=price / area, renovation=rnd.choice(RENOVATION), seller_type=rnd.choice(SELLERS),
+            link=f"https://www.cian.ru/sale/flat/{i}/",
+        ))
+    return out
+
+
+def legacy(items: list, filters: dict) -> list:
+    area, floor = filters["area_range"], filters["floor"]
+    kept = [
+        p for p in items
+        if p.price > 0 and p.price <= filters["price_max"] and area["min"] <= p.area <= area["max"]
+        and not (floor["not_first"] and p.floor == 1)
+        and not (floor["not_last"] and p.floor == p.total_floors)
+        and (p.renovation is None or any(r in p.renovation for r in filters["renovation"]))
+        and (p.seller_type is None or p.seller_type in filters["seller_type"])
+    ]
+    return sorted(kept, key=lambda x: x.price)[:1000]
+
+
+def main(n: int):
+    with open("config/steinik_filters.json", encoding="utf-8") as f:
+        filters = json.load(f)
+    items = listings(n)
+
+    started = time.perf_counter()
+    expected = legacy(items, filters)
+    legacy_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    frame = ListingFrame(items)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = frame.select(filters, top_k=1000)
+    select_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    frame.select(filters, top_k=1000, by="score")
+    score_time = time.perf_counter() - started
+
+    print(f"{n} listings")
+    print(f"legacy filter + full sort:   {legacy_time * 1000:8.1f} ms")
+    print(f"frame build (once):          {build_time * 1000:8.1f} ms")
+    print(f"vectorized mask + top-k:     {select_time * 1000:8.1f} ms")
+    print(f"vectorized mask + score top: {score_time * 1000:8.1f} ms")
+    same = [p.external_id for p in result] == [p.external_id for p in expected]
+    print(f"same top-1000 as legacy: {same}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
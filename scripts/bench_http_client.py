@@ -0,0 +1,111 @@
+"""New httpx client per request vs the shared HttpClientPool against a local server.
+
+    python -m scripts.bench_http_client [n_requests]
+
+The server speaks HTTP/1.1 keep-alive, gzips bodies, sets an ETag and
+answers If-None-Match with 304. Every new connection pays a fixed
+delay standing in for the TCP+TLS handshake to a remote site.
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from app.parsers.http_client import HttpClientPool
+
+HANDSHAKE = 0.02
+PAGE = ("<div data-marker='item'>" + "Квартира посуточно, 2 комнаты, центр. " * 40 + "</div>\n").encode() * 150
+ETAG = '"' + hashlib.md5(PAGE).hexdigest() + '"'
+GZIPPED = gzip.compress(PAGE)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    bytes_sent = 0
+
+    def setup(self):
+        Handler.connections += 1
+        time.sleep(HANDSHAKE)
+        super().setup()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        gzipped = "gzip" in (self.headers.get("Accept-Encoding") or "")
+        body = GZIPPED if gzipped else PAGE
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", ETAG)
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        Handler.bytes_sent += len(body)
+
+
+async def per_request(url: str, n: int, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            async with httpx.AsyncClient() as client:
+                r = await client.get(url)
+                assert len(r.content) == len(PAGE)
+
+    await asyncio.gather(*(one() for _ in range(n)))
+
+
+async def pooled(pool: HttpClientPool, url: str, n: int, concurrency: int, conditional: bool):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            r = await pool.get(url, params={"p": i % 5}, conditional=conditional)
+            assert len(r.content) == len(PAGE)
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+
+
+async def run(label: str, coro):
+    Handler.connections = Handler.bytes_sent = 0
+    started = time.perf_counter()
+    await coro
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {elapsed * 1000:8.1f} ms  connections={Handler.connections:<4} "
+          f"sent={Handler.bytes_sent / 1e6:6.2f} MB")
+
+
+async def main(n: int):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/moskva/sdam/na_sutki"
+    print(f"{n} GETs of a {len(PAGE) // 1024} KB page, 8 in flight, {HANDSHAKE * 1000:g} ms handshake")
+
+    await run("new AsyncClient per request", per_request(url, n, 8))
+    pool = HttpClientPool(proxies=[], max_per_host=8)
+    await run("shared pool", pooled(pool, url, n, 8, conditional=False))
+    await pooled(pool, url, 5, 1, conditional=True)  # learn the validators
+    await run("shared pool + conditional GET", pooled(pool, url, n, 8, conditional=True))
+    print(f"304 answers: {pool.stats['not_modified']}, clients created: {pool.stats['clients']}")
+    await pool.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300))
@@ -0,0 +1,76 @@
+"""Per-listing cost of pydantic models vs dicts vs the slotted Listing record.
+
+    python -m scripts.bench_listing [n_listings]
+
+Measures construction time, retained heap (tracemalloc) and JSON
+serialization of the whole batch for each representation.
+"""
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from app.models.listing import Listing, dumps, orjson
+from app.parsers.cian.listing_parser import CianListing
+
+DISTRICTS = ["Арбат", "Хамовники", "Тверской", "Басманный", "Якиманка", None]
+
+
+def rows(n: int) -> list[dict]:
+    rnd = random.Random(1)
+    out = []
+    for i in range(n):
+        area = round(rnd.uniform(20, 200), 1)
+        total = rnd.randint(5, 25)
+        price = float(rnd.randint(5_000_000, 200_000_000))
+        out.append(dict(
+            source="cian", external_id=str(300_000_000 + i), title=f"2-комн. квартира, {area} м², 3/{total} этаж",
+            address=f"Москва, ул. Тверская, д. {i % 400}", district=rnd.choice(DISTRICTS), area=area,
+            floor=rnd.randint(1, total), total_floors=total, rooms=rnd.randint(1, 5), price=price,
+            price_per_m2=round(price / area), link=f"https://www.cian.ru/sale/flat/{300_000_000 + i}/", photos=[],
+        ))
+    return out
+
+
+def measure(build, data: list[dict]):
+    tracemalloc.start()
+    started = time.perf_counter()
+    built = build(data)
+    elapsed = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Timed again untraced: tracemalloc slows allocation-heavy code down
+    started = time.perf_counter()
+    build(data)
+    return built, min(elapsed, time.perf_counter() - started), size
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    data = rows(n)
+    builders = {
+        "CianListing": lambda d: [CianListing(**r) for r in d],
+        "dict": lambda d: [dict(r) for r in d],
+        "Listing": lambda d: [Listing(**r) for r in d],
+    }
+    print(f"{n} listings")
+    print(f"{'':<13}{'build ms':>10}{'MB':>8}{'B/item':>8}{'json ms':>10}")
+    for name, build in builders.items():
+        built, elapsed, size = measure(build, data)
+        started = time.perf_counter()
+        if name == "CianListing":
+            json.dumps([m.dict() for m in built], ensure_ascii=False).encode()
+        elif name == "dict":
+            json.dumps(built, ensure_ascii=False).encode()
+        else:
+            dumps(built)
+        serialized = time.perf_counter() - started
+        print(f"{name:<13}{elapsed * 1000:>10.0f}{size / 2 ** 20:>8.1f}{size / n:>8.0f}{serialized * 1000:>10.0f}")
+        del built
+    if orjson is None:
+        print("(orjson not installed: Listing serialized with the json fallback)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""End-to-end pipeline benchmark on recorded pages, with JSON results to diff between commits.
+
+    python -m scripts.bench_pipeline [--cassette DIR] [--out FILE] [--repeat N]
+    python -m scripts.bench_pipeline --compare OLD.json NEW.json [--threshold 0.2]
+
+Pages come from a replay cassette (app/utils/replay.py), so nothing hits
+the live sites. Record one with a normal crawl:
+
+    REPLAY_MODE=record REPLAY_DIR=replay/moscow python -m app.telegram_bot.bot
+
+Without --cassette a synthetic Avito cassette is generated. Every stage
+reports its best wall time over --repeat runs, listings/sec and the peak
+Python heap of one extra traced run (parse workers are separate processes
+and not included). Stages whose dependencies are unavailable here (no
+Chromium, Redis or Elasticsearch) are written as skipped with the reason.
+--compare exits non-zero when a stage got slower by more than --threshold.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+# Nothing from app (or scripts importing it) at module level: settings and the shared
+# clients read REPLAY_MODE / REPLAY_DIR at import, and main() sets them first
+from scripts.fixtures import avito_page
+SYNTHETIC_CITIES = 40
+SYNTHETIC_ITEMS = 50
+
+
+def synthesize(path: str, cities: int = SYNTHETIC_CITIES, items: int = SYNTHETIC_ITEMS) -> list[str]:
+    from app.utils.replay import Cassette
+
+    cassette, slugs = Cassette(path, "record"), []
+    for c in range(cities):
+        slug = f"city{c}"
+        html = avito_page(items, first_id=c * 100_000)
+        cassette.put("GET", f"https://www.avito.ru/{slug}/sdam/na_sutki", 200,
+                     {"content-type": "text/html; charset=utf-8"}, html.encode())
+        slugs.append(slug)
+    return slugs
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Suite:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: dict[str, dict] = {}
+
+    async def stage(self, name: str, func: Callable[[], Awaitable[Any]], repeat: int = 0) -> Any:
+        best, out = float("inf"), None
+        for _ in range(repeat or self.repeat):
+            started = time.perf_counter()
+            out = await func()
+            best = min(best, time.perf_counter() - started)
+        tracemalloc.start()
+        await func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        items = len(out) if hasattr(out, "__len__") else int(out or 0)
+        self.results[name] = {"seconds": round(best, 4), "items": items,
+                              "items_per_sec": round(items / best, 1) if best else None,
+                              "peak_mb": round(peak / 2 ** 20, 2)}
+        print(f"{name:<16}{best * 1000:>10.1f} ms{items:>8} items{self.results[name]['peak_mb']:>9.1f} MB")
+        return out
+
+    def skip(self, name: str, reason: str):
+        self.results[name] = {"skipped": reason}
+        print(f"{name:<16}skipped: {reason}")
+
+
+class NullBot:
+    async def send_message(self, chat_id: int, text: str):
+        pass
+
+
+async def run_suite(args: argparse.Namespace, cities: list[str]) -> dict:
+    from app.core.config import settings
+    from app.parsers.avito.parser import AvitoParser
+    from app.parsers.http_client import HttpClientPool
+    from app.services.clustering import cluster_listings
+    from app.services.dedup import DedupService, MemorySeenStore
+    from app.services.filter import filter_properties, load_filters
+    from app.telegram_bot.dispatcher import NotificationDispatcher
+    from app.utils import process_pool
+    from app.utils.replay import active_cassette
+
+    cassette = active_cassette()
+    suite = Suite(args.repeat)
+    urls = cassette.urls("avito.ru")
+    parser = AvitoParser()
+
+    async def fetch():
+        pool = HttpClientPool(proxies=[], cassette=cassette)
+        try:
+            return [r.text for r in await asyncio.gather(*(pool.get(u, conditional=False) for u in urls))]
+        finally:
+            await pool.close()
+
+    async def extract():
+        pages = await asyncio.gather(*(parser.parse_items(html) for html in bodies))
+        return [item._asdict() for page in pages for item in page]
+
+    bodies = await suite.stage("fetch", fetch)
+    listings = await suite.stage("extract", extract)
+    listings.extend(await cian_stage(suite, cassette))
+
+    async def filter_stage():
+        return filter_properties(listings, load_filters())
+
+    async def cluster():
+        return cluster_listings(listings)
+
+    async def dedup():
+        service, new = DedupService(MemorySeenStore()), []
+        for start in range(0, len(listings), 28):
+            page = listings[start:start + 28]
+            new += await service.check_and_mark(page[0]["source"], [l["external_id"] for l in page])
+        return new
+
+    async def notify():
+        dispatcher = NotificationDispatcher(NullBot(), global_rate=1e9, chat_rate=1e9, digest_size=0)
+        for listing in listings:
+            dispatcher.publish(f"<b>{listing.get('title')}</b>\n{listing.get('price')}", chats=[1])
+        await dispatcher.join()
+        await dispatcher.close()
+        return dispatcher.stats["messages"]
+
+    await suite.stage("filter", filter_stage)
+    await suite.stage("cluster", cluster)
+    await suite.stage("dedup", dedup)
+    await index_stage(suite, listings, settings.ELASTICSEARCH_URL)
+    await suite.stage("notify", notify)
+
+    await search_service_path(suite, cities)
+    await scrape_chunk_path(suite, cities)
+    process_pool.shutdown()
+    return {"stages": suite.results, "cassette": {"path": cassette.path, "responses": len(cassette),
+                                                   **cassette.stats}}
+
+
+async def cian_stage(suite: Suite, cassette: Any) -> list:
+    if not cassette.urls("cian.ru"):
+        suite.skip("cian", "no Cian pages in the cassette")
+        return []
+    try:
+        from app.parsers.cian.listing_parser import CianParser
+        from app.parsers.otello.session_manager import BrowserPool
+
+        pool = BrowserPool(route_handler=cassette.route)
+        await pool.start()
+    except Exception as e:
+        suite.skip("cian", f"{type(e).__name__}: {e}")
+        return []
+
+    async def crawl():
+        parser = CianParser(pool=pool)
+        return [l.dict() for l in await parser.parse_listings(max_pages=3, full_recrawl=True)]
+
+    try:
+        return await suite.stage("cian", crawl, repeat=1)
+    finally:
+        await pool.close()
+
+
+async def index_stage(suite: Suite, listings: list, url: str):
+    from elasticsearch import AsyncElasticsearch
+
+    from app.db.elastic import BulkIndexer, ensure_index
+
+    client, index = AsyncElasticsearch(url), "properties-bench"
+    try:
+        if not await client.ping():
+            suite.skip("index", f"Elasticsearch not reachable at {url}")
+            return
+        await ensure_index(client, index)
+
+        async def bulk():
+            indexer = BulkIndexer(client, index=index)
+            await indexer.add_many(listings)
+            await indexer.close()
+            return indexer.stats["indexed"]
+
+        await suite.stage("index", bulk, repeat=1)
+        await client.indices.delete(index=index)
+    except Exception as e:
+        suite.skip("index", f"{type(e).__name__}: {e}")
+    finally:
+        await client.close()
+
+
+async def search_service_path(suite: Suite, cities: list[str]):
+    try:
+        from app.services.search import SearchService
+        service = SearchService()
+    except Exception as e:
+        suite.skip("search_service", f"{type(e).__name__}: {e}")
+        return
+
+    async def search():
+        found = []
+        for city in cities:
+            found += await service.search(city)
+        return found
+
+    await suite.stage("search_service", search, repeat=1)
+
+
+async def scrape_chunk_path(suite: Suite, cities: list[str]):
+    """The Celery scrape task, which replaced the bot's do_search loop"""
+    from redis import asyncio as aioredis
+
+    from app.core.config import settings
+    from app.services.dedup import seen_listings
+    from app.services.events import listing_events
+    from app.tasks.celery import scrape_chunk
+
+    client = aioredis.from_url(settings.REDIS_URL)
+    try:
+        await client.ping()
+    except Exception as e:
+        suite.skip("scrape_chunk", f"Redis not reachable: {e}")
+        return
+    # Keep benchmark events away from the bot and the real seen-listing store
+    listing_events.stream = "rentscout:bench:events"
+    seen_listings.store.prefix = "rentscout:bench:seen"
+
+    async def reset():
+        await client.delete(listing_events.stream, *[k async for k in client.scan_iter("rentscout:bench:seen:*")])
+
+    async def scrape():
+        await reset()
+        published = 0
+        for city in cities:
+            published += await scrape_chunk("avito", city)
+        return published
+
+    try:
+        await suite.stage("scrape_chunk", scrape, repeat=1)
+    finally:
+        await reset()
+        await client.close()
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'stage':<16}{old.get('commit', 'old'):>12}{new.get('commit', 'new'):>12}{'change':>10}")
+    regressions = 0
+    for name in dict.fromkeys([*old["stages"], *new["stages"]]):
+        a, b = old["stages"].get(name, {}), new["stages"].get(name, {})
+        if "seconds" not in a or "seconds" not in b:
+            print(f"{name:<16}{a.get('seconds', '-'):>12}{b.get('seconds', '-'):>12}{'n/a':>10}")
+            continue
+        change = (b["seconds"] - a["seconds"]) / a["seconds"] if a["seconds"] else 0.0
+        flag = " !" if change > threshold else ""
+        regressions += bool(flag)
+        print(f"{name:<16}{a['seconds']:>12.4f}{b['seconds']:>12.4f}{change:>+10.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cassette", help="replay directory; a synthetic Avito one is generated if omitted")
+    parser.add_argument("--cities", nargs="*", help="Avito city slugs to scrape (default: all in the cassette)")
+    parser.add_argument("--out", help="write results JSON here as well as to stdout")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    if args.cassette and not os.path.exists(os.path.join(args.cassette, "index.json")):
+        parser.error(f"no recordings in {args.cassette}")
+    for name in ("httpx", "elastic_transport"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix="rentscout-bench-")
+    path = args.cassette or os.path.join(workdir, "cassette")
+    # Settings and the shared clients read these at import, so they are set before importing the app.
+    # Replays never reach the sites, so the politeness scheduler is not allowed to pace them
+    unpaced = json.dumps({"avito": 1e6, "cian": 1e6})
+    os.environ.update({"REPLAY_MODE": "replay", "REPLAY_DIR": path,
+                       "HISTORY_DB_PATH": os.path.join(workdir, "history.db"),
+                       "FILTERS_PATH": os.environ.get("FILTERS_PATH", "config/steinik_filters.json"),
+                       "SOURCE_START_RATES": unpaced, "SOURCE_MAX_RATES": unpaced})
+    cities = args.cities or (synthesize(path) if not args.cassette else None)
+    from app.utils.replay import active_cassette
+
+    if active_cassette() is None:
+        sys.exit("app was imported before the replay settings were set")
+    cities = cities or sorted({u.split("/")[3] for u in active_cassette().urls("avito.ru")})
+    started = time.perf_counter()
+    report = asyncio.run(run_suite(args, cities))
+    report = {
+        "commit": git_commit(), "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(), "repeat": args.repeat, **report,
+        "total_seconds": round(time.perf_counter() - started, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Sequential vs fan-out parser latency with fake fixed-delay sources.
+
+    python -m scripts.bench_search_fanout
+"""
+import asyncio
+import time
+
+from app.services.fanout import fan_out, merge_results
+
+DELAYS = {"avito": 0.4, "cian": 1.2, "sutochno": 0.6, "yandex_travel": 0.8, "ostrovok": 3.0}
+
+
+class FakeParser:
+    def __init__(self, source: str, delay: float, fail: bool = False):
+        self.SOURCE = source
+        self.delay = delay
+        self.fail = fail
+
+    async def parse_listing(self, city: str) -> list[dict]:
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("captcha")
+        return [{"source": self.SOURCE, "external_id": f"{self.SOURCE}-{i}", "price": 1000 + i} for i in range(50)]
+
+
+async def sequential(parsers: list[FakeParser]) -> list:
+    items = []
+    for parser in parsers:
+        try:
+            items.extend(await parser.parse_listing("moskva"))
+        except Exception:
+            pass
+    return items
+
+
+async def concurrent(parsers: list[FakeParser], timeouts: dict[str, float]) -> list:
+    results = await fan_out(
+        {p.SOURCE: (lambda p=p: p.parse_listing("moskva")) for p in parsers},
+        timeouts=timeouts, default_timeout=2.0, concurrency=len(parsers),
+    )
+    return merge_results(results)
+
+
+async def main():
+    parsers = [FakeParser(name, delay, fail=(name == "sutochno")) for name, delay in DELAYS.items()]
+    # ostrovok is deliberately slower than its budget to show partial results
+    timeouts = {"ostrovok": 1.5}
+
+    started = time.perf_counter()
+    seq = await sequential(parsers)
+    seq_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    fan = await concurrent(parsers, timeouts)
+    fan_time = time.perf_counter() - started
+
+    print(f"sequential: {seq_time:.2f}s, {len(seq)} listings")
+    print(f"fan-out:    {fan_time:.2f}s, {len(fan)} listings (1 failed, 1 timed out)")
+    print(f"speedup:    x{seq_time / fan_time:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+"""Per-listing loop over every subscription vs the SubscriptionIndex.
+
+    python -m scripts.bench_subscriptions [n_listings] [n_subscriptions]
+"""
+import random
+import sys
+import time
+
+from app.services.subscriptions import Subscription, SubscriptionIndex, accepts
+from scripts.fixtures import DISTRICTS, random_listing, random_profile
+
+
+def main(n_listings: int, n_subs: int):
+    rnd = random.Random(5)
+    subs = [Subscription(chat_id, random_profile(rnd), True) for chat_id in range(n_subs)]
+    # Real profiles are narrower than the test ones: a couple of districts, a price ceiling, an area band
+    for sub in subs:
+        lo = rnd.choice([30, 40, 50, 60, 80, 100])
+        sub.filters.update(districts=rnd.sample(DISTRICTS, 2), price_max=rnd.choice([20e6, 30e6, 50e6, 80e6]),
+                           area_range={"min": lo, "max": lo + rnd.choice([20, 30, 50])})
+    listings = [{**random_listing(rnd), "price": rnd.uniform(5e6, 120e6), "area": rnd.uniform(25, 200)}
+                for _ in range(n_listings)]
+
+    started = time.perf_counter()
+    naive = [[s.chat_id for s in subs if accepts(s.filters, l)] for l in listings]
+    naive_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = SubscriptionIndex(subs)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexed = [sorted(index.match(l)) for l in listings]
+    match_time = time.perf_counter() - started
+
+    deliveries = sum(map(len, naive))
+    print(f"{n_listings} listings x {n_subs} subscriptions, {deliveries} deliveries")
+    print(f"naive accepts() loop: {naive_time * 1000:8.1f} ms")
+    print(f"index build:          {build_time * 1000:8.1f} ms")
+    print(f"index match:          {match_time * 1000:8.1f} ms  (x{naive_time / match_time:.1f})")
+    print(f"same result: {naive == indexed}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000, int(sys.argv[2]) if len(sys.argv) > 2 else 2_000)
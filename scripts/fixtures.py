@@ -0,0 +1,56 @@
+"""Synthetic pages, listings and profiles shared by the benchmarks and tests.
+
+Nothing from app is imported here, so scripts that must configure the app
+through the environment first (bench_pipeline) can use these freely.
+"""
+
+AVITO_ITEM = """
+<div data-marker="item" data-item-id="{i}" class="iva-item-root-Nj_hb photo-slider-slider-_PvpN">
+  <img itemprop="image" src="https://00.img.avito.st/image/1/1.{i}.jpg" alt="">
+  <div class="iva-item-body"><div class="iva-item-titleStep">
+    <a data-marker="item-title" href="/moskva/kvartiry/{i}" itemprop="url" title="t">
+      <h3 itemprop="name" class="styles-module-root-TWVKW">2-к. квартира, {area} м², {floor}/12 эт.</h3></a></div>
+    <div class="iva-item-priceStep"><span><meta itemprop="priceCurrency" content="RUB">
+      <meta itemprop="price" content="{price}"><strong>{price} ₽ за сутки</strong></span></div>
+    <div class="geo-root" data-marker="item-address"><p><span>ул. Тверская, {floor}</span></p>
+      <div class="geo-georeferences"><span>Тверская</span><span>5 мин.</span></div></div>
+    <p class="iva-item-description">{text}</p>
+  </div>
+</div>"""
+
+
+def avito_items(n: int, first_id: int = 1000) -> str:
+    return "".join(AVITO_ITEM.format(i=first_id + i, area=30 + i % 60, floor=1 + i % 12, price=2500 + i * 10,
+                                     text="Уютная квартира рядом с метро. " * 12) for i in range(n))
+
+
+def avito_page(n: int, first_id: int = 1000) -> str:
+    return (f"<html><head><title>Avito</title></head><body><div class='items'>{avito_items(n, first_id)}</div>"
+            "</body></html>")
+
+
+# Subscription profiles and the listings matched against them
+DISTRICTS = ["Арбат", "Тверской", "Хамовники", "Беговой", "Донской"]
+
+
+def random_profile(rnd):
+    lo = rnd.choice([None, 30, 38, 50, 80])
+    return {
+        "districts": rnd.choice([None, rnd.sample(DISTRICTS, 2)]),
+        "area_range": {"min": lo, "max": rnd.choice([None, 90, 150, 300])},
+        "price_max": rnd.choice([None, 20e6, 50e6, 100e6, 250e6]),
+        "floor": {"not_first": rnd.random() < 0.5, "not_last": rnd.random() < 0.5},
+        "renovation": rnd.choice([None, ["евро"], ["дизайнерский", "евро"]]),
+    }
+
+
+def random_listing(rnd):
+    total = rnd.randint(2, 20)
+    return {
+        "district": rnd.choice(DISTRICTS + [None]),
+        "price": rnd.choice([0, rnd.uniform(5e6, 300e6)]),
+        "area": rnd.choice([0, rnd.uniform(20, 350)]),
+        "floor": rnd.randint(1, total),
+        "total_floors": total,
+        "renovation": rnd.choice([None, "евроремонт", "косметический"]),
+    }